@@ -0,0 +1,421 @@
+"""常驻解锁代理：解锁一次，把保险库与检索索引保留在内存中，通过本机 Unix 套接字提供查询。
+
+用法: python -m agent [--data-dir 目录] [--socket 路径] [--idle 秒] [--locked]
+启动时按命令行工具的方式取启动密码（PM_MASTER_PASSWORD 或终端输入）并解锁；--locked 则以锁定状态启动，
+由客户端发送 unlock 解锁。超过 --idle 秒没有访问保险库的请求时自动锁定，丢弃密钥与内存中的记录。
+
+协议：每帧为 4 字节大端长度 + UTF-8 JSON。请求 {"id": 序号, "op": 操作, ...}，
+响应 {"id": 序号, "ok": true, "result": ...} 或 {"id": 序号, "ok": false, "code": 错误码, "error": 说明}。
+连接可持续复用，同一连接上的请求按顺序应答。仅支持提供 AF_UNIX 的平台（Linux/macOS）。
+"""
+import os
+import sys
+import gc
+import json
+import time
+import socket
+import struct
+import signal
+import asyncio
+import getpass
+import hashlib
+import argparse
+import tempfile
+from typing import Dict, List, Optional
+
+from storage import KeyManager, SecureStorage, app_root, DATA_DIR_ENV
+from cli import PASSWORD_ENV
+
+
+SOCKET_ENV = 'PM_AGENT_SOCKET'
+IDLE_TIMEOUT = 15 * 60          # 秒
+MAX_FRAME = 1024 * 1024
+FIELDS = ('website', 'account', 'password', 'phone', 'email', 'note', 'created_at')
+_FRAME = struct.Struct('>I')
+
+# 错误码
+E_LOCKED = 'locked'
+E_AUTH = 'auth'
+E_NOT_FOUND = 'not_found'
+E_BAD_REQUEST = 'bad_request'
+E_ERROR = 'error'
+
+
+class AgentError(Exception):
+    def __init__(self, message: str, code: str = E_ERROR):
+        super().__init__(message)
+        self.code = code
+
+
+def default_socket_path() -> str:
+    """每个用户一个私有目录（0700），每个数据目录一个套接字。"""
+    if os.environ.get(SOCKET_ENV):
+        return os.environ[SOCKET_ENV]
+    base = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    tag = hashlib.sha1(os.path.abspath(app_root()).encode('utf-8')).hexdigest()[:10]
+    return os.path.join(base, f'pm-agent-{os.getuid()}', f'{tag}.sock')
+
+
+def _check_private(path: str):
+    # 目录必须属于当前用户且其他人不可访问，防止连上别人放置的套接字
+    st = os.stat(path)
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise AgentError(f'{path} 不属于当前用户或权限过宽')
+
+
+def encode_frame(obj: Dict) -> bytes:
+    data = json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return _FRAME.pack(len(data)) + data
+
+
+def _public(rec: Dict, show_password: bool) -> Dict:
+    out = {'id': rec.get('id')}
+    for k in FIELDS:
+        out[k] = rec.get(k, '')
+    if not show_password:
+        out.pop('password')
+    return out
+
+
+class Agent:
+    """代理服务端。所有请求都在事件循环线程上处理，只有解锁（密钥派生、解密全部页）放到线程池；
+    写盘由 SecureStorage 的后台写入线程完成，因此查询不会被磁盘或 KDF 阻塞。"""
+
+    def __init__(self, socket_path: Optional[str] = None, idle_timeout: float = IDLE_TIMEOUT):
+        self.socket_path = socket_path or default_socket_path()
+        self.idle_timeout = idle_timeout
+        self.store: Optional[SecureStorage] = None
+        self._last_used = 0.0
+        self._stopped: Optional[asyncio.Event] = None
+        self._unlocking: Optional[asyncio.Lock] = None
+        self._by_account: Dict[str, List[str]] = {}
+        self._by_account_gen = -1
+        self._conns: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self.clients = 0
+        self.requests = 0
+        self._ops = {
+            'ping': self.op_ping, 'status': self.op_status, 'unlock': self.op_unlock, 'lock': self.op_lock,
+            'get': self.op_get, 'search': self.op_search, 'add': self.op_add, 'stop': self.op_stop,
+        }
+
+    # 解锁与锁定
+    @staticmethod
+    def open_store(password: Optional[str]) -> SecureStorage:
+        km = KeyManager()
+        if km.needs_password():
+            if not password:
+                raise AgentError('需要启动密码', E_LOCKED)
+            try:
+                km.load(password)
+            except Exception:
+                raise AgentError('启动密码错误', E_AUTH)
+        else:
+            km.load(None)
+        store = SecureStorage(km)
+        store.load()
+        store.warm()
+        store.start_writer()
+        return store
+
+    def adopt(self, store: SecureStorage):
+        self.store = store
+        self._by_account_gen = -1
+        self._touch()
+
+    def lock(self):
+        """写出未保存的变更，然后丢弃密钥、记录与索引。"""
+        store, self.store = self.store, None
+        self._by_account = {}
+        if store is not None:
+            store.close()
+            store.key_mgr.clear()
+            # 记录与索引只被 store 引用，这里放掉最后的引用并立即回收
+            store = None
+            gc.collect()
+
+    def _touch(self):
+        self._last_used = time.monotonic()
+
+    def _require(self) -> SecureStorage:
+        if self.store is None:
+            raise AgentError('代理已锁定，请先解锁', E_LOCKED)
+        self._touch()
+        # 界面或命令行工具修改过数据时增量载入；未变化时只有两次 stat
+        self.store.refresh()
+        return self.store
+
+    # 操作
+    def op_ping(self, req):
+        return 'pong'
+
+    def op_status(self, req):
+        out = {'unlocked': self.store is not None, 'pid': os.getpid(), 'clients': self.clients,
+               'requests': self.requests, 'idle_timeout': self.idle_timeout}
+        if self.store is not None:
+            out['records'] = len(self.store.accounts)
+            out['idle_left'] = max(0.0, round(self._last_used + self.idle_timeout - time.monotonic(), 1))
+        return out
+
+    async def op_unlock(self, req):
+        async with self._unlocking:
+            if self.store is None:
+                loop = asyncio.get_running_loop()
+                self.adopt(await loop.run_in_executor(None, self.open_store, req.get('password')))
+            # 在锁内读取：释放后到这里之间可能已收到 lock 请求
+            records = len(self.store.accounts)
+        self._touch()
+        return {'records': records}
+
+    def op_lock(self, req):
+        self.lock()
+        return None
+
+    def _account_ids(self, store: SecureStorage, account: str) -> List[str]:
+        if self._by_account_gen != store.generation:
+            index: Dict[str, List[str]] = {}
+            for rec in store.accounts:
+                index.setdefault(rec.get('account', ''), []).append(rec['id'])
+            self._by_account = index
+            self._by_account_gen = store.generation
+        return self._by_account.get(account, [])
+
+    def op_get(self, req):
+        """按 id 或账号读取一条记录（默认包含密码）。"""
+        store = self._require()
+        key = req.get('key')
+        if not isinstance(key, str) or not key:
+            raise AgentError('缺少 key', E_BAD_REQUEST)
+        rec = store.get(key)
+        if rec is None:
+            ids = self._account_ids(store, key)
+            if not ids:
+                raise AgentError(f'未找到记录：{key}', E_NOT_FOUND)
+            if len(ids) > 1:
+                raise AgentError(f'账号 {key} 对应多条记录，请改用 id：' + ', '.join(ids), E_BAD_REQUEST)
+            rec = store.get(ids[0])
+        field = req.get('field')
+        if field:
+            if field not in FIELDS:
+                raise AgentError(f'未知字段：{field}', E_BAD_REQUEST)
+            return rec.get(field, '')
+        return _public(rec, req.get('show_password', True))
+
+    def op_search(self, req):
+        store = self._require()
+        recs = store.search(str(req.get('query', '')))
+        limit = req.get('limit')
+        if limit:
+            recs = recs[:int(limit)]
+        show = bool(req.get('show_password'))
+        return [_public(r, show) for r in recs]
+
+    def op_add(self, req):
+        store = self._require()
+        rec = req.get('record')
+        if not isinstance(rec, dict):
+            raise AgentError('缺少 record', E_BAD_REQUEST)
+        rec = {k: rec[k] for k in FIELDS if k in rec}
+        if not rec.get('account') or not rec.get('password'):
+            raise AgentError('账号与密码为必填', E_BAD_REQUEST)
+        for k in FIELDS:
+            rec.setdefault(k, '')
+        if not isinstance(rec['created_at'], (int, float)):
+            rec['created_at'] = int(time.time())
+        return store.add(rec)
+
+    def op_stop(self, req):
+        self._stopped.set()
+        return None
+
+    # 服务
+    async def _dispatch(self, req) -> Dict:
+        rid = req.get('id') if isinstance(req, dict) else None
+        try:
+            if not isinstance(req, dict):
+                raise AgentError('请求必须是 JSON 对象', E_BAD_REQUEST)
+            op = self._ops.get(req.get('op')) if isinstance(req.get('op'), str) else None
+            if op is None:
+                raise AgentError(f'未知操作：{req.get("op")}', E_BAD_REQUEST)
+            result = op(req)
+            if asyncio.iscoroutine(result):
+                result = await result
+            return {'id': rid, 'ok': True, 'result': result}
+        except AgentError as e:
+            return {'id': rid, 'ok': False, 'code': e.code, 'error': str(e)}
+        except (ValueError, OSError) as e:
+            return {'id': rid, 'ok': False, 'code': E_ERROR, 'error': str(e)}
+        except Exception as e:
+            # 参数类型不对、文件锁超时等：回复错误而不是断开连接
+            return {'id': rid, 'ok': False, 'code': E_ERROR, 'error': f'{type(e).__name__}: {e}'}
+
+    def _peer_allowed(self, writer) -> bool:
+        sock = writer.get_extra_info('socket')
+        if sock is None or not hasattr(socket, 'SO_PEERCRED'):
+            return True  # 无法取得对端身份时依靠套接字目录的权限
+        _pid, uid, _gid = struct.unpack('3i', sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                                              struct.calcsize('3i')))
+        return uid == os.getuid()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if not self._peer_allowed(writer):
+            writer.close()
+            return
+        self.clients += 1
+        task = asyncio.current_task()
+        self._conns[task] = writer
+        try:
+            while True:
+                try:
+                    head = await reader.readexactly(_FRAME.size)
+                except asyncio.IncompleteReadError:
+                    break
+                (size,) = _FRAME.unpack(head)
+                if size > MAX_FRAME:
+                    writer.write(encode_frame({'id': None, 'ok': False, 'code': E_BAD_REQUEST, 'error': '请求过大'}))
+                    break
+                body = await reader.readexactly(size)
+                self.requests += 1
+                try:
+                    req = json.loads(body.decode('utf-8'))
+                except ValueError:
+                    req = None
+                writer.write(encode_frame(await self._dispatch(req)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.clients -= 1
+            self._conns.pop(task, None)
+            writer.close()
+
+    async def _watch_idle(self):
+        while True:
+            remaining = self._last_used + self.idle_timeout - time.monotonic()
+            if remaining <= 0:
+                if self.store is not None:
+                    self.lock()
+                remaining = self.idle_timeout
+            await asyncio.sleep(remaining)
+
+    def _prepare_socket(self):
+        path = self.socket_path
+        parent = os.path.dirname(path) or '.'
+        os.makedirs(parent, mode=0o700, exist_ok=True)
+        _check_private(parent)
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                os.remove(path)  # 上次异常退出留下的套接字文件
+            else:
+                raise AgentError(f'代理已在运行：{path}')
+            finally:
+                probe.close()
+
+    async def serve(self):
+        self._stopped = asyncio.Event()
+        self._unlocking = asyncio.Lock()
+        self._prepare_socket()
+        old_umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        finally:
+            os.umask(old_umask)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stopped.set)
+        print(f'代理已启动：{self.socket_path}', flush=True)
+        watcher = asyncio.ensure_future(self._watch_idle()) if self.idle_timeout else None
+        try:
+            await self._stopped.wait()
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            server.close()
+            # 关闭仍在连接的客户端，等待各连接的处理协程读到 EOF 后正常结束
+            for writer in list(self._conns.values()):
+                writer.close()
+            if self._conns:
+                await asyncio.wait(list(self._conns), timeout=5)
+            await server.wait_closed()
+            self.lock()
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+
+    def run(self):
+        asyncio.run(self.serve())
+
+
+class AgentClient:
+    """同步客户端，保持一个连接；call() 发送请求并返回 result，失败时抛出 AgentError。"""
+
+    def __init__(self, path: Optional[str] = None, timeout: Optional[float] = 30.0):
+        path = path or default_socket_path()
+        if not os.path.exists(path):
+            raise AgentError('代理未运行', E_ERROR)
+        _check_private(os.path.dirname(path) or '.')
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(path)
+        self._seq = 0
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _recv_exact(self, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self._sock.recv(n - len(buf))
+            if not chunk:
+                raise AgentError('代理已断开连接')
+            buf += chunk
+        return bytes(buf)
+
+    def call(self, op: str, **params):
+        self._seq += 1
+        self._sock.sendall(encode_frame(dict(params, id=self._seq, op=op)))
+        (size,) = _FRAME.unpack(self._recv_exact(_FRAME.size))
+        resp = json.loads(self._recv_exact(size).decode('utf-8'))
+        if not resp.get('ok'):
+            raise AgentError(resp.get('error', ''), resp.get('code', E_ERROR))
+        return resp.get('result')
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(prog='python -m agent', description='常驻解锁代理')
+    p.add_argument('--data-dir', help='数据目录（默认为程序所在目录）')
+    p.add_argument('--socket', help='套接字路径（默认在 $XDG_RUNTIME_DIR 或临时目录下的私有目录中）')
+    p.add_argument('--idle', type=float, default=IDLE_TIMEOUT, help='空闲多少秒后自动锁定，0 表示不自动锁定')
+    p.add_argument('--locked', action='store_true', help='以锁定状态启动，等待客户端 unlock')
+    args = p.parse_args(argv)
+    if not hasattr(socket, 'AF_UNIX'):
+        print('错误: 当前平台不支持 Unix 套接字', file=sys.stderr)
+        return 1
+    if args.data_dir:
+        os.environ[DATA_DIR_ENV] = os.path.abspath(args.data_dir)
+    agent = Agent(args.socket, args.idle)
+    try:
+        if not args.locked:
+            password = None
+            if KeyManager().needs_password():
+                password = os.environ.get(PASSWORD_ENV) or getpass.getpass('启动密码: ')
+            agent.adopt(agent.open_store(password))
+        agent.run()
+    except Exception as e:
+        print(f'错误: {e}', file=sys.stderr)
+        agent.lock()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import struct
+import secrets
+import threading
+from typing import Dict, Iterable, Iterator, Optional, Callable, BinaryIO
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from encryption import derive_key_from_password, check_kdf, DEFAULT_KDF
+
+
+# 加密导出归档（分段流式 AEAD）
+# 布局: magic | version | segment_size | kdf_len | salt | nonce_prefix | kdf(JSON) | 段...
+# 每段为 AES-GCM 密文，明文固定 segment_size 字节（最后一段更短，可以为空）；
+# nonce = nonce_prefix(7) | 段序号(4, 大端) | 结尾标志(1)，整个头部作为每段的附加认证数据。
+# 段被重排、截断、拼接或头部被篡改都会导致认证失败；导出与恢复都只需常数内存。
+ARCHIVE_MAGIC = b'PMA\x00'
+ARCHIVE_VERSION = 1
+ARCHIVE_SUFFIX = '.pmarc'
+SEGMENT_SIZE = 64 << 10
+# 头部在第一段校验之前就要使用，读取时按上限检查，被篡改的文件不能触发超大的读取或密钥派生
+MAX_SEGMENT_SIZE = 1 << 20
+_MAX_KDF_LEN = 1024
+_HEADER = struct.Struct('<4sHIH')
+_SALT_SIZE = 16
+_PREFIX_SIZE = 7
+_TAG_SIZE = 16
+_MAX_SEGMENTS = 2 ** 32
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def is_archive(path: str) -> bool:
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC
+    except OSError:
+        return False
+
+
+def _nonce(prefix: bytes, counter: int, final: bool) -> bytes:
+    if counter >= _MAX_SEGMENTS:
+        raise ValueError('归档过大：段数超出上限')
+    return prefix + counter.to_bytes(4, 'big') + (b'\x01' if final else b'\x00')
+
+
+class ArchiveWriter:
+    """把字节流按固定长度分段加密写入 f；close() 写出带结尾标志的最后一段。"""
+
+    def __init__(self, f: BinaryIO, password: str, kdf: Optional[dict] = None, segment_size: int = SEGMENT_SIZE):
+        kdf = kdf or DEFAULT_KDF
+        if not 0 < segment_size <= MAX_SEGMENT_SIZE:
+            raise ValueError(f'段长度须在 1 到 {MAX_SEGMENT_SIZE} 字节之间')
+        salt = secrets.token_bytes(_SALT_SIZE)
+        self._prefix = secrets.token_bytes(_PREFIX_SIZE)
+        kdf_json = json.dumps(kdf, separators=(',', ':')).encode('utf-8')
+        self._header = (_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, segment_size, len(kdf_json))
+                        + salt + self._prefix + kdf_json)
+        self._aead = AESGCM(derive_key_from_password(password, salt, kdf))
+        self._f = f
+        self.segment_size = segment_size
+        self._buf = bytearray()
+        self._counter = 0
+        f.write(self._header)
+
+    def _seal(self, data, final: bool):
+        self._f.write(self._aead.encrypt(_nonce(self._prefix, self._counter, final), bytes(data), self._header))
+        self._counter += 1
+
+    def write(self, data: bytes):
+        self._buf += data
+        seg = self.segment_size
+        if len(self._buf) < seg:
+            return
+        view = memoryview(self._buf)
+        pos = 0
+        while len(self._buf) - pos >= seg:
+            self._seal(view[pos:pos + seg], False)
+            pos += seg
+        view.release()
+        del self._buf[:pos]
+
+    def close(self):
+        # 剩余数据不足一段，作为结尾段写出（明文长度恰好整段时结尾段为空）
+        self._seal(self._buf, True)
+        self._buf = bytearray()
+
+
+def read_segments(f: BinaryIO, password: str) -> Iterator[bytes]:
+    """逐段解密并校验，产出明文段；缺少结尾段、段被篡改或密码错误时抛出 ValueError。"""
+    head = f.read(_HEADER.size)
+    if len(head) < _HEADER.size:
+        raise ValueError('不是有效的加密归档文件')
+    magic, version, segment_size, kdf_len = _HEADER.unpack(head)
+    if magic != ARCHIVE_MAGIC:
+        raise ValueError('不是有效的加密归档文件')
+    if version != ARCHIVE_VERSION:
+        raise ValueError(f'不支持的归档版本: {version}')
+    if not 0 < segment_size <= MAX_SEGMENT_SIZE or kdf_len > _MAX_KDF_LEN:
+        raise ValueError('归档文件头部无效')
+    rest = f.read(_SALT_SIZE + _PREFIX_SIZE + kdf_len)
+    if len(rest) < _SALT_SIZE + _PREFIX_SIZE + kdf_len:
+        raise ValueError('归档文件不完整')
+    salt, prefix = rest[:_SALT_SIZE], rest[_SALT_SIZE:_SALT_SIZE + _PREFIX_SIZE]
+    try:
+        kdf = json.loads(rest[_SALT_SIZE + _PREFIX_SIZE:].decode('utf-8'))
+    except ValueError:
+        raise ValueError('归档文件头部无效')
+    check_kdf(kdf)
+    header = head + rest
+    aead = AESGCM(derive_key_from_password(password, salt, kdf))
+    seg_ct = segment_size + _TAG_SIZE
+    counter = 0
+    while True:
+        ct = f.read(seg_ct)
+        # 写入方保证结尾段短于整段，因此读到不足整段的数据就是结尾段
+        final = len(ct) < seg_ct
+        if len(ct) < _TAG_SIZE:
+            raise ValueError('归档文件不完整（缺少结尾段）')
+        try:
+            pt = aead.decrypt(_nonce(prefix, counter, final), ct, header)
+        except InvalidTag:
+            if counter == 0:
+                raise ValueError('归档密码错误或文件已损坏')
+            raise ValueError(f'归档文件已损坏（第 {counter + 1} 段校验失败）')
+        counter += 1
+        yield pt
+        if final:
+            if f.read(1):
+                raise ValueError('归档文件结尾存在多余数据')
+            return
+
+
+def write_archive(path: str, records: Iterable[Dict], password: str, kdf: Optional[dict] = None,
+                  count: Optional[int] = None, segment_size: int = SEGMENT_SIZE,
+                  progress: Optional[Callable[[int, int], None]] = None,
+                  cancel: Optional[threading.Event] = None) -> int:
+    """把记录逐条写入加密归档（先写临时文件，完成后替换），返回写入条数。
+
+    内容为 JSON Lines：首行是元信息，之后每行一条记录。
+    """
+    if not password:
+        raise ValueError('请设置归档密码')
+    tmp = path + '.tmp'
+    n = 0
+    try:
+        with open(tmp, 'wb') as f:
+            w = ArchiveWriter(f, password, kdf, segment_size)
+            meta = {'format': 'accounts', 'count': count, 'created_at': int(time.time())}
+            w.write(json.dumps(meta).encode('utf-8') + b'\n')
+            for rec in records:
+                w.write(json.dumps(rec, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+                n += 1
+                if n % 1000 == 0:
+                    if cancel is not None and cancel.is_set():
+                        raise ExportCancelled()
+                    if progress:
+                        progress(n, count or n)
+            if count is not None and n != count:
+                raise ValueError('导出过程中记录数发生变化')
+            w.close()
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    if progress:
+        progress(n, n)
+    return n
+
+
+def iter_archive(f: BinaryIO, password: str) -> Iterator[Dict]:
+    """从已打开的归档文件逐条读出记录；读完后核对元信息中的条数。"""
+    meta = None
+    n = 0
+    tail = b''
+    for seg in read_segments(f, password):
+        lines = (tail + seg).split(b'\n')
+        tail = lines.pop()
+        for line in lines:
+            if meta is None:
+                meta = json.loads(line)
+                continue
+            n += 1
+            yield json.loads(line)
+    if tail or meta is None:
+        raise ValueError('归档内容不完整')
+    if meta.get('count') is not None and meta['count'] != n:
+        raise ValueError('归档记录数与元信息不一致')
+
+
+def read_archive(path: str, password: str) -> Iterator[Dict]:
+    with open(path, 'rb') as f:
+        yield from iter_archive(f, password)
+
+
+def verify_archive(path: str, password: str) -> int:
+    """完整校验归档（逐段认证并解析），返回记录条数。"""
+    return sum(1 for _ in read_archive(path, password))
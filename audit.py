@@ -0,0 +1,281 @@
+import os
+import hmac
+import math
+import time
+import hashlib
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Tuple, Callable
+
+from paging import record_rev
+
+
+AGE_LIMIT_DAYS = 365        # 超过该天数未更换的密码标记为陈旧
+WEAK_SCORE = 2              # 强度评分低于该值视为弱密码
+PARALLEL_MIN = 5000         # 待评估密码数超过该值时使用进程池
+BATCH_SIZE = 2000           # 每个进程任务评估的密码数
+SCORE_LABELS = ('极弱', '弱', '一般', '强', '很强')
+
+COMMON_PASSWORDS = frozenset('''
+123456 password 12345678 qwerty 123456789 12345 1234 111111 1234567 dragon 123123 baseball abc123
+football monkey letmein 696969 shadow master 666666 qwertyuiop 123321 mustang 1234567890 michael
+654321 superman 1qaz2wsx 7777777 121212 000000 qazwsx 123qwe killer trustno1 jordan jennifer
+zxcvbnm asdfgh hunter buster soccer harley batman andrew tigger sunshine iloveyou woaini 5201314
+admin root passw0rd p@ssw0rd welcome 888888 147258369 a123456 aa123456 qq123456 abcd1234
+'''.split())
+_LEET = str.maketrans('@4310$5!7', 'aaeiossit')
+_KEYBOARD_ROWS = ('1234567890', 'qwertyuiop', 'asdfghjkl', 'zxcvbnm')
+_KEY_NEXT = {row[i]: row[i + 1] for row in _KEYBOARD_ROWS for i in range(len(row) - 1)}
+_SYMBOLS = 33
+
+
+class AuditCancelled(Exception):
+    pass
+
+
+def _relation(a: str, b: str) -> Optional[int]:
+    # 相邻两个字符的关系：重复、字母/数字顺序、键盘同行相邻；无关系返回 None
+    if a == b:
+        return 0
+    d = ord(b) - ord(a)
+    if d in (1, -1):
+        return d
+    if _KEY_NEXT.get(a) == b:
+        return 2
+    if _KEY_NEXT.get(b) == a:
+        return -2
+    return None
+
+
+def _predictable_chars(pw: str) -> int:
+    """处于长度 >= 3 的重复/连续/键盘序列中、可由前一个字符推出的字符数。"""
+    low = pw.lower()
+    count = 0
+    run, rel = 1, None
+    for i in range(1, len(low) + 1):
+        r = _relation(low[i - 1], low[i]) if i < len(low) else None
+        if r is not None and (rel is None or r == rel):
+            run += 1
+            rel = r
+            continue
+        if run >= 3:
+            count += run - 1
+        run, rel = (2, r) if r is not None else (1, None)
+    return count
+
+
+def _pool_size(pw: str) -> int:
+    size = 0
+    if any(c.islower() and c.isascii() for c in pw): size += 26
+    if any(c.isupper() and c.isascii() for c in pw): size += 26
+    if any(c.isdigit() and c.isascii() for c in pw): size += 10
+    if any(not c.isalnum() and c.isascii() for c in pw): size += _SYMBOLS
+    if any(not c.isascii() for c in pw): size += 100
+    return max(size, 1)
+
+
+def _repeat_unit(pw: str) -> str:
+    """pw 由某个片段重复组成时返回该片段，否则返回 pw 本身。"""
+    n = len(pw)
+    for k in range(1, n // 2 + 1):
+        if n % k == 0 and pw[:k] * (n // k) == pw:
+            return pw[:k]
+    return pw
+
+
+def estimate_strength(pw: str) -> Tuple[int, float, Tuple[str, ...]]:
+    """估算密码强度，返回 (评分 0~4, 估计熵位数, 问题说明)。
+
+    以字符集大小估算熵，再按常见密码、重复片段、连续/键盘序列、年份等模式扣减。
+    """
+    if not pw:
+        return 0, 0.0, ('密码为空',)
+    reasons = []
+    unit = _repeat_unit(pw)
+    bits_per_char = math.log2(_pool_size(unit))
+    predictable = _predictable_chars(unit)
+    bits = (len(unit) - predictable) * bits_per_char + predictable
+    if unit != pw:
+        bits += math.log2(len(pw) // len(unit))
+        reasons.append('由重复片段组成')
+    if predictable >= 3:
+        reasons.append('包含连续或重复字符')
+    base = pw.lower().strip('0123456789!@#$%^&*.').translate(_LEET)
+    if pw.lower() in COMMON_PASSWORDS or base in COMMON_PASSWORDS:
+        bits = min(bits, 10.0)
+        reasons.append('常见密码')
+    for i in range(len(pw) - 3):
+        if pw[i:i + 2] in ('19', '20') and pw[i + 2:i + 4].isdigit():
+            bits -= 4 * math.log2(10) - math.log2(200)  # 年份只有约 200 种取值
+            reasons.append('包含年份')
+            break
+    if len(pw) < 8:
+        reasons.append('长度不足8位')
+    if _pool_size(pw) <= 26 and len(pw) < 12:
+        reasons.append('字符种类单一')
+    bits = max(bits, 0.0)
+    score = 0 if bits < 28 else 1 if bits < 36 else 2 if bits < 60 else 3 if bits < 80 else 4
+    if '常见密码' in reasons:
+        score = 0
+    return score, round(bits, 1), tuple(reasons)
+
+
+def _estimate_batch(passwords: List[str]) -> List[Tuple[int, float, Tuple[str, ...]]]:
+    # 进程池任务，必须是模块级函数
+    return [estimate_strength(p) for p in passwords]
+
+
+class AuditReport:
+    """一次体检的结果，按记录 id 给出各类问题。"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.reused: List[List[str]] = []                               # 使用同一密码的记录 id 分组
+        self.weak: Dict[str, Tuple[int, float, Tuple[str, ...]]] = {}   # id -> 强度评估
+        self.old: Dict[str, int] = {}                                   # id -> 已使用天数
+        self.reuse_count: Dict[str, int] = {}                           # id -> 同一密码的记录数
+        self.scores: Dict[str, int] = {}                                # id -> 强度评分
+        self.breached: Dict[str, int] = {}                              # id -> 泄露库中出现次数
+
+    def flagged(self) -> List[str]:
+        """有问题的记录 id，按严重程度排序（已泄露、重复使用、弱密码、陈旧依次降低）。"""
+        ids = set(self.breached) | set(self.reuse_count) | set(self.weak) | set(self.old)
+
+        def severity(rid):
+            score = self.weak[rid][0] if rid in self.weak else WEAK_SCORE
+            return (-self.breached.get(rid, 0), -self.reuse_count.get(rid, 0), score, -self.old.get(rid, 0))
+        return sorted(ids, key=severity)
+
+    def issues(self, rid: str) -> List[str]:
+        out = []
+        if rid in self.breached:
+            out.append(f'出现在泄露密码库中{self.breached[rid]}次')
+        if rid in self.reuse_count:
+            out.append(f'与其他{self.reuse_count[rid] - 1}条记录使用相同密码')
+        if rid in self.weak:
+            score, _bits, reasons = self.weak[rid]
+            out.append(f'{SCORE_LABELS[score]}密码' + (f'（{"、".join(reasons)}）' if reasons else ''))
+        if rid in self.old:
+            out.append(f'已{self.old[rid]}天未更换')
+        return out
+
+
+class PasswordAuditor:
+    """密码体检：重复使用、弱密码与陈旧密码。
+
+    密码只以 HMAC 指纹参与比较与缓存，HMAC 密钥随机生成、只保存在内存中。
+    结果按记录缓存：记录的 id 与版本号（paging.record_rev，每次修改都会递增）未变则沿用上次的指纹，
+    对懒加载快照中重新解密出的新对象同样有效；
+    强度按指纹缓存，只有新出现的密码才需要重新评估，数量大时分给进程池并行计算。
+    """
+
+    def __init__(self, max_age_days: int = AGE_LIMIT_DAYS, workers: Optional[int] = None):
+        self.max_age_days = max_age_days
+        self.workers = workers
+        self._key = secrets.token_bytes(32)
+        # 记录 id -> (版本号, 密码指纹, 创建时间)；不保留记录本身，体检结束后内存中没有明文密码
+        self._entries: Dict[str, Tuple[int, bytes, Optional[float]]] = {}
+        self._strength: Dict[bytes, Tuple[int, float, Tuple[str, ...]]] = {}
+        self._breached: Dict[bytes, int] = {}   # 指纹 -> 泄露库中出现次数（针对 _breach_source）
+        self._breach_source = None
+        # 最近一次体检中重新计算指纹 / 强度的记录数
+        self.rehashed = 0
+        self.estimated = 0
+
+    def fingerprint(self, password: str) -> bytes:
+        return hmac.new(self._key, password.encode('utf-8'), hashlib.sha256).digest()[:16]
+
+    def audit(self, records: Iterable[Dict], now: Optional[float] = None,
+              progress: Optional[Callable[[int, int], None]] = None,
+              cancel: Optional[threading.Event] = None, breach=None) -> AuditReport:
+        """breach 为 breach.BreachCorpus 时同时检查密码是否出现在泄露库中。"""
+        now = time.time() if now is None else now
+        entries: Dict[str, Tuple[int, bytes, Optional[float]]] = {}
+        pending: Dict[bytes, str] = {}
+        unchecked: Dict[bytes, str] = {}
+        self.rehashed = 0
+        if breach is not self._breach_source:
+            self._breached.clear()
+            self._breach_source = breach
+        for rec in records:
+            rid = rec.get('id')
+            if rid is None or not rec.get('password'):
+                continue
+            rev = record_rev(rec)
+            cached = self._entries.get(rid)
+            if cached is not None and cached[0] == rev:
+                fp = cached[1]
+            else:
+                fp = self.fingerprint(rec['password'])
+                self.rehashed += 1
+            created = rec.get('created_at')
+            entries[rid] = (rev, fp, created if isinstance(created, (int, float)) else None)
+            if fp not in self._strength and fp not in pending:
+                pending[fp] = rec['password']
+            if breach is not None and fp not in self._breached:
+                unchecked[fp] = rec['password']
+        self._entries = entries
+        self.estimated = len(pending)
+        self._estimate(pending, progress, cancel)
+        if unchecked:
+            found = breach.check(unchecked.values())
+            for fp, pw in unchecked.items():
+                self._breached[fp] = found.get(pw, 0)
+        used = {fp for _rev, fp, _created in entries.values()}
+        self._strength = {fp: s for fp, s in self._strength.items() if fp in used}
+        self._breached = {fp: n for fp, n in self._breached.items() if fp in used}
+        return self._report(now)
+
+    def _estimate(self, pending: Dict[bytes, str], progress, cancel):
+        fps = list(pending)
+        total = max(len(fps), 1)
+        batches = [fps[i:i + BATCH_SIZE] for i in range(0, len(fps), BATCH_SIZE)]
+        if len(fps) < PARALLEL_MIN or (self.workers or os.cpu_count() or 1) < 2:
+            done = 0
+            for batch in batches:
+                if cancel is not None and cancel.is_set():
+                    raise AuditCancelled()
+                for fp in batch:
+                    self._strength[fp] = estimate_strength(pending[fp])
+                done += len(batch)
+                if progress:
+                    progress(done, total)
+            return
+        done = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(_estimate_batch, [pending[fp] for fp in batch]): batch for batch in batches}
+            try:
+                for fut in as_completed(futures):
+                    if cancel is not None and cancel.is_set():
+                        raise AuditCancelled()
+                    batch = futures[fut]
+                    self._strength.update(zip(batch, fut.result()))
+                    done += len(batch)
+                    if progress:
+                        progress(done, total)
+            except BaseException:
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    def _report(self, now: float) -> AuditReport:
+        report = AuditReport(len(self._entries))
+        groups: Dict[bytes, List[str]] = {}
+        limit = self.max_age_days * 86400
+        for rid, (_rev, fp, created) in self._entries.items():
+            groups.setdefault(fp, []).append(rid)
+            strength = self._strength[fp]
+            report.scores[rid] = strength[0]
+            if self._breached.get(fp):
+                report.breached[rid] = self._breached[fp]
+            if strength[0] < WEAK_SCORE:
+                report.weak[rid] = strength
+            if created is not None and now - created >= limit:
+                report.old[rid] = int((now - created) // 86400)
+        for ids in groups.values():
+            if len(ids) > 1:
+                report.reused.append(ids)
+                for rid in ids:
+                    report.reuse_count[rid] = len(ids)
+        report.reused.sort(key=len, reverse=True)
+        return report
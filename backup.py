@@ -0,0 +1,298 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import secrets
+from typing import Dict, Iterator, List, Optional
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from encryption import derive_key_from_password, encrypt_payload, decrypt_payload, DEFAULT_KDF, NONCE_SIZE
+from persistence import FileLock, atomic_write
+from profiling import timed, incr
+
+
+# 增量去重的加密备份。
+# 保险库按页保存，备份也以页为单位切块：块内容为页内记录的规范 JSON，块名为内容的 HMAC-SHA256
+# （内容寻址，相同内容只存一份；用密钥做 HMAC，块名不会泄露内容）。每个快照只是一份加密的
+# 块清单，未变化的页直接引用已有的块。数据文件中页的 nonce 不变即内容不变，cache.pmcache 记下
+# nonce 到块名的对应关系，再次备份时未变化的页既不解密也不写盘，耗时与新增空间都只随改动量增长。
+# 备份用单独的备份密码加密（不依赖 secret.key），丢失密钥文件时仍可恢复。
+# 布局:
+#   backup.json               版本、盐、KDF 参数与校验密码用的密文
+#   chunks/ab/<块名>           nonce | AES-GCM(块内容)，块名作为附加认证数据
+#   snapshots/<快照 id>.snap   nonce | AES-GCM(快照清单 JSON)，快照 id 作为附加认证数据
+#   cache.pmcache             页 nonce -> [块名, 条数]
+BACKUP_VERSION = 1
+INFO_FILE = 'backup.json'
+CHUNK_DIR = 'chunks'
+SNAPSHOT_DIR = 'snapshots'
+SNAPSHOT_SUFFIX = '.snap'
+CACHE_FILE = 'cache.pmcache'
+LOCK_FILE = '.lock'
+_SALT_SIZE = 16
+
+
+def _chunk_data(records: List[Dict]) -> bytes:
+    # 规范化序列化：同样的记录总是得到同样的字节，才能按内容去重
+    return json.dumps(records, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+class BackupRepo:
+    """备份目录。create() 生成快照，restore() 按时间点恢复，prune() 按保留规则清理，verify() 校验完整性。"""
+
+    def __init__(self, path: str, password: str, kdf: Optional[dict] = None):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.join(self.path, CHUNK_DIR), exist_ok=True)
+        os.makedirs(os.path.join(self.path, SNAPSHOT_DIR), exist_ok=True)
+        self._lock = FileLock(os.path.join(self.path, LOCK_FILE))
+        info_path = os.path.join(self.path, INFO_FILE)
+        if os.path.exists(info_path):
+            with open(info_path, 'r', encoding='utf-8') as f:
+                info = json.load(f)
+            if info.get('version') != BACKUP_VERSION:
+                raise ValueError(f'不支持的备份目录版本: {info.get("version")}')
+            self._derive(password, base64.b64decode(info['salt']), info['kdf'])
+            try:
+                decrypt_payload(self._enc_key, info['check'])
+            except InvalidTag:
+                raise ValueError('备份密码错误')
+        else:
+            kdf = kdf or DEFAULT_KDF
+            salt = secrets.token_bytes(_SALT_SIZE)
+            self._derive(password, salt, kdf)
+            info = {'version': BACKUP_VERSION, 'salt': base64.b64encode(salt).decode('ascii'), 'kdf': kdf,
+                    'check': encrypt_payload(self._enc_key, {'backup': BACKUP_VERSION})}
+            with self._lock:
+                atomic_write(info_path, json.dumps(info, ensure_ascii=False).encode('utf-8'))
+
+    def _derive(self, password: str, salt: bytes, kdf: dict):
+        master = derive_key_from_password(password, salt, kdf)
+        self._enc_key = hmac.new(master, b'pm-backup-encrypt', hashlib.sha256).digest()
+        self._mac_key = hmac.new(master, b'pm-backup-chunk-id', hashlib.sha256).digest()
+
+    # 加密文件
+    def _seal(self, path: str, data: bytes, aad: str):
+        nonce = secrets.token_bytes(NONCE_SIZE)
+        atomic_write(path, nonce + AESGCM(self._enc_key).encrypt(nonce, data, aad.encode('utf-8')))
+
+    def _open(self, path: str, aad: str) -> bytes:
+        with open(path, 'rb') as f:
+            buf = f.read()
+        return AESGCM(self._enc_key).decrypt(buf[:NONCE_SIZE], buf[NONCE_SIZE:], aad.encode('utf-8'))
+
+    def _chunk_path(self, cid: str) -> str:
+        return os.path.join(self.path, CHUNK_DIR, cid[:2], cid)
+
+    def _snapshot_path(self, sid: str) -> str:
+        return os.path.join(self.path, SNAPSHOT_DIR, sid + SNAPSHOT_SUFFIX)
+
+    def _chunk_id(self, data: bytes) -> str:
+        return hmac.new(self._mac_key, data, hashlib.sha256).hexdigest()
+
+    def _read_chunk(self, cid: str) -> List[Dict]:
+        data = self._open(self._chunk_path(cid), cid)
+        if not hmac.compare_digest(self._chunk_id(data), cid):
+            raise ValueError(f'备份块内容与块名不符: {cid}')
+        return json.loads(data.decode('utf-8'))
+
+    def _load_cache(self) -> Dict[str, List]:
+        try:
+            return json.loads(self._open(os.path.join(self.path, CACHE_FILE), CACHE_FILE).decode('utf-8'))
+        except (OSError, InvalidTag, ValueError):
+            return {}  # 缓存缺失或损坏只影响速度：所有页重新解密并按内容去重
+
+    # 快照
+    @timed('backup.create')
+    def create(self, store, label: str = '') -> Dict:
+        """为 store 的当前内容建立快照，返回快照信息：新写入的块数与字节数，以及缓存未命中、
+        需要序列化并计算块名的页数（hashed_pages）。"""
+        store.flush()
+        pages = store.accounts.clone(with_ids=False)
+        with self._lock:
+            cache = self._load_cache()
+            new_cache: Dict[str, List] = {}
+            manifest: List[List] = []
+            new_chunks = new_bytes = hashed = records = 0
+            for nonce, load in pages.iter_pages():
+                key = nonce.hex() if nonce is not None else None
+                hit = cache.get(key) if key else None
+                if hit is not None and os.path.exists(self._chunk_path(hit[0])):
+                    cid, count = hit
+                else:
+                    hashed += 1
+                    recs = load()
+                    data = _chunk_data(recs)
+                    cid, count = self._chunk_id(data), len(recs)
+                    path = self._chunk_path(cid)
+                    if not os.path.exists(path):
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        self._seal(path, data, cid)
+                        new_chunks += 1
+                        new_bytes += len(data)
+                        incr('backup.chunks_written')
+                if key:
+                    new_cache[key] = [cid, count]
+                manifest.append([cid, count])
+                records += count
+            ts = time.time()
+            # 快照 id 按时间排序（精确到毫秒），随机后缀避免两个进程同时备份时重名
+            sid = time.strftime('%Y%m%d-%H%M%S', time.localtime(ts))
+            sid += f'{int(ts * 1000) % 1000:03d}-{secrets.token_hex(2)}'
+            snap = {'id': sid, 'ts': ts, 'label': label, 'records': records, 'pages': manifest}
+            self._seal(self._snapshot_path(sid), json.dumps(snap, ensure_ascii=False).encode('utf-8'), sid)
+            self._seal(os.path.join(self.path, CACHE_FILE), json.dumps(new_cache).encode('utf-8'), CACHE_FILE)
+        return {'id': sid, 'ts': snap['ts'], 'label': label, 'records': records, 'chunks': len(manifest),
+                'new_chunks': new_chunks, 'new_bytes': new_bytes, 'hashed_pages': hashed}
+
+    def snapshot_ids(self) -> List[str]:
+        names = os.listdir(os.path.join(self.path, SNAPSHOT_DIR))
+        return sorted(n[:-len(SNAPSHOT_SUFFIX)] for n in names if n.endswith(SNAPSHOT_SUFFIX))
+
+    def load_snapshot(self, sid: str) -> Dict:
+        path = self._snapshot_path(sid)
+        if not os.path.exists(path):
+            raise ValueError(f'没有这个快照: {sid}')
+        try:
+            return json.loads(self._open(path, sid).decode('utf-8'))
+        except InvalidTag:
+            raise ValueError(f'快照已损坏: {sid}')
+
+    def snapshots(self) -> List[Dict]:
+        """全部快照（从旧到新），不含块清单。"""
+        out = []
+        for sid in self.snapshot_ids():
+            snap = self.load_snapshot(sid)
+            out.append({'id': sid, 'ts': snap['ts'], 'label': snap.get('label', ''), 'records': snap['records'],
+                        'chunks': len(snap['pages'])})
+        return out
+
+    def resolve(self, name: str) -> str:
+        """快照 id、其唯一前缀或 latest。"""
+        ids = self.snapshot_ids()
+        if name == 'latest':
+            if not ids:
+                raise ValueError('备份目录中还没有快照')
+            return ids[-1]
+        matches = [sid for sid in ids if sid.startswith(name)]
+        if len(matches) != 1:
+            raise ValueError(f'没有这个快照: {name}' if not matches else f'快照前缀不唯一: {name}')
+        return matches[0]
+
+    def records(self, sid: str) -> Iterator[Dict]:
+        for cid, count in self.load_snapshot(sid)['pages']:
+            try:
+                recs = self._read_chunk(cid)
+            except (OSError, InvalidTag):
+                raise ValueError(f'备份块缺失或已损坏: {cid}')
+            if len(recs) != count:
+                raise ValueError(f'备份块条数与清单不符: {cid}')
+            yield from recs
+
+    @timed('backup.restore')
+    def restore(self, sid: str, store) -> Dict[str, int]:
+        """把 store 恢复到快照时的内容（一个事务）：快照之后新增的记录删除，改动过的记录改回，
+        被删除的记录按原 id 重新加入。内容未变的记录不动，不会因恢复而产生多余的同步。"""
+        snap = {rec['id']: rec for rec in self.records(sid)}
+        added = updated = 0
+        with store.transaction():
+            removed = store.delete_many([rid for rid in store.accounts.ids() if rid not in snap])
+            changes = {}
+            for rid, rec in snap.items():
+                fields = {k: v for k, v in rec.items() if k not in ('id', 'rev')}
+                old = store.get(rid)
+                if old is None:
+                    store.add(dict(fields, id=rid))
+                    added += 1
+                elif any(old.get(k) != v for k, v in fields.items()):
+                    changes[rid] = fields
+            updated = store.update_many(changes)
+        return {'added': added, 'updated': updated, 'removed': removed}
+
+    # 清理与校验
+    @timed('backup.prune')
+    def prune(self, keep_last: int = 0, keep_daily: int = 0, keep_weekly: int = 0, keep_monthly: int = 0,
+              dry_run: bool = False) -> Dict:
+        """按保留规则删除快照，再删除不再被任何快照引用的块。
+
+        keep_last 保留最近 N 个；keep_daily/weekly/monthly 在最近 N 个有快照的日/周/月中各保留最新一个。
+        """
+        if not (keep_last or keep_daily or keep_weekly or keep_monthly):
+            raise ValueError('至少需要一条保留规则')
+        with self._lock:
+            snaps = sorted(self.snapshots(), key=lambda s: s['ts'], reverse=True)
+            keep = set(s['id'] for s in snaps[:keep_last])
+            for n, fmt in ((keep_daily, '%Y-%m-%d'), (keep_weekly, '%G-%V'), (keep_monthly, '%Y-%m')):
+                seen = set()
+                for s in snaps:
+                    if len(seen) >= n:
+                        break
+                    period = time.strftime(fmt, time.localtime(s['ts']))
+                    if period not in seen:
+                        seen.add(period)
+                        keep.add(s['id'])
+            drop = [s['id'] for s in snaps if s['id'] not in keep]
+            result = {'kept': sorted(keep), 'removed': sorted(drop), 'chunks_removed': 0, 'bytes_freed': 0}
+            if dry_run:
+                return result
+            for sid in drop:
+                os.remove(self._snapshot_path(sid))
+            used = set()
+            for sid in keep:
+                used.update(cid for cid, _n in self.load_snapshot(sid)['pages'])
+            for cid, path in self._all_chunks():
+                if cid not in used:
+                    result['bytes_freed'] += os.path.getsize(path)
+                    os.remove(path)
+                    result['chunks_removed'] += 1
+        return result
+
+    def _all_chunks(self) -> Iterator:
+        root = os.path.join(self.path, CHUNK_DIR)
+        for sub in sorted(os.listdir(root)):
+            d = os.path.join(root, sub)
+            if os.path.isdir(d):
+                for name in sorted(os.listdir(d)):
+                    if not name.endswith('.tmp'):
+                        yield name, os.path.join(d, name)
+
+    @timed('backup.verify')
+    def verify(self, sid: Optional[str] = None, full: bool = True) -> Dict:
+        """校验快照（默认全部）：块是否齐全；full 时逐块解密、核对块名与条数（每个块只读一次）。"""
+        ids = [sid] if sid else self.snapshot_ids()
+        counts: Dict[str, int] = {}
+        bad_snapshots = []
+        for s in ids:
+            try:
+                pages = self.load_snapshot(s)['pages']
+            except ValueError:
+                bad_snapshots.append(s)
+                continue
+            for cid, n in pages:
+                counts[cid] = n
+        missing, corrupt = [], []
+        for cid, n in counts.items():
+            path = self._chunk_path(cid)
+            if not os.path.exists(path):
+                missing.append(cid)
+            elif full:
+                try:
+                    if len(self._read_chunk(cid)) != n:
+                        corrupt.append(cid)
+                except (InvalidTag, ValueError):
+                    corrupt.append(cid)
+        used = counts.keys() if not sid else None
+        orphans = sum(1 for cid, _p in self._all_chunks() if cid not in used) if used is not None else 0
+        return {'snapshots': len(ids), 'chunks': len(counts), 'bad_snapshots': bad_snapshots,
+                'missing': missing, 'corrupt': corrupt, 'orphans': orphans,
+                'ok': not (bad_snapshots or missing or corrupt)}
+
+    def size(self) -> int:
+        """备份目录占用的字节数。"""
+        total = 0
+        for root, _dirs, files in os.walk(self.path):
+            total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+        return total
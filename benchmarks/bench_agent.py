@@ -0,0 +1,116 @@
+"""常驻代理的查询延迟与并发吞吐。
+
+在临时目录生成保险库（设置启动密码，PBKDF2 默认参数），启动 python -m agent，然后测量:
+  - 单连接串行 get / search 的延迟分布（p50/p99）
+  - 多个 asyncio 连接同时发送 get 的总吞吐
+  - 对照：python -m cli get 每次都要派生密钥并读取保险库的耗时
+
+用法: python benchmarks/bench_agent.py [记录数] [并发连接数]
+"""
+import os
+import sys
+import time
+import json
+import struct
+import asyncio
+import tempfile
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from synthetic import build_vault  # noqa: E402
+
+PASSWORD = 'bench-master'
+
+
+def _pct(samples, p):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(len(s) * p))] * 1000
+
+
+async def _client(path: str, keys, latencies):
+    from agent import encode_frame
+    reader, writer = await asyncio.open_unix_connection(path)
+    for i, key in enumerate(keys):
+        t0 = time.perf_counter()
+        writer.write(encode_frame({'id': i, 'op': 'get', 'key': key, 'field': 'password'}))
+        size = struct.unpack('>I', await reader.readexactly(4))[0]
+        resp = json.loads(await reader.readexactly(size))
+        latencies.append(time.perf_counter() - t0)
+        assert resp['ok'], resp
+    writer.close()
+
+
+async def _concurrent(path: str, ids, clients: int, per_client: int):
+    latencies = []
+    tasks = [_client(path, [ids[(c * 7919 + i) % len(ids)] for i in range(per_client)], latencies)
+             for c in range(clients)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - t0, latencies
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = build_vault(os.path.join(tmp, 'vault'), records)
+        from storage import KeyManager
+        km = KeyManager()
+        km.load(None)
+        km.set_password(PASSWORD)
+        sock = os.path.join(tmp, 'run', 'agent.sock')
+        env = dict(os.environ, PM_DATA_DIR=data_dir, PM_MASTER_PASSWORD=PASSWORD, QT_QPA_PLATFORM='offscreen')
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, '-m', 'agent', '--socket', sock, '--idle', '0'],
+                                cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+        try:
+            proc.stdout.readline()  # “代理已启动”
+            print(f'{records} 条记录，代理启动并解锁 {time.perf_counter() - t0:.2f} s')
+            from agent import AgentClient
+            with AgentClient(sock) as c:
+                ids = [r['id'] for r in c.call('search', query='')]
+                accounts = [r['account'] for r in c.call('search', query='wang', limit=200)]
+                lat = []
+                for i in range(2000):
+                    t = time.perf_counter()
+                    c.call('get', key=ids[i * 7 % len(ids)], field='password')
+                    lat.append(time.perf_counter() - t)
+                print(f'get(id)      单连接  p50 {_pct(lat, .5):.3f} ms  p99 {_pct(lat, .99):.3f} ms')
+                lat = []
+                for i in range(500):
+                    t = time.perf_counter()
+                    try:
+                        c.call('get', key=accounts[i % len(accounts)], field='password')
+                    except Exception:
+                        pass  # 同名账号有多条记录
+                    lat.append(time.perf_counter() - t)
+                print(f'get(账号)    单连接  p50 {_pct(lat, .5):.3f} ms  p99 {_pct(lat, .99):.3f} ms')
+                lat = []
+                for q in ['wang', 'zhang1', '淘宝', 'gmail.com', '1380', 'li', '工作'] * 20:
+                    t = time.perf_counter()
+                    c.call('search', query=q, limit=50)
+                    lat.append(time.perf_counter() - t)
+                print(f'search       单连接  p50 {_pct(lat, .5):.3f} ms  p99 {_pct(lat, .99):.3f} ms')
+            per_client = 500
+            elapsed, lat = asyncio.run(_concurrent(sock, ids, clients, per_client))
+            total = clients * per_client
+            print(f'get(id)  {clients:3d} 个连接  {total / elapsed:,.0f} 次/秒  '
+                  f'p50 {_pct(lat, .5):.3f} ms  p99 {_pct(lat, .99):.3f} ms')
+            with AgentClient(sock) as c:
+                c.call('stop')
+        finally:
+            proc.wait(timeout=10)
+        best = float('inf')
+        for _ in range(3):
+            t = time.perf_counter()
+            subprocess.run([sys.executable, '-m', 'cli', 'get', ids[0], '--field', 'password'], cwd=ROOT, env=env,
+                           check=True, stdout=subprocess.DEVNULL)
+            best = min(best, time.perf_counter() - t)
+        print(f'对照 cli get（每次派生密钥并读取保险库） {best * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
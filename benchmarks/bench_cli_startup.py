@@ -0,0 +1,74 @@
+"""命令行工具与图形界面的冷启动耗时对比。
+
+在临时数据目录中生成一个保险库，分别测量:
+  - python -m cli --json unlock      （读取保险库并输出记录数）
+  - 图形界面构造完 PasswordManagerApp （offscreen 平台，不显示窗口）
+每项取多次运行中的最小值，并确认命令行工具没有加载 PyQt5。
+
+用法: python benchmarks/bench_cli_startup.py [记录数] [次数]
+"""
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+GUI_SNIPPET = (
+    'import os, sys; os.environ["QT_QPA_PLATFORM"] = "offscreen"\n'
+    'from PyQt5 import QtWidgets\n'
+    'import main\n'
+    'app = QtWidgets.QApplication([])\n'
+    'w = main.PasswordManagerApp()\n'
+)
+CLI_NO_QT = 'import sys, cli; sys.exit(cli.main(["--json", "unlock"]) or ("PyQt5" in sys.modules))'
+
+
+def _prepare(data_dir: str, records: int):
+    os.environ['PM_DATA_DIR'] = data_dir
+    from storage import KeyManager, SecureStorage
+    km = KeyManager()
+    km.load(None)
+    store = SecureStorage(km)
+    store.load()
+    store.add_many({'website': f'site{i}.com', 'account': f'user{i}', 'password': f'pw{i}',
+                    'created_at': int(time.time())} for i in range(records))
+    store.close()
+
+
+def _best(cmd, env, rounds: int) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with tempfile.TemporaryDirectory() as d:
+        _prepare(d, records)
+        env = dict(os.environ, PM_DATA_DIR=d)
+        # 退出码非 0 说明命令行工具加载了 PyQt5
+        subprocess.run([sys.executable, '-c', CLI_NO_QT], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+        cli = _best([sys.executable, '-m', 'cli', '--json', 'unlock'], env, rounds)
+        base = _best([sys.executable, '-c', 'pass'], env, rounds)
+        try:
+            gui = _best([sys.executable, '-c', GUI_SNIPPET], env, rounds)
+        except subprocess.CalledProcessError:
+            gui = None
+    print(f'保险库 {records} 条记录，取 {rounds} 次最小值')
+    print(f'  python 空启动:  {base * 1000:7.1f} ms')
+    print(f'  命令行 unlock:  {cli * 1000:7.1f} ms')
+    if gui is not None:
+        print(f'  图形界面启动:   {gui * 1000:7.1f} ms  （命令行为其 {cli / gui:.0%}）')
+    else:
+        print('  图形界面启动:   无法运行（缺少 PyQt5 或显示平台）')
+
+
+if __name__ == '__main__':
+    main()
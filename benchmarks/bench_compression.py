@@ -0,0 +1,94 @@
+"""加密前压缩（none / zlib / lzma）对保存、加载耗时与文件大小的影响。
+
+对每种压缩算法用同一批合成记录测量:
+  - 全量保存   （所有页压缩 + 加密 + 打包写出，与导入大量数据或 recompress 的写入量相当）
+  - 打开       （读取文件、解密索引头，SecureStorage.load）
+  - 解密全部页 （打开后遍历所有记录，如导出、密码体检）
+  - 单条修改   （update 一条记录后 compact，只有一页重新压缩加密）
+  - 数据文件大小
+每项取多次运行中的最小值。
+
+用法: python benchmarks/bench_compression.py [记录数] [次数]
+"""
+import os
+import sys
+import time
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from synthetic import generate_records  # noqa: E402
+
+CODECS = ['none', 'zlib', 'lzma']
+
+
+def _best(fn, runs: int) -> float:
+    best = float('inf')
+    for _ in range(runs):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000
+
+
+def _measure(codec: str, records, data_dir: str, runs: int) -> dict:
+    os.makedirs(data_dir, exist_ok=True)
+    os.environ['PM_DATA_DIR'] = data_dir
+    from encryption import set_compression, pack_vault
+    from paging import PagedAccounts
+    from persistence import atomic_write
+    from storage import KeyManager, SecureStorage, data_path
+    set_compression(codec)
+    km = KeyManager()
+    km.load(None)
+    key = km.key
+
+    def full_save():
+        index, pages = PagedAccounts.from_records(key, records).seal(key)
+        atomic_write(data_path(), pack_vault(key, {'pages': index, 'ts': int(time.time())}, pages))
+
+    result = {'save': _best(full_save, runs)}
+    result['load'] = _best(lambda: SecureStorage(km, journal=False).load(), runs)
+
+    def load_all():
+        store = SecureStorage(km, journal=False)
+        store.load()
+        for _ in store.accounts:
+            pass
+
+    result['all'] = _best(load_all, runs)
+    store = SecureStorage(km, journal=False)
+    store.load()
+    rid = store.accounts[len(records) // 2]['id']
+
+    def one_edit():
+        store.update_many({rid: {'note': f'bench {time.perf_counter()}'}})
+        store.compact()
+
+    result['edit'] = _best(one_edit, runs)
+    store.close()
+    result['size'] = os.path.getsize(data_path())
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    records = list(generate_records(count))
+    print(f'{count} 条记录，每项取 {runs} 次中的最小值')
+    print(f'{"算法":<6}{"全量保存":>10}{"打开":>10}{"解密全部页":>12}{"单条修改":>10}{"文件大小":>14}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec in CODECS:
+            try:
+                r = _measure(codec, records, os.path.join(tmp, codec), runs)
+            except ValueError as e:
+                print(f'{codec:<6}跳过: {e}')
+                continue
+            print(f'{codec:<8}{r["save"]:8.1f} ms{r["load"]:7.1f} ms{r["all"]:9.1f} ms'
+                  f'{r["edit"]:7.1f} ms{r["size"] / 1024:10.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
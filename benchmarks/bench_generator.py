@@ -0,0 +1,33 @@
+"""批量账号密码生成吞吐量测试。
+
+用法: python benchmarks/bench_generator.py [数量]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generator import build_charset, generate_credentials  # noqa: E402
+
+
+def bench(count: int = 100_000, rounds: int = 3) -> float:
+    acc_cs = build_charset(True, True, True)
+    pw_cs = build_charset(True, True, True, True)
+    best = float('inf')
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        creds = generate_credentials(count, acc_cs, 8, pw_cs, 12)
+        best = min(best, time.perf_counter() - t0)
+        assert len(creds) == count and len({a for a, _ in creds}) == count
+    return count / best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rate = bench(count)
+    print(f'generate_credentials: {count} 条, {rate:,.0f} 条/秒')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,481 @@
+"""性能基准测试套件：加密、存储、搜索、导入导出、同步、备份与表格渲染。
+
+每个用例按记录数分别测量耗时（多次运行取最小值）与 Python 堆内存峰值（tracemalloc，
+不含 Qt 等 C++ 层分配），结果写成 JSON；指定基准文件时逐项对比并标出变慢的用例。
+
+用法:
+  python benchmarks/suite.py [--sizes 1000,10000] [--only storage,search] [--rounds 3]
+                             [--output 结果.json] [--baseline 基准.json] [--tolerance 0.2]
+对比时有用例变慢超过容差则以退出码 1 结束，便于在 CI 中使用。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from synthetic import generate_records, build_vault  # noqa: E402
+
+# 用于归档导出的低代价 KDF：只测量分段加密本身，KDF 另有单独的用例
+FAST_KDF = {'name': 'pbkdf2-sha256', 'iterations': 1000}  # 即 encryption.KDF_PBKDF2
+# 对比时忽略绝对差值小于该值（秒）的波动，亚毫秒级用例的计时噪声远大于容差
+NOISE_FLOOR = 0.0005
+
+
+class Context:
+    """某一数据规模下的测试环境：一个预先生成的保险库目录与同样内容的记录列表。"""
+
+    def __init__(self, size: int, workdir: str):
+        self.size = size
+        self.workdir = workdir
+        self.vault_dir = build_vault(os.path.join(workdir, f'vault-{size}'), size)
+        self._records: Optional[List[Dict]] = None
+
+    @property
+    def records(self) -> List[Dict]:
+        if self._records is None:
+            self._records = list(generate_records(self.size))
+        return self._records
+
+    def use(self, data_dir: str):
+        os.environ['PM_DATA_DIR'] = data_dir
+
+    def open_store(self, data_dir: Optional[str] = None, **kw):
+        from storage import KeyManager, SecureStorage
+        self.use(data_dir or self.vault_dir)
+        km = KeyManager()
+        km.load(None)
+        store = SecureStorage(km, **kw)
+        store.load()
+        return store
+
+    def scratch(self, name: str) -> str:
+        """vault 的一份拷贝，供会修改数据的用例使用。"""
+        path = os.path.join(self.workdir, name)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        shutil.copytree(self.vault_dir, path)
+        return path
+
+    def empty(self, name: str) -> str:
+        path = os.path.join(self.workdir, name)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        return path
+
+
+# 用例注册：函数接收 Context，完成准备工作后返回被计时的无参函数
+CASES: Dict[str, Callable] = {}
+FIXED = set()  # 与数据规模无关的用例，只测一次
+
+
+def case(name: str, fixed: bool = False):
+    def deco(fn):
+        CASES[name] = fn
+        if fixed:
+            FIXED.add(name)
+        return fn
+    return deco
+
+
+@case('kdf.pbkdf2', fixed=True)
+def _kdf_pbkdf2(ctx):
+    from encryption import derive_key_from_password, DEFAULT_KDF
+    return lambda: derive_key_from_password('benchmark', b'\0' * 16, DEFAULT_KDF)
+
+
+@case('kdf.scrypt', fixed=True)
+def _kdf_scrypt(ctx):
+    from encryption import derive_key_from_password, KDF_SCRYPT, MIN_SCRYPT_N
+    kdf = {'name': KDF_SCRYPT, 'n': MIN_SCRYPT_N, 'r': 8, 'p': 1}
+    return lambda: derive_key_from_password('benchmark', b'\0' * 16, kdf)
+
+
+@case('crypto.encrypt_payload')
+def _encrypt_payload(ctx):
+    from encryption import encrypt_payload, generate_aes_key
+    key, payload = generate_aes_key(), {'accounts': ctx.records}
+    return lambda: encrypt_payload(key, payload)
+
+
+@case('crypto.decrypt_payload')
+def _decrypt_payload(ctx):
+    from encryption import encrypt_payload, decrypt_payload, generate_aes_key
+    key = generate_aes_key()
+    blob = encrypt_payload(key, {'accounts': ctx.records})
+    return lambda: decrypt_payload(key, blob)
+
+
+@case('crypto.seal_pages')
+def _seal_pages(ctx):
+    from encryption import generate_aes_key
+    from paging import PagedAccounts
+    key = generate_aes_key()
+    return lambda: PagedAccounts.from_records(key, ctx.records).seal(key)
+
+
+@case('storage.load')
+def _load(ctx):
+    return lambda: ctx.open_store()
+
+
+@case('storage.load_all_pages')
+def _load_all(ctx):
+    return lambda: sum(1 for _ in ctx.open_store().accounts)
+
+
+@case('storage.save_full')
+def _save_full(ctx):
+    from paging import PagedAccounts
+    store = ctx.open_store(ctx.scratch('save-full'))
+    records = list(store.accounts)
+
+    def run():
+        store.accounts = PagedAccounts.from_records(store.key_mgr.key, records)
+        store.save()
+    return run
+
+
+@case('storage.save_one_edit')
+def _save_one(ctx):
+    store = ctx.open_store(ctx.scratch('save-one'))
+    rid = store.accounts.ids()[ctx.size // 2]
+
+    def run():
+        store.update(rid, {'note': str(time.perf_counter())})
+        store.save()
+    return run
+
+
+@case('storage.add_100_journal')
+def _add_journal(ctx):
+    store = ctx.open_store(ctx.scratch('add-journal'))
+    extra = list(generate_records(100, seed=7))
+    return lambda: [store.add(dict(r)) for r in extra]
+
+
+@case('search.first_query')
+def _search_first(ctx):
+    store = ctx.open_store()
+    store.search('a')  # 先解密所有页，只测索引构建与查询
+
+    def run():
+        store._index = None
+        return store.search('wang')
+    return run
+
+
+@case('search.cached')
+def _search_cached(ctx):
+    store = ctx.open_store()
+    store.search('taobao')
+    return lambda: store.search('taobao')
+
+
+@case('search.typing')
+def _search_typing(ctx):
+    store = ctx.open_store()
+    store.search('x')
+    queries = ['z', 'zh', 'zha', 'zhan', 'zhang', 'zhang1', 'zhang', 'zhan', 'zh', '淘', '淘宝']
+
+    def run():
+        store.generation += 1  # 清空查询缓存
+        return [len(store.search(q)) for q in queries]
+    return run
+
+
+@case('io.export_csv')
+def _export_csv(ctx):
+    store = ctx.open_store()
+    path = os.path.join(ctx.workdir, 'export.csv')
+    return lambda: store.export_csv(path)
+
+
+@case('io.import_csv')
+def _import_csv(ctx):
+    src = ctx.open_store()
+    path = os.path.join(ctx.workdir, 'import.csv')
+    src.export_csv(path)
+
+    def run():
+        store = ctx.open_store(ctx.empty('import-csv'))
+        store.import_csv(path)
+        store.close()
+    return run
+
+
+@case('io.export_archive')
+def _export_archive(ctx):
+    store = ctx.open_store()
+    path = os.path.join(ctx.workdir, 'export.pmarc')
+    return lambda: store.export_archive(path, 'benchmark', FAST_KDF)
+
+
+@case('io.import_archive')
+def _import_archive(ctx):
+    path = os.path.join(ctx.workdir, 'import.pmarc')
+    ctx.open_store().export_archive(path, 'benchmark', FAST_KDF)
+
+    def run():
+        store = ctx.open_store(ctx.empty('import-archive'))
+        store.import_files([path], password='benchmark')
+        store.close()
+    return run
+
+
+def _sync_pair(ctx, changes: int):
+    """两份相同的保险库，在其中一份上修改 changes 条记录；计时部分只含同步本身。"""
+    from sync import VaultReplica
+    a = VaultReplica.open(ctx.scratch('sync-a'))
+    b = VaultReplica.open(ctx.scratch('sync-b'))
+    if changes:
+        ids = a.store.accounts.ids()
+        ctx.use(a.data_dir)
+        a.store.update_many({ids[i * len(ids) // changes]: {'note': f'sync-{i}'} for i in range(changes)})
+    return a, b
+
+
+@case('sync.unchanged')
+def _sync_unchanged(ctx):
+    from sync import sync
+    a, b = _sync_pair(ctx, 0)
+    return lambda: sync(a, b)
+
+
+@case('sync.10_changes')
+def _sync_changes(ctx):
+    from sync import sync
+    a, b = _sync_pair(ctx, 10)
+    return lambda: sync(a, b)
+
+
+@case('sync.to_dir_10_changes')
+def _sync_dir(ctx):
+    from sync import DirReplica, sync
+    a, b = _sync_pair(ctx, 0)
+    path = ctx.empty('sync-dir')
+    sync(b, DirReplica(path, 'benchmark', FAST_KDF))
+    a, _b = _sync_pair(ctx, 10)
+    d = DirReplica(path, 'benchmark')
+    return lambda: sync(a, d)
+
+
+@case('backup.initial')
+def _backup_initial(ctx):
+    from backup import BackupRepo
+    store = ctx.open_store()
+    repo = BackupRepo(ctx.empty('backup-initial'), 'benchmark', FAST_KDF)
+    return lambda: repo.create(store)
+
+
+@case('backup.unchanged')
+def _backup_unchanged(ctx):
+    from backup import BackupRepo
+    store = ctx.open_store()
+    repo = BackupRepo(ctx.empty('backup-unchanged'), 'benchmark', FAST_KDF)
+    repo.create(store)
+    return lambda: repo.create(store)
+
+
+@case('backup.one_edit')
+def _backup_one_edit(ctx):
+    from backup import BackupRepo
+    store = ctx.open_store(ctx.scratch('backup-edit'))
+    repo = BackupRepo(ctx.empty('backup-one-edit'), 'benchmark', FAST_KDF)
+    repo.create(store)
+    store.update(store.accounts.ids()[ctx.size // 2], {'note': str(time.perf_counter())})
+    store.save()
+    return lambda: repo.create(store)
+
+
+# 表格渲染（offscreen 平台）
+_qt_app = None
+
+
+def _qt_window(ctx):
+    global _qt_app
+    from PyQt5 import QtWidgets
+    if _qt_app is None:
+        _qt_app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    import main
+    ctx.use(ctx.vault_dir)
+    w = main.PasswordManagerApp()
+    w.resize(1280, 800)
+    w.show()
+    _qt_app.processEvents()
+    return w
+
+
+@case('qt.window')
+def _qt_build(ctx):
+    def run():
+        w = _qt_window(ctx)
+        w.store.close()
+        w.deleteLater()
+    return run
+
+
+@case('qt.refresh_table')
+def _qt_refresh(ctx):
+    w = _qt_window(ctx)
+
+    def run():
+        w.refresh_table()
+        w.table.viewport().grab()  # 强制绘制可见行
+    return run
+
+
+@case('qt.scroll_render')
+def _qt_scroll(ctx):
+    w = _qt_window(ctx)
+    bar = w.table.verticalScrollBar()
+
+    def run():
+        for i in range(20):
+            bar.setValue(bar.maximum() * i // 19)
+            w.table.viewport().grab()
+    return run
+
+
+@case('qt.search_refresh')
+def _qt_search(ctx):
+    w = _qt_window(ctx)
+
+    def run():
+        for q in ('wang', '淘宝', 'gmail', ''):
+            w.search_edit.setText(q)
+            w.on_search()
+            w.table.viewport().grab()
+    return run
+
+
+@case('qt.toggle_password')
+def _qt_toggle(ctx):
+    w = _qt_window(ctx)
+
+    def run():
+        for checked in (True, False):
+            w.cb_show_pwd.setChecked(checked)
+            w.table.viewport().grab()
+    return run
+
+
+def measure(make: Callable[[], Callable], rounds: int) -> Dict:
+    """计时取 rounds 次中的最小值；另跑一次统计 tracemalloc 峰值（避免影响计时）。"""
+    best = float('inf')
+    for _ in range(rounds):
+        fn = make()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    fn = make()
+    tracemalloc.start()
+    try:
+        fn()
+        _cur, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': round(best, 6), 'peak_kib': peak // 1024}
+
+
+def run_suite(sizes: List[int], only: Optional[List[str]], rounds: int, log=print) -> Dict:
+    names = [n for n in CASES if not only or any(n == o or n.startswith(o + '.') for o in only)]
+    results: Dict[str, Dict] = {}
+    skipped: Dict[str, str] = {}
+    workdir = tempfile.mkdtemp(prefix='pm-bench-')
+    try:
+        for size in sizes:
+            t0 = time.perf_counter()
+            ctx = Context(size, workdir)
+            log(f'[{size} 条] 生成保险库 {time.perf_counter() - t0:.1f}s')
+            for name in names:
+                key = name if name in FIXED else f'{name}@{size}'
+                if key in results or name in skipped:
+                    continue
+                try:
+                    results[key] = dict(measure(lambda: CASES[name](ctx), rounds), size=None if name in FIXED else size)
+                except ImportError as e:
+                    skipped[name] = str(e)
+                    log(f'  {name:28s} 跳过: {e}')
+                    continue
+                r = results[key]
+                log(f'  {key:36s} {r["seconds"] * 1000:10.2f} ms  峰值 {r["peak_kib"]:>8} KiB')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        'meta': {
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'machine': platform.machine(), 'cpu_count': os.cpu_count(),
+            'timestamp': int(time.time()), 'sizes': sizes, 'rounds': rounds,
+        },
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float, log=print) -> List[str]:
+    """逐项对比耗时，返回变慢超过 tolerance（比例）的用例名。"""
+    regressions = []
+    base = baseline.get('results', {})
+    log(f'\n与基准对比（容差 {tolerance:.0%}）:')
+    for key, r in current['results'].items():
+        b = base.get(key)
+        if not b or not b.get('seconds'):
+            log(f'  {key:36s} 新用例')
+            continue
+        ratio = r['seconds'] / b['seconds']
+        flag = ''
+        if abs(r['seconds'] - b['seconds']) < NOISE_FLOOR:
+            pass
+        elif ratio > 1 + tolerance:
+            flag = '  ← 变慢'
+            regressions.append(key)
+        elif ratio < 1 - tolerance:
+            flag = '  ← 变快'
+        log(f'  {key:36s} {b["seconds"] * 1000:10.2f} → {r["seconds"] * 1000:10.2f} ms  x{ratio:5.2f}{flag}')
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description='性能基准测试套件')
+    p.add_argument('--sizes', default='1000,10000', help='记录数，逗号分隔（最多 1000000）')
+    p.add_argument('--only', help='只运行指定用例或分组（如 storage,search.cached）')
+    p.add_argument('--rounds', type=int, default=3)
+    p.add_argument('--output', help='结果写入该 JSON 文件')
+    p.add_argument('--baseline', help='与该 JSON 结果对比')
+    p.add_argument('--tolerance', type=float, default=0.2, help='允许的变慢比例，默认 0.2')
+    p.add_argument('--list', action='store_true', help='列出所有用例')
+    args = p.parse_args(argv)
+    if args.list:
+        for name in CASES:
+            print(name)
+        return 0
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    if any(not 1 <= s <= 1_000_000 for s in sizes):
+        p.error('记录数需在 1 到 1000000 之间')
+    only = [o.strip() for o in args.only.split(',')] if args.only else None
+    result = run_suite(sizes, only, args.rounds)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""合成测试数据：生成中英文混合的逼真记录，或直接生成一个保险库。
+
+固定随机种子，相同参数每次生成的数据完全一致，便于对比不同版本的测试结果。
+"""
+import os
+import sys
+import time
+import random
+from typing import Dict, Iterator, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SITES = [
+    ('淘宝', 'taobao.com'), ('京东', 'jd.com'), ('支付宝', 'alipay.com'), ('微博', 'weibo.com'),
+    ('哔哩哔哩', 'bilibili.com'), ('知乎', 'zhihu.com'), ('网易邮箱', 'mail.163.com'), ('QQ邮箱', 'mail.qq.com'),
+    ('百度网盘', 'pan.baidu.com'), ('拼多多', 'pinduoduo.com'), ('美团', 'meituan.com'), ('携程', 'ctrip.com'),
+    ('12306', '12306.cn'), ('抖音', 'douyin.com'), ('小红书', 'xiaohongshu.com'), ('GitHub', 'github.com'),
+    ('Google', 'accounts.google.com'), ('Microsoft', 'login.live.com'), ('Apple ID', 'appleid.apple.com'),
+    ('Steam', 'store.steampowered.com'), ('阿里云', 'aliyun.com'), ('腾讯云', 'cloud.tencent.com'),
+]
+SURNAMES = ['wang', 'li', 'zhang', 'liu', 'chen', 'yang', 'zhao', 'huang', 'zhou', 'wu', 'xu', 'sun']
+GIVEN = ['wei', 'fang', 'na', 'min', 'jing', 'lei', 'qiang', 'jun', 'yang', 'yan', 'jie', 'tao', 'ming', 'chao']
+MAIL_HOSTS = ['qq.com', '163.com', '126.com', 'gmail.com', 'outlook.com', 'foxmail.com', 'sina.com']
+NOTES = ['', '', '', '工作账号', '个人常用', '家里人共用', '备用邮箱绑定', '已开启两步验证', '旧手机号注册',
+         '2019年注册', '公司报销用', '密保问题：小学名称', 'backup account', '会员到期需续费']
+PW_CHARS = 'abcdefghijkmnpqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ23456789!@#$%&*'
+WEAK = ['123456', 'password', 'qwerty123', 'woaini1314', '5201314', 'abc123456', '11111111']
+
+
+def generate_records(count: int, seed: int = 2024, now: int = 1_700_000_000) -> Iterator[Dict]:
+    """逐条生成记录：约 5% 使用弱密码、10% 与他人共用密码，创建时间分布在最近五年内。"""
+    rnd = random.Random(seed)
+    shared: List[str] = []
+    for i in range(count):
+        name, domain = rnd.choice(SITES)
+        person = rnd.choice(SURNAMES) + rnd.choice(GIVEN)
+        style = rnd.random()
+        if style < 0.4:
+            account = f'{person}{rnd.randint(1, 9999)}'
+        elif style < 0.7:
+            account = f'{person}{rnd.randint(80, 99)}@{rnd.choice(MAIL_HOSTS)}'
+        else:
+            account = f'1{rnd.choice("3456789")}{rnd.randint(0, 999999999):09d}'
+        r = rnd.random()
+        if r < 0.05:
+            password = rnd.choice(WEAK)
+        elif r < 0.15 and shared:
+            password = rnd.choice(shared)
+        else:
+            password = ''.join(rnd.choice(PW_CHARS) for _ in range(rnd.randint(10, 18)))
+            if len(shared) < 200:
+                shared.append(password)
+        yield {
+            'website': name if rnd.random() < 0.5 else f'https://{domain}',
+            'account': account,
+            'password': password,
+            'phone': f'1{rnd.choice("3456789")}{rnd.randint(0, 999999999):09d}' if rnd.random() < 0.6 else '',
+            'email': f'{person}@{rnd.choice(MAIL_HOSTS)}' if rnd.random() < 0.5 else '',
+            'note': rnd.choice(NOTES),
+            'created_at': now - rnd.randint(0, 5 * 365 * 86400),
+        }
+
+
+def build_vault(data_dir: str, count: int, seed: int = 2024) -> str:
+    """在 data_dir 中生成含 count 条记录的保险库（无启动密码），返回该目录。"""
+    os.makedirs(data_dir, exist_ok=True)
+    os.environ['PM_DATA_DIR'] = data_dir
+    from storage import KeyManager, SecureStorage
+    km = KeyManager()
+    km.load(None)
+    store = SecureStorage(km, journal=False)
+    store.load()
+    store.add_many(generate_records(count, seed))
+    store.close()
+    return data_dir
+
+
+if __name__ == '__main__':
+    # python benchmarks/synthetic.py 目录 [记录数]
+    target = sys.argv[1]
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    t0 = time.perf_counter()
+    build_vault(os.path.abspath(target), n)
+    print(f'已在 {target} 生成 {n} 条记录，用时 {time.perf_counter() - t0:.2f} 秒')
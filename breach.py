@@ -0,0 +1,142 @@
+import os
+import mmap
+import struct
+import hashlib
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+
+# 离线泄露密码库：按 SHA-1 排序的文本文件，每行 “40位十六进制哈希[:出现次数]”
+# （Have I Been Pwned 的 Pwned Passwords 下载格式）。文件通过 mmap 访问，按字节偏移二分查找，
+# 不会整体读入内存；可选的前缀索引记录每个 4 位十六进制前缀的起始偏移，把查找缩小到一个桶内。
+BREACH_FILE = 'pwned-passwords.txt'
+INDEX_SUFFIX = '.idx'
+PREFIX_HEX = 4
+_BUCKETS = 16 ** PREFIX_HEX
+_INDEX_HEADER = struct.Struct('<4sQQ')
+_INDEX_MAGIC = b'PMBI'
+_HASH_LEN = 40
+
+
+def sha1_hex(password: str) -> bytes:
+    return hashlib.sha1(password.encode('utf-8')).hexdigest().upper().encode('ascii')
+
+
+def find_corpus(root: str) -> Optional[str]:
+    path = os.path.join(root, BREACH_FILE)
+    return path if os.path.exists(path) else None
+
+
+class BreachCorpus:
+    """只读的泄露密码库。count() 查询单个密码，check() 批量查询（先排序，顺序访问文件）。"""
+
+    def __init__(self, path: str, use_index: bool = True):
+        self.path = path
+        self._f = open(path, 'rb')
+        st = os.fstat(self._f.fileno())
+        self._size = st.st_size
+        self._stamp = (st.st_size, st.st_mtime_ns)
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if self._size else b''
+        self._lower = self._size > 0 and self._mm[:_HASH_LEN].islower()
+        self._index: Optional[array] = None
+        if use_index and self._size:
+            self._index = self._load_index() or self._build_index()
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # 前缀索引
+    def _index_path(self) -> str:
+        return self.path + INDEX_SUFFIX
+
+    def _load_index(self) -> Optional[array]:
+        try:
+            with open(self._index_path(), 'rb') as f:
+                magic, size, mtime = _INDEX_HEADER.unpack(f.read(_INDEX_HEADER.size))
+                if magic != _INDEX_MAGIC or (size, mtime) != self._stamp:
+                    return None
+                index = array('Q')
+                index.fromfile(f, _BUCKETS + 1)
+                return index
+        except (OSError, EOFError, struct.error):
+            return None
+
+    def _build_index(self) -> array:
+        """每个前缀桶的起始偏移：对每个边界做一次二分查找，无需扫描整个文件。"""
+        index = array('Q', (self._lower_bound(self._key(b'%0*X' % (PREFIX_HEX, p)), 0, self._size)
+                            for p in range(_BUCKETS)))
+        index.append(self._size)
+        try:
+            with open(self._index_path(), 'wb') as f:
+                f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, *self._stamp))
+                index.tofile(f)
+        except OSError:
+            pass  # 库所在目录不可写时只在内存中使用索引
+        return index
+
+    # 查找
+    def _key(self, h: bytes) -> bytes:
+        return h.lower() if self._lower else h
+
+    def _lower_bound(self, h: bytes, lo: int, hi: int) -> int:
+        """[lo, hi) 内第一行哈希 >= h 的行首偏移；lo 必须是行首。"""
+        mm = self._mm
+        n = len(h)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b'\n', lo, mid) + 1 or lo
+            if mm[start:start + n] < h:
+                end = mm.find(b'\n', start, hi)
+                lo = hi if end < 0 else end + 1
+            else:
+                hi = start
+        return lo
+
+    def _lookup(self, h: bytes) -> int:
+        h = self._key(h)
+        lo, hi = 0, self._size
+        if self._index is not None:
+            p = int(h[:PREFIX_HEX], 16)
+            lo, hi = self._index[p], self._index[p + 1]
+        pos = self._lower_bound(h, lo, hi)
+        mm = self._mm
+        if mm[pos:pos + _HASH_LEN] != h:
+            return 0
+        end = mm.find(b'\n', pos, hi)
+        tail = mm[pos + _HASH_LEN:hi if end < 0 else end].strip()
+        if tail.startswith(b':'):
+            try:
+                return max(int(tail[1:]), 1)
+            except ValueError:
+                pass
+        return 1
+
+    def count(self, password: str) -> int:
+        """密码在泄露库中出现的次数，未出现返回 0。"""
+        if not password or not self._size:
+            return 0
+        return self._lookup(sha1_hex(password))
+
+    def check(self, passwords: Iterable[str]) -> Dict[str, int]:
+        """批量查询，只返回出现过的密码及次数。按哈希排序后查找，文件访问基本顺序进行。"""
+        if not self._size:
+            return {}
+        by_hash: Dict[bytes, List[str]] = {}
+        for pw in set(passwords):
+            if pw:
+                by_hash.setdefault(sha1_hex(pw), []).append(pw)
+        out: Dict[str, int] = {}
+        for h in sorted(by_hash):
+            n = self._lookup(h)
+            if n:
+                for pw in by_hash[h]:
+                    out[pw] = n
+        return out
@@ -0,0 +1,375 @@
+"""账号密码管理器命令行工具（不依赖 PyQt5）。
+
+用法: python -m cli [--data-dir 目录] [--json] <命令> ...
+主密码依次取自环境变量 PM_MASTER_PASSWORD 或终端输入；--json 输出便于管道处理的 JSON。
+"""
+import os
+import sys
+import json
+import time
+import getpass
+import argparse
+from typing import Dict, List, Optional
+
+from storage import KeyManager, SecureStorage, DATA_DIR_ENV
+
+
+PASSWORD_ENV = 'PM_MASTER_PASSWORD'
+FIELDS = ('website', 'account', 'password', 'phone', 'email', 'note', 'created_at')
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_NOT_FOUND = 3
+
+
+class CliError(Exception):
+    def __init__(self, message: str, code: int = EXIT_ERROR):
+        super().__init__(message)
+        self.code = code
+
+
+def _ask(prompt: str) -> str:
+    if not sys.stdin.isatty():
+        raise CliError(f'需要在终端中输入{prompt.rstrip(":：")}')
+    return getpass.getpass(prompt)
+
+
+def open_store(args) -> SecureStorage:
+    km = KeyManager()
+    if km.needs_password():
+        password = os.environ.get(PASSWORD_ENV) or _ask('启动密码: ')
+        try:
+            km.load(password)
+        except Exception:
+            raise CliError('启动密码错误')
+    else:
+        km.load(None)
+    store = SecureStorage(km)
+    store.load()
+    return store
+
+
+def _public(rec: Dict, show_password: bool) -> Dict:
+    out = {'id': rec.get('id')}
+    for k in FIELDS:
+        out[k] = rec.get(k, '')
+    if not show_password:
+        out.pop('password')
+    return out
+
+
+def _emit(args, payload, lines: List[str]):
+    if args.json:
+        json.dump(payload, sys.stdout, ensure_ascii=False)
+        sys.stdout.write('\n')
+    else:
+        for line in lines:
+            print(line)
+
+
+def _row(rec: Dict) -> str:
+    created = rec.get('created_at')
+    ts = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created)) if isinstance(created, (int, float)) else ''
+    cols = [rec.get('id') or '', rec.get('website', ''), rec.get('account', '')]
+    if 'password' in rec:
+        cols.append(rec['password'])
+    cols += [rec.get('phone', ''), rec.get('email', ''), rec.get('note', ''), ts]
+    return '\t'.join(str(c) for c in cols)
+
+
+# 子命令
+def cmd_unlock(args, store: SecureStorage) -> int:
+    info = {'unlocked': True, 'encrypted': store.key_mgr.encrypted, 'records': len(store.accounts)}
+    _emit(args, info, [f'已解锁，共{info["records"]}条记录' + ('（已设置启动密码）' if info['encrypted'] else '')])
+    return EXIT_OK
+
+
+def cmd_search(args, store: SecureStorage) -> int:
+    recs = store.search(args.query)
+    if args.limit:
+        recs = recs[:args.limit]
+    out = [_public(r, args.show_password) for r in recs]
+    _emit(args, out, [_row(r) for r in out])
+    return EXIT_OK if out else EXIT_NOT_FOUND
+
+
+def _find(store: SecureStorage, key: str) -> Dict:
+    rec = store.get(key)
+    if rec is not None:
+        return rec
+    matches = [r for r in store.accounts if r.get('account') == key]
+    if not matches:
+        raise CliError(f'未找到记录：{key}', EXIT_NOT_FOUND)
+    if len(matches) > 1:
+        raise CliError(f'账号 {key} 对应多条记录，请改用 id：' + ', '.join(r['id'] for r in matches))
+    return matches[0]
+
+
+def cmd_get(args, store: SecureStorage) -> int:
+    rec = _find(store, args.key)
+    if args.field:
+        val = rec.get(args.field, '')
+        _emit(args, {args.field: val}, [str(val)])
+        return EXIT_OK
+    out = _public(rec, True)
+    _emit(args, out, [f'{k}\t{out[k]}' for k in out])
+    return EXIT_OK
+
+
+def cmd_add(args, store: SecureStorage) -> int:
+    if args.generate:
+        from generator import build_charset, generate_credentials
+        # 只借用密码生成部分；账号由参数给出
+        _acc, password = generate_credentials(1, build_charset(True, True, True), 8,
+                                              build_charset(True, True, True, args.symbols), args.generate)[0]
+    elif args.password_stdin:
+        password = sys.stdin.readline().rstrip('\r\n')
+    else:
+        password = _ask('记录密码: ')
+    if not args.account or not password:
+        raise CliError('账号与密码为必填')
+    rec = {'website': args.website, 'account': args.account, 'password': password, 'phone': args.phone,
+           'email': args.email, 'note': args.note, 'created_at': int(time.time())}
+    rid = store.add(rec)
+    out = {'id': rid}
+    if args.generate:
+        out['password'] = password
+    _emit(args, out, [rid] + ([password] if args.generate else []))
+    return EXIT_OK
+
+
+def cmd_import(args, store: SecureStorage) -> int:
+    from archive import is_archive
+    from importers import ImportJob
+    password = None
+    if any(is_archive(p) for p in args.files):
+        password = os.environ.get(args.archive_password_env or '') or _ask('归档密码: ')
+    job = ImportJob(args.files, store.import_keys(), args.format, password=password)
+    with store.transaction():
+        job.run(sink=store.add_many)
+    count = job.imported
+    info = {'imported': count, 'duplicates': job.duplicates, 'invalid': job.invalid,
+            'formats': job.formats}
+    _emit(args, info, [f'成功导入{count}条记录，跳过重复{job.duplicates}条，无效{job.invalid}条'])
+    return EXIT_OK
+
+
+def cmd_export(args, store: SecureStorage) -> int:
+    if args.csv:
+        store.export_csv(args.path)
+        count = len(store.accounts)
+    else:
+        from encryption import calibrate_kdf, KDF_SCRYPT
+        password = os.environ.get(args.archive_password_env or '')
+        if not password:
+            password = _ask('归档密码: ')
+            if _ask('确认密码: ') != password:
+                raise CliError('两次输入的密码不一致')
+        count = store.export_archive(args.path, password, calibrate_kdf(KDF_SCRYPT, 0.5))
+    _emit(args, {'exported': count, 'path': args.path}, [f'已导出{count}条记录到 {args.path}'])
+    return EXIT_OK
+
+
+def cmd_audit(args, store: SecureStorage) -> int:
+    from audit import PasswordAuditor
+    from breach import BreachCorpus, find_corpus
+    from storage import app_root
+    path = args.breach_corpus or find_corpus(app_root())
+    corpus = BreachCorpus(path) if path else None
+    try:
+        report = PasswordAuditor(max_age_days=args.max_age).audit(store.accounts, breach=corpus)
+    finally:
+        if corpus is not None:
+            corpus.close()
+    flagged = report.flagged()
+    out = {'total': report.total, 'reused_groups': len(report.reused), 'weak': len(report.weak),
+           'old': len(report.old), 'breached': len(report.breached) if corpus else None,
+           'findings': [dict(_public(store.get(rid) or {'id': rid}, False), issues=report.issues(rid))
+                        for rid in flagged]}
+    lines = [f'共{out["total"]}条记录：重复密码{out["reused_groups"]}组，弱密码{out["weak"]}条，'
+             f'陈旧{out["old"]}条' + (f'，已泄露{out["breached"]}条' if corpus else '')]
+    lines += [f'{f["id"]}\t{f["website"]}\t{f["account"]}\t{"；".join(f["issues"])}' for f in out['findings']]
+    _emit(args, out, lines)
+    return EXIT_OK
+
+
+def cmd_sync(args, store: SecureStorage) -> int:
+    from sync import VaultReplica, DirReplica, MANIFEST, is_vault_dir, sync
+    from storage import app_root
+    target = os.path.abspath(args.target)
+    if target == os.path.abspath(app_root()):
+        raise CliError('不能与本保险库自身同步')
+    password = os.environ.get(args.password_env or '')
+    if is_vault_dir(target):
+        if not password and VaultReplica.needs_password(target):
+            password = _ask('对方保险库启动密码: ')
+        remote = VaultReplica.open(target, password)
+    else:
+        if not password:
+            password = _ask('同步密码: ')
+            if not os.path.exists(os.path.join(target, MANIFEST)) and _ask('确认密码: ') != password:
+                raise CliError('两次输入的密码不一致')
+        remote = DirReplica(target, password)
+    try:
+        report = sync(VaultReplica(store, app_root()), remote)
+    finally:
+        remote.close()
+    _emit(args, report, [f'比较了{report["buckets"]}个桶中的{report["checked"]}条记录：拉取{report["pulled"]}条，'
+                         f'推送{report["pushed"]}条，本地删除{report["deleted_local"]}条，'
+                         f'对方删除{report["deleted_remote"]}条'])
+    return EXIT_OK
+
+
+def _backup_repo(args):
+    from backup import BackupRepo, INFO_FILE
+    from encryption import calibrate_kdf, KDF_SCRYPT
+    from storage import app_root
+    path = os.path.abspath(args.dir or os.path.join(app_root(), 'backups'))
+    password = os.environ.get(args.password_env or '')
+    if os.path.exists(os.path.join(path, INFO_FILE)):
+        return BackupRepo(path, password or _ask('备份密码: '))
+    if args.action != 'create':
+        raise CliError(f'{path} 不是备份目录')
+    if not password:
+        password = _ask('备份密码: ')
+        if _ask('确认密码: ') != password:
+            raise CliError('两次输入的密码不一致')
+    return BackupRepo(path, password, calibrate_kdf(KDF_SCRYPT, 0.5))
+
+
+def _ts(ts: float) -> str:
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
+
+
+def cmd_backup(args, store: SecureStorage) -> int:
+    repo = _backup_repo(args)
+    if args.action == 'create':
+        info = repo.create(store, args.label)
+        _emit(args, info, [f'已创建快照 {info["id"]}：{info["records"]}条记录，{info["chunks"]}个块，'
+                           f'其中新写入{info["new_chunks"]}个（{info["new_bytes"]}字节）'])
+    elif args.action == 'list':
+        snaps = repo.snapshots()
+        _emit(args, snaps, [f'{s["id"]}\t{_ts(s["ts"])}\t{s["records"]}条\t{s["label"]}' for s in snaps])
+    elif args.action == 'restore':
+        sid = repo.resolve(args.snapshot)
+        info = dict(repo.restore(sid, store), id=sid)
+        _emit(args, info, [f'已恢复到快照 {sid}：新增{info["added"]}条，改回{info["updated"]}条，删除{info["removed"]}条'])
+    elif args.action == 'prune':
+        info = repo.prune(args.keep_last, args.keep_daily, args.keep_weekly, args.keep_monthly, args.dry_run)
+        _emit(args, info, [('将' if args.dry_run else '已') + f'删除{len(info["removed"])}个快照，保留{len(info["kept"])}个，'
+                           f'释放{info["chunks_removed"]}个块（{info["bytes_freed"]}字节）'])
+    else:
+        info = repo.verify(repo.resolve(args.snapshot) if args.snapshot else None, full=not args.quick)
+        lines = [f'检查了{info["snapshots"]}个快照、{info["chunks"]}个块：' + ('完好' if info['ok'] else '发现问题')]
+        lines += [f'损坏的快照: {s}' for s in info['bad_snapshots']]
+        lines += [f'缺失的块: {c}' for c in info['missing']] + [f'损坏的块: {c}' for c in info['corrupt']]
+        if info['orphans']:
+            lines.append(f'未被引用的块: {info["orphans"]}个（prune 时删除）')
+        _emit(args, info, lines)
+        return EXIT_OK if info['ok'] else EXIT_ERROR
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog='python -m cli', description='本地账号密码管理器命令行工具')
+    p.add_argument('--data-dir', help='数据目录（默认为程序所在目录）')
+    p.add_argument('--json', action='store_true', help='以 JSON 输出')
+    sub = p.add_subparsers(dest='command', required=True)
+
+    s = sub.add_parser('unlock', help='校验启动密码并显示记录数')
+    s.set_defaults(func=cmd_unlock)
+
+    s = sub.add_parser('search', help='搜索记录（网站/账号/手机/邮箱/备注）')
+    s.add_argument('query')
+    s.add_argument('--limit', type=int, default=0)
+    s.add_argument('--show-password', action='store_true')
+    s.set_defaults(func=cmd_search)
+
+    s = sub.add_parser('get', help='按 id 或账号读取一条记录')
+    s.add_argument('key')
+    s.add_argument('--field', choices=FIELDS, help='只输出某个字段（如 password）')
+    s.set_defaults(func=cmd_get)
+
+    s = sub.add_parser('add', help='新增一条记录')
+    s.add_argument('--account', required=True)
+    s.add_argument('--website', default='')
+    s.add_argument('--phone', default='')
+    s.add_argument('--email', default='')
+    s.add_argument('--note', default='')
+    g = s.add_mutually_exclusive_group()
+    g.add_argument('--password-stdin', action='store_true', help='从标准输入读取密码')
+    g.add_argument('--generate', type=int, metavar='LEN', help='生成指定长度的随机密码')
+    s.add_argument('--symbols', action='store_true', help='生成的密码包含符号')
+    s.set_defaults(func=cmd_add)
+
+    s = sub.add_parser('import', help='导入文件（自动识别格式）')
+    s.add_argument('files', nargs='+')
+    s.add_argument('--format', help='指定格式，跳过自动识别')
+    s.add_argument('--archive-password-env', metavar='VAR', help='从该环境变量读取归档密码')
+    s.set_defaults(func=cmd_import)
+
+    s = sub.add_parser('export', help='导出为加密归档（默认）或 CSV')
+    s.add_argument('path')
+    s.add_argument('--csv', action='store_true', help='导出明文 CSV')
+    s.add_argument('--archive-password-env', metavar='VAR', help='从该环境变量读取归档密码')
+    s.set_defaults(func=cmd_export)
+
+    s = sub.add_parser('audit', help='密码体检')
+    s.add_argument('--max-age', type=int, default=365, help='超过该天数视为陈旧')
+    s.add_argument('--breach-corpus', help='泄露密码库路径（默认程序目录下的 pwned-passwords.txt）')
+    s.set_defaults(func=cmd_audit)
+
+    s = sub.add_parser('sync', help='与另一个保险库或同步目录做增量双向同步')
+    s.add_argument('target', help='另一个保险库的数据目录，或同步目录（不存在时新建）')
+    s.add_argument('--password-env', metavar='VAR', help='从该环境变量读取对方的启动密码或同步密码')
+    s.set_defaults(func=cmd_sync)
+
+    s = sub.add_parser('backup', help='增量去重的加密备份：create / list / restore / prune / verify')
+    s.add_argument('--dir', help='备份目录（默认为数据目录下的 backups）')
+    s.add_argument('--password-env', metavar='VAR', help='从该环境变量读取备份密码')
+    bs = s.add_subparsers(dest='action', required=True)
+    b = bs.add_parser('create', help='为当前数据建立快照')
+    b.add_argument('--label', default='', help='快照备注')
+    bs.add_parser('list', help='列出快照')
+    b = bs.add_parser('restore', help='把保险库恢复到某个快照')
+    b.add_argument('snapshot', help='快照 id、其前缀或 latest')
+    b = bs.add_parser('prune', help='按保留规则删除旧快照并回收空间')
+    b.add_argument('--keep-last', type=int, default=0, metavar='N')
+    b.add_argument('--keep-daily', type=int, default=0, metavar='N')
+    b.add_argument('--keep-weekly', type=int, default=0, metavar='N')
+    b.add_argument('--keep-monthly', type=int, default=0, metavar='N')
+    b.add_argument('--dry-run', action='store_true', help='只显示将删除的快照')
+    b = bs.add_parser('verify', help='校验备份完整性')
+    b.add_argument('snapshot', nargs='?', help='只校验该快照（默认全部）')
+    b.add_argument('--quick', action='store_true', help='只检查块是否齐全，不解密')
+    s.set_defaults(func=cmd_backup)
+    return p
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.data_dir:
+        os.environ[DATA_DIR_ENV] = os.path.abspath(args.data_dir)
+    store = None
+    try:
+        store = open_store(args)
+        return args.func(args, store)
+    except BrokenPipeError:
+        # 输出被管道另一端提前关闭（如 | head），不再写任何内容
+        sys.stdout = open(os.devnull, 'w')
+        return EXIT_OK
+    except (CliError, ValueError, OSError) as e:
+        code = e.code if isinstance(e, CliError) else EXIT_ERROR
+        if args.json:
+            json.dump({'error': str(e)}, sys.stdout, ensure_ascii=False)
+            sys.stdout.write('\n')
+        else:
+            print(f'错误: {e}', file=sys.stderr)
+        return code
+    finally:
+        if store is not None:
+            store.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,101 +1,411 @@
-import os
-import json
-import base64
-import secrets
-from typing import Optional, Tuple
-
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-
-
-VERSION = 1
-
-
-def _b64e(b: bytes) -> str:
-    return base64.b64encode(b).decode('utf-8')
-
-
-def _b64d(s: str) -> bytes:
-    return base64.b64decode(s.encode('utf-8'))
-
-
-def generate_aes_key() -> bytes:
-    return secrets.token_bytes(32)  # AES-256
-
-
-def derive_key_from_password(password: str, salt: bytes) -> bytes:
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=200_000,
-    )
-    return kdf.derive(password.encode('utf-8'))
-
-
-def encrypt_key_with_password(key: bytes, password: str) -> dict:
-    salt = secrets.token_bytes(16)
-    pw_key = derive_key_from_password(password, salt)
-    nonce = secrets.token_bytes(12)
-    aead = AESGCM(pw_key)
-    enc = aead.encrypt(nonce, key, None)
-    return {
-        'version': VERSION,
-        'salt': _b64e(salt),
-        'nonce': _b64e(nonce),
-        'enc': _b64e(enc),
-        'type': 'encrypted_key'
-    }
-
-
-def decrypt_key_with_password(data: dict, password: str) -> bytes:
-    salt = _b64d(data['salt'])
-    nonce = _b64d(data['nonce'])
-    enc = _b64d(data['enc'])
-    pw_key = derive_key_from_password(password, salt)
-    aead = AESGCM(pw_key)
-    return aead.decrypt(nonce, enc, None)
-
-
-def save_key_file(path: str, key: bytes, password: Optional[str]):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    if password:
-        payload = encrypt_key_with_password(key, password)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(payload, f)
-    else:
-        # Store plaintext (base64) with a simple header
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump({'version': VERSION, 'type': 'plaintext_key', 'key': _b64e(key)}, f)
-
-
-def load_key_file(path: str, password: Optional[str]) -> Tuple[bytes, bool]:
-    """Return (key, encrypted_flag). encrypted_flag indicates the key file is password-protected."""
-    with open(path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    if data.get('type') == 'encrypted_key':
-        if not password:
-            raise ValueError('需要密码解锁密钥文件')
-        key = decrypt_key_with_password(data, password)
-        return key, True
-    elif data.get('type') == 'plaintext_key':
-        return _b64d(data['key']), False
-    else:
-        raise ValueError('未知的secret.key格式')
-
-
-def encrypt_payload(key: bytes, payload: dict) -> dict:
-    data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
-    nonce = secrets.token_bytes(12)
-    aead = AESGCM(key)
-    ct = aead.encrypt(nonce, data, None)
-    return {'version': VERSION, 'nonce': _b64e(nonce), 'ct': _b64e(ct)}
-
-
-def decrypt_payload(key: bytes, blob: dict) -> dict:
-    nonce = _b64d(blob['nonce'])
-    ct = _b64d(blob['ct'])
-    aead = AESGCM(key)
-    data = aead.decrypt(nonce, ct, None)
-    return json.loads(data.decode('utf-8'))
\ No newline at end of file
+import os
+import json
+import zlib
+import base64
+import time
+import struct
+import secrets
+import warnings
+from typing import Optional, Tuple, List
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from profiling import timed, span, incr
+
+try:
+    import lzma
+except ImportError:  # 部分精简的 Python 构建没有 lzma 模块
+    lzma = None
+
+
+# 1: 整库单块加密 {'nonce','ct'}
+# 2: 分页格式，每页单独 AES-GCM 加密，加密索引头记录各页的 id/条数/nonce（JSON + base64）
+# 3: 同 2 的分页结构，改为二进制容器存储（见 pack_vault）
+# 4: 同 3，索引头与各页可先压缩再加密，压缩算法记录在认证数据中
+VERSION = 4
+
+# 二进制容器: magic | version(u16) | 索引密文长度(u32) | 索引压缩算法(u8，版本 4 起) | nonce | 索引密文 |
+# 各页 (nonce | 密文)。nonce 之前的前缀整体作为索引密文的附加认证数据
+VAULT_MAGIC = b'PMV\x00'
+_VAULT_PREFIX = struct.Struct('<4sHI')
+_VAULT_PREFIX_V4 = struct.Struct('<4sHIB')
+NONCE_SIZE = 12
+
+# 加密前的压缩：网站/邮箱/备注等字段重复度高，JSON 压缩后通常只有原来的 1/4。
+# 小于 COMPRESS_MIN_BYTES 的数据（如单条日志）不压缩；压缩后没有明显变小的也按原样保存。
+# 所用算法写进密文的附加认证数据（页与日志）或容器前缀（索引头），被篡改会导致解密失败。
+# 环境变量 PM_COMPRESSION=none/zlib/lzma 选择写入时使用的算法，读取时总是按记录的算法解压。
+CODEC_NONE = 'none'
+CODEC_ZLIB = 'zlib'
+CODEC_LZMA = 'lzma'
+_CODEC_IDS = {CODEC_NONE: 0, CODEC_ZLIB: 1, CODEC_LZMA: 2}
+_CODEC_NAMES = {v: k for k, v in _CODEC_IDS.items()}
+COMPRESSION_ENV = 'PM_COMPRESSION'
+COMPRESS_MIN_BYTES = 512
+COMPRESS_MAX_RATIO = 0.9
+
+# 密钥派生算法及参数记录在 secret.key 的 'kdf' 字段中；旧文件没有该字段，按 DEFAULT_KDF 处理
+KDF_PBKDF2 = 'pbkdf2-sha256'
+KDF_SCRYPT = 'scrypt'
+DEFAULT_KDF = {'name': KDF_PBKDF2, 'iterations': 200_000}
+MIN_PBKDF2_ITERATIONS = 200_000
+MIN_SCRYPT_N = 2 ** 14
+MAX_SCRYPT_N = 2 ** 20  # r=8 时约占用 1GB 内存
+# 参数可能来自未经认证的文件头（归档、同步目录、备份库），派生前按上限检查，防止被篡改的文件耗尽 CPU/内存
+MAX_PBKDF2_ITERATIONS = 50_000_000
+MAX_SCRYPT_R = 16
+MAX_SCRYPT_P = 4
+
+
+def _b64e(b: bytes) -> str:
+    return base64.b64encode(b).decode('utf-8')
+
+
+def _b64d(s: str) -> bytes:
+    return base64.b64decode(s.encode('utf-8'))
+
+
+def _check_codec(codec: str):
+    if codec not in _CODEC_IDS:
+        raise ValueError(f'不支持的压缩算法: {codec}')
+    if codec == CODEC_LZMA and lzma is None:
+        raise ValueError('当前 Python 缺少 lzma 模块')
+
+
+# None 表示取环境变量 PM_COMPRESSION；只在写入时解析，读取时算法来自认证数据，不受其影响
+_compression: Optional[str] = None
+
+
+def compression() -> str:
+    """写入时使用的压缩算法。环境变量的值无效时给出警告并改用 zlib。"""
+    global _compression
+    if _compression is None:
+        codec = os.environ.get(COMPRESSION_ENV) or CODEC_ZLIB
+        try:
+            _check_codec(codec)
+        except ValueError as e:
+            warnings.warn(f'{COMPRESSION_ENV} 无效（{e}），改用 {CODEC_ZLIB}')
+            codec = CODEC_ZLIB
+        _compression = codec
+    return _compression
+
+
+def set_compression(codec: str):
+    """设置之后写入的数据所用的压缩算法（none/zlib/lzma），已有数据不受影响。"""
+    global _compression
+    _check_codec(codec)
+    _compression = codec
+
+
+def compress(data: bytes, codec: Optional[str] = None, fast: bool = False) -> Tuple[str, bytes]:
+    """按阈值决定是否压缩，返回 (实际使用的算法, 数据)。
+
+    fast=True 用最低压缩级别，用于每次保存都要重写的数据（如索引头）。
+    """
+    codec = codec or compression()
+    _check_codec(codec)
+    if codec == CODEC_NONE or len(data) < COMPRESS_MIN_BYTES:
+        return CODEC_NONE, data
+    with span('encryption.compress', codec=codec):
+        if codec == CODEC_ZLIB:
+            out = zlib.compress(data, 1 if fast else 6)
+        else:
+            out = lzma.compress(data, preset=0 if fast else 6)
+    if len(out) > len(data) * COMPRESS_MAX_RATIO:
+        incr('compress.skipped')
+        return CODEC_NONE, data
+    return codec, out
+
+
+def decompress(codec: str, data) -> bytes:
+    if codec == CODEC_NONE:
+        return bytes(data) if not isinstance(data, bytes) else data
+    _check_codec(codec)
+    with span('encryption.decompress', codec=codec):
+        return zlib.decompress(data) if codec == CODEC_ZLIB else lzma.decompress(data)
+
+
+def _codec_aad(aad: Optional[bytes], codec: str) -> Optional[bytes]:
+    # 不压缩时附加认证数据保持原样，与旧数据兼容
+    if codec == CODEC_NONE:
+        return aad
+    return (aad or b'') + b'\0codec=' + codec.encode('ascii')
+
+
+def generate_aes_key() -> bytes:
+    return secrets.token_bytes(32)  # AES-256
+
+
+def check_kdf(kdf) -> None:
+    """密钥派生参数不是本程序可能写出的取值时抛出 ValueError。"""
+    if not isinstance(kdf, dict):
+        raise ValueError('密钥派生参数无效')
+    name = kdf.get('name')
+
+    def param(key: str, high: int) -> int:
+        v = kdf.get(key)
+        if not isinstance(v, int) or isinstance(v, bool) or not 1 <= v <= high:
+            raise ValueError(f'密钥派生参数无效: {key}={v!r}')
+        return v
+
+    if name == KDF_PBKDF2:
+        param('iterations', MAX_PBKDF2_ITERATIONS)
+    elif name == KDF_SCRYPT:
+        n = param('n', MAX_SCRYPT_N)
+        if n & (n - 1):
+            raise ValueError(f'密钥派生参数无效: n={n}')
+        r = param('r', MAX_SCRYPT_R)
+        param('p', MAX_SCRYPT_P)
+        if n * r > MAX_SCRYPT_N * 8:
+            raise ValueError('密钥派生参数无效：所需内存过大')
+    else:
+        raise ValueError(f'不支持的密钥派生算法: {name}')
+
+
+@timed('encryption.kdf')
+def derive_key_from_password(password: str, salt: bytes, kdf: Optional[dict] = None) -> bytes:
+    kdf = kdf or DEFAULT_KDF
+    check_kdf(kdf)
+    name = kdf.get('name')
+    if name == KDF_PBKDF2:
+        deriver = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            iterations=int(kdf['iterations']),
+        )
+    elif name == KDF_SCRYPT:
+        deriver = Scrypt(salt=salt, length=32, n=int(kdf['n']), r=int(kdf['r']), p=int(kdf['p']))
+    else:
+        raise ValueError(f'不支持的密钥派生算法: {name}')
+    return deriver.derive(password.encode('utf-8'))
+
+
+def _time_kdf(kdf: dict, salt: bytes) -> float:
+    t0 = time.perf_counter()
+    derive_key_from_password('calibration', salt, kdf)
+    return time.perf_counter() - t0
+
+
+def calibrate_kdf(name: str = KDF_SCRYPT, target_seconds: float = 0.5) -> dict:
+    """在本机测速，选出一次派生约耗时 target_seconds 的参数（不低于安全下限）。"""
+    salt = secrets.token_bytes(16)
+    if name == KDF_PBKDF2:
+        probe = 50_000
+        elapsed = max(_time_kdf({'name': KDF_PBKDF2, 'iterations': probe}, salt), 1e-6)
+        iterations = int(probe * target_seconds / elapsed) // 1000 * 1000
+        return {'name': KDF_PBKDF2, 'iterations': min(MAX_PBKDF2_ITERATIONS, max(MIN_PBKDF2_ITERATIONS, iterations))}
+    if name == KDF_SCRYPT:
+        # 内存与时间都随 n 线性增长，逐次翻倍直到再翻一倍就会超过目标
+        n = MIN_SCRYPT_N
+        while n < MAX_SCRYPT_N:
+            elapsed = _time_kdf({'name': KDF_SCRYPT, 'n': n, 'r': 8, 'p': 1}, salt)
+            if elapsed * 2 > target_seconds:
+                break
+            n *= 2
+        return {'name': KDF_SCRYPT, 'n': n, 'r': 8, 'p': 1}
+    raise ValueError(f'不支持的密钥派生算法: {name}')
+
+
+def encrypt_key_with_password(key: bytes, password: str, kdf: Optional[dict] = None) -> dict:
+    kdf = kdf or DEFAULT_KDF
+    salt = secrets.token_bytes(16)
+    pw_key = derive_key_from_password(password, salt, kdf)
+    nonce = secrets.token_bytes(12)
+    aead = AESGCM(pw_key)
+    enc = aead.encrypt(nonce, key, None)
+    return {
+        'version': VERSION,
+        'kdf': kdf,
+        'salt': _b64e(salt),
+        'nonce': _b64e(nonce),
+        'enc': _b64e(enc),
+        'type': 'encrypted_key'
+    }
+
+
+def decrypt_key_with_password(data: dict, password: str) -> bytes:
+    salt = _b64d(data['salt'])
+    nonce = _b64d(data['nonce'])
+    enc = _b64d(data['enc'])
+    pw_key = derive_key_from_password(password, salt, data.get('kdf'))
+    aead = AESGCM(pw_key)
+    return aead.decrypt(nonce, enc, None)
+
+
+def read_key_file_info(path: str) -> dict:
+    """只读取 secret.key 的头部信息（类型与 KDF 参数），不做任何派生。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    info = {'type': data.get('type')}
+    if data.get('type') == 'encrypted_key':
+        info['kdf'] = data.get('kdf') or DEFAULT_KDF
+    return info
+
+
+def save_key_file(path: str, key: bytes, password: Optional[str], kdf: Optional[dict] = None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if password:
+        payload = encrypt_key_with_password(key, password, kdf)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+    else:
+        # Store plaintext (base64) with a simple header
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'version': VERSION, 'type': 'plaintext_key', 'key': _b64e(key)}, f)
+
+
+@timed('encryption.load_key_file')
+def load_key_file(path: str, password: Optional[str]) -> Tuple[bytes, bool]:
+    """Return (key, encrypted_flag). encrypted_flag indicates the key file is password-protected."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('type') == 'encrypted_key':
+        if not password:
+            raise ValueError('需要密码解锁密钥文件')
+        key = decrypt_key_with_password(data, password)
+        return key, True
+    elif data.get('type') == 'plaintext_key':
+        return _b64d(data['key']), False
+    else:
+        raise ValueError('未知的secret.key格式')
+
+
+@timed('encryption.encrypt_payload')
+def encrypt_payload(key: bytes, payload: dict) -> dict:
+    with span('encryption.json_encode'):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    codec, data = compress(data)
+    nonce = secrets.token_bytes(12)
+    aead = AESGCM(key)
+    ct = aead.encrypt(nonce, data, _codec_aad(None, codec))
+    blob = {'version': VERSION, 'nonce': _b64e(nonce), 'ct': _b64e(ct)}
+    if codec != CODEC_NONE:
+        blob['codec'] = codec
+    return blob
+
+
+@timed('encryption.decrypt_payload')
+def decrypt_payload(key: bytes, blob: dict) -> dict:
+    nonce = _b64d(blob['nonce'])
+    ct = _b64d(blob['ct'])
+    codec = blob.get('codec', CODEC_NONE)
+    aead = AESGCM(key)
+    data = decompress(codec, aead.decrypt(nonce, ct, _codec_aad(None, codec)))
+    with span('encryption.json_decode'):
+        return json.loads(data.decode('utf-8'))
+
+
+@timed('encryption.encrypt_page')
+def encrypt_page(key: bytes, page_id: str, records: list) -> Tuple[bytes, bytes, str]:
+    """返回 (nonce, 密文, 压缩算法)。页 id 与压缩算法作为附加认证数据，防止页被整体替换到别的位置。"""
+    incr('pages.encrypted')
+    data = json.dumps(records, ensure_ascii=False).encode('utf-8')
+    codec, data = compress(data)
+    nonce = secrets.token_bytes(NONCE_SIZE)
+    aead = AESGCM(key)
+    ct = aead.encrypt(nonce, data, _codec_aad(page_id.encode('utf-8'), codec))
+    return nonce, ct, codec
+
+
+@timed('encryption.decrypt_page')
+def decrypt_page(key: bytes, page_id: str, nonce: bytes, ct, codec: str = CODEC_NONE) -> list:
+    incr('pages.decrypted')
+    aead = AESGCM(key)
+    data = decompress(codec, aead.decrypt(nonce, ct, _codec_aad(page_id.encode('utf-8'), codec)))
+    return json.loads(data.decode('utf-8'))
+
+
+def is_vault_container(buf) -> bool:
+    return bytes(buf[:len(VAULT_MAGIC)]) == VAULT_MAGIC
+
+
+@timed('encryption.pack_vault')
+def pack_vault(key: bytes, header: dict, pages: List[Tuple]) -> bytes:
+    """把加密索引头与各页密文打包成一个二进制容器，调用方一次 write 写出。
+
+    pages 为 encrypt_page 返回的 (nonce, 密文, 压缩算法)；各页的压缩算法记在 header['pages'] 中。
+    """
+    index = [dict(meta, len=len(blob[1])) for meta, blob in zip(header['pages'], pages)]
+    data = json.dumps(dict(header, pages=index), ensure_ascii=False).encode('utf-8')
+    codec, data = compress(data, fast=True)
+    nonce = secrets.token_bytes(NONCE_SIZE)
+    prefix = _VAULT_PREFIX_V4.pack(VAULT_MAGIC, VERSION, len(data) + 16, _CODEC_IDS[codec])  # GCM tag 16 字节
+    header_ct = AESGCM(key).encrypt(nonce, data, prefix)
+    parts = [prefix, nonce, header_ct]
+    for blob in pages:
+        parts.append(blob[0])
+        parts.append(blob[1])
+    return b''.join(parts)
+
+
+def _vault_prefix(mv) -> Tuple[int, int, str, int]:
+    """解析容器前缀，返回 (版本, 索引密文长度, 索引压缩算法, 前缀长度)。"""
+    if len(mv) < _VAULT_PREFIX.size:
+        raise ValueError('数据文件已损坏')
+    magic, version, header_len = _VAULT_PREFIX.unpack_from(mv)
+    if magic != VAULT_MAGIC:
+        raise ValueError('未知的数据文件格式')
+    if version > VERSION:
+        raise ValueError('数据文件版本过新，请升级软件')
+    if version < 4:
+        return version, header_len, CODEC_NONE, _VAULT_PREFIX.size
+    if len(mv) < _VAULT_PREFIX_V4.size:
+        raise ValueError('数据文件已损坏')
+    codec = _CODEC_NAMES.get(_VAULT_PREFIX_V4.unpack_from(mv)[3])
+    if codec is None:
+        raise ValueError('数据文件使用了未知的压缩算法')
+    return version, header_len, codec, _VAULT_PREFIX_V4.size
+
+
+def _decrypt_vault_header(key: bytes, mv: memoryview) -> Tuple[dict, int]:
+    _version, header_len, codec, pos = _vault_prefix(mv)
+    prefix = bytes(mv[:pos])
+    nonce = bytes(mv[pos:pos + NONCE_SIZE])
+    pos += NONCE_SIZE
+    if len(mv) < pos + header_len:
+        raise ValueError('数据文件已损坏')
+    aead = AESGCM(key)
+    header = json.loads(decompress(codec, aead.decrypt(nonce, mv[pos:pos + header_len], prefix)).decode('utf-8'))
+    return header, pos + header_len
+
+
+def read_vault_header(key: bytes, path: str) -> dict:
+    """只读取并解密数据文件的索引头（用于检查版本号等），不读入各页密文。"""
+    with open(path, 'rb') as f:
+        prefix = f.read(_VAULT_PREFIX_V4.size + NONCE_SIZE)
+        if len(prefix) < _VAULT_PREFIX.size or not is_vault_container(prefix):
+            raise ValueError('未知的数据文件格式')
+        _version, header_len, _codec, size = _vault_prefix(prefix)
+        buf = prefix + f.read(size + NONCE_SIZE + header_len - len(prefix))
+    return _decrypt_vault_header(key, memoryview(buf))[0]
+
+
+@timed('encryption.unpack_vault')
+def unpack_vault(key: bytes, buf) -> Tuple[dict, List[Tuple[bytes, memoryview, str]]]:
+    """解析二进制容器，只解密索引头；各页以 (nonce, 密文, 压缩算法) 返回，密文为 memoryview 切片，不做拷贝。"""
+    mv = memoryview(buf)
+    header, pos = _decrypt_vault_header(key, mv)
+    pages = []
+    for meta in header['pages']:
+        page_nonce = bytes(mv[pos:pos + NONCE_SIZE])
+        pos += NONCE_SIZE
+        pages.append((page_nonce, mv[pos:pos + meta['len']], meta.get('codec', CODEC_NONE)))
+        pos += meta['len']
+    if pos != len(mv):
+        raise ValueError('数据文件已损坏')
+    return header, pages
+
+
+def decode_json_vault(key: bytes, blob: dict) -> Tuple[dict, List[Tuple[bytes, bytes, str]]]:
+    """读取版本 2 的 JSON 分页格式，转换为与 unpack_vault 相同的结构。"""
+    header = decrypt_payload(key, blob['header'])
+    pages = []
+    for meta, page in zip(header['pages'], blob['pages']):
+        nonce = _b64d(page['nonce'])
+        meta['nonce'] = nonce.hex()
+        pages.append((nonce, _b64d(page['ct']), CODEC_NONE))
+    return header, pages
@@ -0,0 +1,112 @@
+import re
+import secrets
+import string
+from typing import List, Iterable, Optional, Set, Tuple, Callable
+
+
+SYMBOLS = '!@#$%^&*()-_=+[]{};:,./?'
+CHAR_CLASSES = (string.ascii_uppercase, string.ascii_lowercase, string.digits, SYMBOLS)
+
+
+def build_charset(upper: bool, lower: bool, digits: bool, symbols: bool = False) -> str:
+    cs = ''
+    if upper: cs += string.ascii_uppercase
+    if lower: cs += string.ascii_lowercase
+    if digits: cs += string.digits
+    if symbols: cs += SYMBOLS
+    if not cs:
+        cs = string.ascii_letters + string.digits
+    return cs
+
+
+class RandomStringGenerator:
+    """基于 secrets 的批量随机串生成器。
+
+    一次取一大块随机字节，用 bytes.translate 把字节映射到字符集并丢弃超出
+    256 - 256 % n 的字节（拒绝采样），每个字符等概率，没有取模偏差。
+    require_classes=True 时，字符集中出现的每一类字符（大写/小写/数字/符号）都至少出现一次。
+    """
+
+    def __init__(self, charset: str, length: int, require_classes: bool = True):
+        charset = ''.join(dict.fromkeys(charset))  # 去重并保持顺序
+        n = len(charset)
+        if not 0 < n <= 256 or not charset.isascii():
+            raise ValueError('字符集必须是 1~256 个 ASCII 字符')
+        if length <= 0:
+            raise ValueError('长度必须大于 0')
+        self.charset = charset
+        self.length = length
+        limit = 256 - 256 % n
+        self._table = bytes(ord(charset[b % n]) if b < limit else 0 for b in range(256))
+        self._reject = bytes(range(limit, 256))
+        self._accept_ratio = limit / 256
+        chars = set(charset)
+        classes = [c for c in CHAR_CLASSES if chars & set(c)] if require_classes else []
+        if len(classes) > length:
+            raise ValueError('长度不足以包含所有要求的字符类别')
+        # 每个类别一个先行断言，一次 match 检查全部类别
+        self._policy = re.compile(''.join('(?=.*[%s])' % re.escape(c) for c in classes), re.S) if classes else None
+
+    def _chars(self, count: int) -> str:
+        out: List[bytes] = []
+        have = 0
+        while have < count:
+            need = count - have
+            # 按接受率多取一些，通常一次就够
+            raw = secrets.token_bytes(int(need / self._accept_ratio * 1.05) + 64)
+            chunk = raw.translate(self._table, self._reject)
+            out.append(chunk)
+            have += len(chunk)
+        return b''.join(out)[:count].decode('ascii')
+
+    def batch(self, count: int, unique: bool = True, exclude: Optional[Set[str]] = None) -> List[str]:
+        """生成 count 个串；unique 时批内互不相同且不在 exclude 中。"""
+        exclude = exclude or set()
+        if unique and len(self.charset) ** self.length < count + len(exclude):
+            raise ValueError('字符集与长度组合不足以生成这么多不重复的结果')
+        L = self.length
+        result: List[str] = []
+        seen: Set[str] = set()
+        while len(result) < count:
+            need = count - len(result)
+            buf = self._chars(need * L)
+            batch = [buf[i:i + L] for i in range(0, need * L, L)]
+            if self._policy is not None:
+                batch = list(filter(self._policy.match, batch))
+            if not unique:
+                result.extend(batch)
+                continue
+            for s in batch:
+                if s not in seen and s not in exclude:
+                    seen.add(s)
+                    result.append(s)
+        return result[:count]
+
+
+def generate_credentials(count: int, account_charset: str, account_length: int,
+                         password_charset: str, password_length: int,
+                         existing_accounts: Iterable[str] = (),
+                         require_classes: bool = True,
+                         reject: Optional[Callable[[List[str]], Set[str]]] = None,
+                         max_rounds: int = 10) -> List[Tuple[str, str]]:
+    """批量生成 (账号, 密码)；账号在本批内及与已有账号之间都不重复。
+
+    reject 接收一批密码，返回其中不可用的（例如出现在泄露库中的），这些密码会被重新生成。
+    """
+    accounts = RandomStringGenerator(account_charset, account_length, require_classes)
+    passwords = RandomStringGenerator(password_charset, password_length, require_classes)
+    names = accounts.batch(count, unique=True, exclude=set(existing_accounts))
+    pwds = passwords.batch(count, unique=True)
+    if reject is not None:
+        bad = reject(pwds)
+        for _ in range(max_rounds):
+            if not bad:
+                break
+            keep = set(pwds) - bad
+            fresh = iter(passwords.batch(len(pwds) - len(keep), unique=True, exclude=keep | bad))
+            pwds = [p if p in keep else next(fresh) for p in pwds]
+            bad = reject([p for p in pwds if p not in keep])
+        else:
+            if bad:
+                raise ValueError('生成的密码多次命中泄露库，请增加密码长度或字符种类')
+    return list(zip(names, pwds))
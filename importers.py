@@ -0,0 +1,376 @@
+import io
+import os
+import csv
+import json
+import time
+import hashlib
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Optional, Set, Callable, Iterable, Iterator, Tuple
+
+from archive import ARCHIVE_MAGIC, iter_archive
+
+
+CHUNK_ROWS = 2000              # 每处理这么多行报告一次进度并检查是否取消
+PARALLEL_MIN_BYTES = 4 << 20   # 多个文件总大小超过该值时分给多个进程解析
+HEAD_BYTES = 64 << 10          # 识别格式时读取的文件头长度
+RECORD_FIELDS = ('website', 'account', 'password', 'phone', 'email', 'note')
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+def dedup_key(website: str, account: str) -> bytes:
+    """(网站, 账号) 的去重键：定长摘要，索引不需要保存原文。"""
+    raw = f'{website.strip().lower()}\0{account.strip()}'.encode('utf-8')
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+
+def dedup_keys(records: Iterable[Dict]) -> Set[bytes]:
+    return {dedup_key(str(r.get('website', '')), str(r.get('account', ''))) for r in records}
+
+
+def parse_timestamp(val, default: Optional[int] = None) -> Optional[int]:
+    """秒/毫秒/微秒时间戳或 ISO 8601 字符串转为秒级时间戳，无法识别时返回 default。"""
+    if val is None or val == '':
+        return default
+    try:
+        ts = float(val)
+    except (TypeError, ValueError):
+        try:
+            dt = datetime.fromisoformat(str(val).strip().replace('Z', '+00:00'))
+        except ValueError:
+            return default
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp())
+    if ts > 1e14:
+        ts /= 1e6
+    elif ts > 1e11:
+        ts /= 1e3
+    return int(ts)
+
+
+def make_record(website='', account='', password='', phone='', email='', note='', created_at=None,
+                now: Optional[int] = None) -> Dict:
+    rec = {'website': (website or '').strip(), 'account': (account or '').strip(), 'password': password or '',
+           'phone': (phone or '').strip(), 'email': (email or '').strip(), 'note': (note or '').strip()}
+    rec['created_at'] = parse_timestamp(created_at, now if now is not None else int(time.time()))
+    return rec
+
+
+# 导入格式注册表
+class Importer:
+    """导入格式适配器：detect 根据文件头给出匹配度，parse 从二进制文件流逐条产出标准记录。
+
+    needs_password 为 True 的格式以 parse(fb, password) 调用。
+    """
+    name = ''
+    label = ''
+    needs_password = False
+
+    def detect(self, head: str) -> int:
+        return 0
+
+    def parse(self, fb) -> Iterator[Dict]:
+        raise NotImplementedError
+
+
+IMPORTERS: Dict[str, Importer] = {}
+
+
+def register_importer(imp: Importer) -> Importer:
+    IMPORTERS[imp.name] = imp
+    return imp
+
+
+def _read_head(path: str) -> str:
+    with open(path, 'rb') as f:
+        return f.read(HEAD_BYTES).decode('utf-8-sig', errors='ignore')
+
+
+def detect_format(path: str) -> Importer:
+    head = _read_head(path)
+    best, score = None, 0
+    for imp in IMPORTERS.values():
+        s = imp.detect(head)
+        if s > score:
+            best, score = imp, s
+    if best is None:
+        raise ValueError(f'无法识别的导入文件格式：{os.path.basename(path)}\n'
+                         'CSV需包含“账号(account)”与“密码(password)”字段，'
+                         '或为 Chrome/Firefox/Bitwarden/KeePass 的导出文件')
+    return best
+
+
+def get_importer(path: str, fmt: Optional[str] = None) -> Importer:
+    if fmt is None:
+        return detect_format(path)
+    if fmt not in IMPORTERS:
+        raise ValueError(f'未知的导入格式：{fmt}')
+    return IMPORTERS[fmt]
+
+
+class CsvImporter(Importer):
+    """按表头识别的 CSV 格式。fields 为 记录字段 -> CSV 列名（小写）；网址为空时用 title 列作为网站。"""
+
+    def __init__(self, name: str, label: str, signature: Iterable[str], fields: Dict[str, str],
+                 title: Optional[str] = None, row_filter: Optional[Callable[[Dict], bool]] = None):
+        self.name = name
+        self.label = label
+        self.signature = set(signature)
+        self.fields = fields
+        self.title = title
+        self.row_filter = row_filter
+
+    def detect(self, head: str) -> int:
+        try:
+            first = next(csv.reader(io.StringIO(head)), None)
+        except csv.Error:
+            return 0
+        if not first:
+            return 0
+        headers = {h.strip().lower() for h in first}
+        # 表头特征越多越具体，优先于通用格式
+        return len(self.signature) if self.signature <= headers else 0
+
+    def parse(self, fb) -> Iterator[Dict]:
+        f = io.TextIOWrapper(fb, encoding='utf-8-sig', newline='')
+        r = csv.DictReader(f)
+        r.fieldnames = [h.strip().lower() for h in r.fieldnames or []]
+        missing = self.signature - set(r.fieldnames)
+        if missing:
+            raise ValueError(f'{self.label}：缺少必需的列 {", ".join(sorted(missing))}')
+        now = int(time.time())
+        for row in r:
+            if self.row_filter is not None and not self.row_filter(row):
+                continue
+            rec = make_record(**{k: row.get(col) for k, col in self.fields.items()}, now=now)
+            if not rec['website'] and self.title:
+                rec['website'] = (row.get(self.title) or '').strip()
+            yield rec
+
+
+class BitwardenJsonImporter(Importer):
+    name = 'bitwarden-json'
+    label = 'Bitwarden JSON'
+
+    def detect(self, head: str) -> int:
+        h = head.lstrip()
+        return 10 if h.startswith('{') and '"items"' in h else 0
+
+    def parse(self, fb) -> Iterator[Dict]:
+        # Bitwarden 导出是单个 JSON 对象，只能整体解析
+        data = json.load(io.TextIOWrapper(fb, encoding='utf-8-sig'))
+        if data.get('encrypted'):
+            raise ValueError('Bitwarden 加密导出无法直接导入，请导出为未加密的 JSON')
+        now = int(time.time())
+        for item in data.get('items') or []:
+            login = item.get('login')
+            if item.get('type') != 1 or not login:
+                continue
+            uris = login.get('uris') or []
+            url = next((u.get('uri') for u in uris if u.get('uri')), '')
+            yield make_record(website=url or item.get('name'), account=login.get('username'),
+                              password=login.get('password'), note=item.get('notes'),
+                              created_at=item.get('creationDate'), now=now)
+
+
+class KeePassXmlImporter(Importer):
+    name = 'keepass-xml'
+    label = 'KeePass XML'
+
+    def detect(self, head: str) -> int:
+        h = head.lstrip()
+        return 10 if h.startswith('<') and '<KeePassFile' in h else 0
+
+    def parse(self, fb) -> Iterator[Dict]:
+        # 流式解析：处理完的条目立即清空；History 中的旧版本条目不导入
+        now = int(time.time())
+        stack: List[str] = []
+        for ev, el in ET.iterparse(fb, events=('start', 'end')):
+            if ev == 'start':
+                stack.append(el.tag)
+                continue
+            stack.pop()
+            if el.tag == 'Entry' and 'History' not in stack:
+                yield self._entry(el, now)
+                el.clear()
+            elif el.tag in ('History', 'Meta', 'Group'):
+                el.clear()
+
+    @staticmethod
+    def _entry(el, now: int) -> Dict:
+        s = {}
+        for item in el.findall('String'):
+            s[item.findtext('Key', '')] = item.findtext('Value', '') or ''
+        return make_record(website=s.get('URL') or s.get('Title'), account=s.get('UserName'),
+                           password=s.get('Password'), note=s.get('Notes'),
+                           created_at=el.findtext('Times/CreationTime'), now=now)
+
+
+class ArchiveImporter(Importer):
+    """本软件导出的加密归档，记录保留原有 id 与全部字段。"""
+    name = 'archive'
+    label = '加密归档'
+    needs_password = True
+
+    def detect(self, head: str) -> int:
+        return 100 if head.startswith(ARCHIVE_MAGIC.decode('ascii')) else 0
+
+    def parse(self, fb, password: Optional[str] = None) -> Iterator[Dict]:
+        if not password:
+            raise ValueError('导入加密归档需要输入归档密码')
+        now = int(time.time())
+        for rec in iter_archive(fb, password):
+            rec = dict(rec)
+            rec.update(make_record(**{k: rec.get(k) for k in RECORD_FIELDS},
+                                   created_at=rec.get('created_at'), now=now))
+            yield rec
+
+
+register_importer(CsvImporter(
+    'native', '本软件 CSV', {'account', 'password'},
+    {f: f for f in RECORD_FIELDS + ('created_at',)}))
+register_importer(CsvImporter(
+    'chrome', 'Chrome / Edge CSV', {'name', 'url', 'username', 'password'},
+    {'website': 'url', 'account': 'username', 'password': 'password', 'note': 'note'}, title='name'))
+register_importer(CsvImporter(
+    'firefox', 'Firefox CSV', {'url', 'username', 'password', 'httprealm', 'formactionorigin'},
+    {'website': 'url', 'account': 'username', 'password': 'password', 'created_at': 'timecreated'}))
+register_importer(CsvImporter(
+    'bitwarden-csv', 'Bitwarden CSV', {'type', 'name', 'login_uri', 'login_username', 'login_password'},
+    {'website': 'login_uri', 'account': 'login_username', 'password': 'login_password', 'note': 'notes'},
+    title='name', row_filter=lambda row: (row.get('type') or 'login').strip().lower() == 'login'))
+register_importer(CsvImporter(
+    'keepassxc-csv', 'KeePassXC CSV', {'group', 'title', 'username', 'password', 'url'},
+    {'website': 'url', 'account': 'username', 'password': 'password', 'note': 'notes', 'created_at': 'created'},
+    title='title'))
+register_importer(CsvImporter(
+    'keepass-csv', 'KeePass CSV', {'account', 'login name', 'password', 'web site'},
+    {'website': 'web site', 'account': 'login name', 'password': 'password', 'note': 'comments'},
+    title='account'))
+register_importer(BitwardenJsonImporter())
+register_importer(KeePassXmlImporter())
+register_importer(ArchiveImporter())
+
+
+def _parse(imp: Importer, fb, password: Optional[str]) -> Iterator[Dict]:
+    return imp.parse(fb, password) if imp.needs_password else imp.parse(fb)
+
+
+def parse_file(path: str, fmt: Optional[str] = None, password: Optional[str] = None) -> Tuple[str, List[Dict]]:
+    """解析整个文件，返回 (格式名, 记录)；供进程池调用，因此是模块级函数。"""
+    imp = get_importer(path, fmt)
+    with open(path, 'rb') as fb:
+        return imp.name, list(_parse(imp, fb, password))
+
+
+class ImportJob:
+    """从一个或多个文件导入：自动识别格式，按 (网站, 账号) 去重，可报告进度与取消。
+
+    传入 sink 时每凑满 chunk_rows 条就交给 sink（通常是打开的事务中的 add_many），内存只保留一块；
+    取消时由调用方回滚事务。多个文件且总量较大时分给进程池并行解析，每个文件整体解析完才返回，
+    因此并行时内存随单个文件的大小增长；合并时仍按文件顺序去重，结果与串行解析一致。
+    """
+
+    def __init__(self, paths: Iterable[str], existing_keys: Optional[Set[bytes]] = None,
+                 fmt: Optional[str] = None, chunk_rows: int = CHUNK_ROWS, workers: Optional[int] = None,
+                 password: Optional[str] = None):
+        self.paths = list(paths)
+        self.fmt = fmt
+        self.password = password  # 加密归档的密码
+        self.seen = set(existing_keys or ())
+        self.chunk_rows = chunk_rows
+        self.workers = workers
+        self.formats: Dict[str, str] = {}  # 路径 -> 识别出的格式名
+        self._sink: Optional[Callable[[List[Dict]], object]] = None
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+
+    def run(self, progress: Optional[Callable[[int, int], None]] = None,
+            cancel: Optional[threading.Event] = None,
+            sink: Optional[Callable[[List[Dict]], object]] = None) -> List[Dict]:
+        """progress(已处理字节, 总字节)；cancel 被置位时抛出 ImportCancelled。
+
+        没有 sink 时返回全部记录；有 sink 时记录分块交给 sink，返回空列表。
+        """
+        sizes = [os.path.getsize(p) for p in self.paths]
+        total = max(1, sum(sizes))
+        records: List[Dict] = []
+        self._sink = sink
+        if len(self.paths) > 1 and total >= PARALLEL_MIN_BYTES and (self.workers or os.cpu_count() or 1) > 1:
+            self._run_parallel(sizes, total, progress, cancel, records)
+        else:
+            self._run_serial(sizes, total, progress, cancel, records)
+        self._flush(records)
+        if progress:
+            progress(total, total)
+        return records
+
+    def _flush(self, records: List[Dict]):
+        if self._sink is not None and records:
+            self._sink(records[:])
+            records.clear()
+
+    def _check(self, cancel: Optional[threading.Event]):
+        if cancel is not None and cancel.is_set():
+            raise ImportCancelled()
+
+    def _run_serial(self, sizes, total, progress, cancel, records: List[Dict]):
+        done = 0
+        for path, size in zip(self.paths, sizes):
+            imp = get_importer(path, self.fmt)
+            self.formats[path] = imp.name
+            with open(path, 'rb') as fb:
+                for n, rec in enumerate(_parse(imp, fb, self.password), 1):
+                    self._accept(rec, records)
+                    if n % self.chunk_rows == 0:
+                        self._check(cancel)
+                        self._flush(records)
+                        if progress:
+                            progress(done + min(fb.tell(), size), total)
+            done += size
+
+    def _run_parallel(self, sizes, total, progress, cancel, records: List[Dict]):
+        # 按文件顺序合并：排在前面的文件都已完成时立即去重并交给 sink，只有提前完成的文件暂存
+        results: Dict[int, List[Dict]] = {}
+        merged = 0
+        done = 0
+        pool = ProcessPoolExecutor(max_workers=self.workers or min(len(self.paths), os.cpu_count() or 1))
+        try:
+            futures = {pool.submit(parse_file, path, self.fmt, self.password): i for i, path in enumerate(self.paths)}
+            pending = set(futures)
+            while pending:
+                finished, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                self._check(cancel)
+                for fut in finished:
+                    i = futures[fut]
+                    self.formats[self.paths[i]], results[i] = fut.result()
+                    done += sizes[i]
+                    if progress:
+                        progress(done, total)
+                while merged in results:
+                    for n, rec in enumerate(results.pop(merged), 1):
+                        self._accept(rec, records)
+                        if n % self.chunk_rows == 0:
+                            self._flush(records)
+                    merged += 1
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _accept(self, rec: Dict, out: List[Dict]):
+        if not rec.get('account') or not rec.get('password'):
+            self.invalid += 1
+            return
+        key = dedup_key(rec.get('website', ''), rec['account'])
+        if key in self.seen:
+            self.duplicates += 1
+            return
+        self.seen.add(key)
+        out.append(rec)
+        self.imported += 1
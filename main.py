@@ -1,16 +1,85 @@
 import os
 import sys
 import time
-import random
-import string
+import threading
+import json
+import multiprocessing
 from typing import List, Dict
 
 from PyQt5 import QtCore, QtGui, QtWidgets
+from cryptography.exceptions import InvalidTag
 
 from storage import SecureStorage, KeyManager, app_root
+from encryption import calibrate_kdf, KDF_PBKDF2, KDF_SCRYPT
+from generator import build_charset, generate_credentials
+from importers import ImportJob, ImportCancelled, IMPORTERS
+from archive import write_archive, is_archive, ExportCancelled, ARCHIVE_SUFFIX
+from table_model import AccountTableModel, AuditTableModel, COLUMNS, format_cell
+from audit import PasswordAuditor, AuditCancelled, AGE_LIMIT_DAYS
+from breach import BreachCorpus, find_corpus, BREACH_FILE, INDEX_SUFFIX
+import profiling
+from profiling import timed
+
+
+class PersistenceSignals(QtCore.QObject):
+    # 由后台写入线程发出，Qt 自动排队到界面线程执行
+    saved = QtCore.pyqtSignal()
+    failed = QtCore.pyqtSignal(str)
+    conflict = QtCore.pyqtSignal()
+
+
+class MainThreadCall(QtCore.QObject):
+    """让工作线程在界面线程上执行 fn(arg) 并等待其完成（例如把导入的记录分块写入存储）。"""
+    _call = QtCore.pyqtSignal(object)
+
+    def __init__(self, fn, parent=None):
+        super().__init__(parent)
+        self._fn = fn
+        self._error = None
+        self._call.connect(self._run, QtCore.Qt.BlockingQueuedConnection)
+
+    def _run(self, arg):
+        # 异常不能从槽函数中抛出，交回工作线程再抛
+        try:
+            self._fn(arg)
+        except Exception as e:
+            self._error = e
+
+    def __call__(self, arg):
+        self._call.emit(arg)
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+
+class BackgroundTask(QtCore.QThread):
+    """在工作线程中执行一个耗时函数（密钥派生、导入解析等），结果或异常留给调用方读取。
+
+    cancellable=True 时以 fn(report, cancel) 调用：report(done, total) 报告进度，
+    cancel 是 threading.Event，由界面线程在用户取消时置位。
+    """
+    progress = QtCore.pyqtSignal(int, int)
+
+    def __init__(self, fn, parent=None, cancellable: bool = False):
+        super().__init__(parent)
+        self.fn = fn
+        self.cancellable = cancellable
+        self.cancel = threading.Event()
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            if self.cancellable:
+                self.result = self.fn(self.progress.emit, self.cancel)
+            else:
+                self.result = self.fn()
+        except Exception as e:
+            self.error = e
 
 
 class PasswordManagerApp(QtWidgets.QMainWindow):
+    @timed('ui.startup')
     def __init__(self):
         super().__init__()
         self.setWindowTitle('大飞哥软件自习室—本地账号密码管理器')
@@ -31,9 +100,24 @@ class PasswordManagerApp(QtWidgets.QMainWindow):
         self._ensure_unlock_key()
         self.store = SecureStorage(self.key_mgr)
         self.store.load()
+        # 磁盘写入交给后台线程，保存不阻塞界面
+        self.persist_signals = PersistenceSignals(self)
+        self.persist_signals.saved.connect(self.on_persist_saved)
+        self.persist_signals.failed.connect(self.on_persist_failed)
+        self.persist_signals.conflict.connect(self.on_vault_changed)
+        self.store.start_writer(on_saved=self.persist_signals.saved.emit,
+                                on_failed=lambda e: self.persist_signals.failed.emit(str(e)),
+                                save_delay=1.0, on_conflict=self.persist_signals.conflict.emit)
+        # 定时检查数据文件是否被其他程序（另一个窗口、命令行工具、代理）修改；未变化时只有两次 stat
+        self.watch_timer = QtCore.QTimer(self)
+        self.watch_timer.setInterval(1000)
+        self.watch_timer.timeout.connect(self.on_vault_changed)
+        self.watch_timer.start()
 
         # Clipboard清理设置
         self.clear_clip_after = 10  # 秒
+        self.auditor = PasswordAuditor()  # 缓存上次体检结果，再次体检只重新计算改动过的记录
+        self.breach = None                # 离线泄露密码库，首次使用时打开
         self.clipboard = QtWidgets.QApplication.clipboard()
         self.clear_timer = QtCore.QTimer(self)
         self.clear_timer.setSingleShot(True)
@@ -46,6 +130,7 @@ class PasswordManagerApp(QtWidgets.QMainWindow):
             ('支持输出', self.on_export),
             ('存储记录', self.on_show_records),
             ('导入数据', self.on_import),
+            ('密码体检', self.on_audit),
             ('软件加密', self.on_set_password),
             ('使用必读', self.on_show_usage),
             ('赞助支持', self.on_support)
@@ -93,7 +178,7 @@ class PasswordManagerApp(QtWidgets.QMainWindow):
         ag.addWidget(self.pw_digits, 3, 4)
         ag.addWidget(self.pw_symbols, 3, 5)
 
-        self.gen_count = QtWidgets.QSpinBox(); self.gen_count.setRange(1, 50); self.gen_count.setValue(1)
+        self.gen_count = QtWidgets.QSpinBox(); self.gen_count.setRange(1, 100000); self.gen_count.setValue(1)
         self.btn_generate = QtWidgets.QPushButton('开始生成')
         self.btn_generate.clicked.connect(self.on_generate)
         ag.addWidget(QtWidgets.QLabel('生成数量:'), 4, 0)
@@ -130,6 +215,13 @@ class PasswordManagerApp(QtWidgets.QMainWindow):
         bo = QtWidgets.QHBoxLayout(bottom_opts)
         self.search_edit = QtWidgets.QLineEdit(); self.search_edit.setPlaceholderText('搜索网站/账号/邮箱/手机号/备注')
         btn_search = QtWidgets.QPushButton('搜索'); btn_search.clicked.connect(self.on_search)
+        # 边输入边搜索：停止输入一小段时间后再执行，避免每个按键都刷新表格
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.on_search)
+        self.search_edit.textChanged.connect(self.on_search_text_changed)
+        self.search_edit.returnPressed.connect(self.on_search)
         bo.addWidget(QtWidgets.QLabel('搜索:'))
         bo.addWidget(self.search_edit)
         bo.addWidget(btn_search)
@@ -142,15 +234,17 @@ class PasswordManagerApp(QtWidgets.QMainWindow):
         self.cb_show_pwd = QtWidgets.QCheckBox('显示密码'); self.cb_show_pwd.toggled.connect(self.on_toggle_show_password)
         bo.addWidget(self.cb_show_pwd)
 
-        # 记录表
-        self.table = QtWidgets.QTableWidget(0, 7)
-        self.table.setHorizontalHeaderLabels(['网站', '账号', '密码', '手机', '邮箱', '备注', '创建时间'])
+        # 记录表（模型按需格式化，只渲染可见行）
+        self.table_model = AccountTableModel(self.store.accounts, self)
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.table_model)
         self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
         self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         # 交互：双击复制，点击网址打开浏览器
         self.table.doubleClicked.connect(self.on_table_double_click)
-        self.table.cellClicked.connect(self.on_table_cell_clicked)
+        self.table.clicked.connect(self.on_table_cell_clicked)
 
         # 底部操作
         bottom_action = QtWidgets.QWidget()
@@ -176,76 +270,116 @@ class PasswordManagerApp(QtWidgets.QMainWindow):
         footer.setOpenExternalLinks(True)
         lay.addWidget(footer)
         self.setCentralWidget(central)
+        # 隐藏的诊断窗口（性能埋点统计），供排查“打开很慢”等问题
+        QtWidgets.QShortcut(QtGui.QKeySequence('Ctrl+Shift+D'), self, activated=self.on_diagnostics)
 
         self.refresh_table()
 
+    def _run_in_background(self, label: str, fn, cancellable: bool = False):
+        """在工作线程执行 fn，期间显示进度框且界面保持响应；返回结果或抛出 fn 的异常。
+
+        cancellable=True 时进度框显示百分比与“取消”按钮，参见 BackgroundTask。
+        """
+        progress = QtWidgets.QProgressDialog(label, '取消' if cancellable else None, 0, 1000 if cancellable else 0, self)
+        progress.setWindowTitle('请稍候')
+        progress.setWindowModality(QtCore.Qt.ApplicationModal)
+        progress.setMinimumDuration(0)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
+        task = BackgroundTask(fn, self, cancellable)
+        if cancellable:
+            task.progress.connect(lambda done, total: progress.setValue(int(done * 1000 / max(total, 1))))
+            progress.canceled.connect(task.cancel.set)
+        loop = QtCore.QEventLoop()
+        task.finished.connect(loop.quit)
+        task.start()
+        progress.show()
+        loop.exec_()
+        progress.close()
+        if task.error is not None:
+            raise task.error
+        return task.result
+
     def _ensure_unlock_key(self):
-        # 如果secret.key已加密，弹出密码输入
-        try:
+        # 如果secret.key已加密，弹出密码输入；密钥派生在后台线程进行
+        if not self.key_mgr.needs_password():
             self.key_mgr.load(password=None)
-        except Exception:
+            return
+        prompt = '请输入启动密码以解锁:'
+        while True:
             dlg = QtWidgets.QInputDialog(self)
             dlg.setWindowTitle('解锁软件密码')
-            dlg.setLabelText('请输入启动密码以解锁:')
+            dlg.setLabelText(prompt)
             dlg.setTextEchoMode(QtWidgets.QLineEdit.Password)
-            if dlg.exec_() == QtWidgets.QDialog.Accepted:
-                pwd = dlg.textValue()
-                self.key_mgr.load(password=pwd)
-            else:
+            if dlg.exec_() != QtWidgets.QDialog.Accepted:
                 QtWidgets.QMessageBox.critical(self, '错误', '必须输入密码才能继续。')
                 sys.exit(1)
+            pwd = dlg.textValue()
+            if not pwd:
+                prompt = '密码不能为空，请输入启动密码:'
+                continue
+            try:
+                self._run_in_background('正在解锁...', lambda: self.key_mgr.load(password=pwd))
+                return
+            except InvalidTag:
+                prompt = '密码错误，请重新输入启动密码:'
+            except Exception as e:
+                # 密钥文件损坏、无法读取或参数无效，重新输入密码也无济于事
+                QtWidgets.QMessageBox.critical(self, '错误', f'无法读取密钥文件：{e}')
+                sys.exit(1)
 
     # UI helpers
-    def add_row(self, rec: Dict):
-        row = self.table.rowCount()
-        self.table.insertRow(row)
-        cols = ['website', 'account', 'password', 'phone', 'email', 'note', 'created_at']
-        for i, k in enumerate(cols):
-            val = rec.get(k, '')
-            if k == 'created_at':
-                val = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(val))
-            item = QtWidgets.QTableWidgetItem(str(val))
-            if k == 'password' and not self.cb_show_pwd.isChecked():
-                item.setText('******')
-            self.table.setItem(row, i, item)
-
+    @timed('ui.refresh_table')
     def refresh_table(self, data: List[Dict] = None):
         if data is None:
             data = self.store.accounts
-        self.table.setRowCount(0)
-        for rec in data:
-            self.add_row(rec)
+        self.table_model.set_rows(data)
 
-    # Generation
-    def _build_charset(self, upper, lower, digits, symbols=False):
-        cs = ''
-        if upper: cs += string.ascii_uppercase
-        if lower: cs += string.ascii_lowercase
-        if digits: cs += string.digits
-        if symbols: cs += '!@#$%^&*()-_=+[]{};:,./?'
-        if not cs:
-            cs = string.ascii_letters + string.digits
-        return cs
-
-    def random_string(self, length: int, cs: str) -> str:
-        return ''.join(random.choice(cs) for _ in range(length))
+    def _refresh_view(self):
+        # 有搜索条件时保持筛选结果（查询缓存会让重复搜索几乎没有开销）
+        if self.search_edit.text().strip():
+            self.on_search()
+        else:
+            self.refresh_table()
 
+    # Generation
     def on_generate(self):
-        acc_cs = self._build_charset(self.acc_upper.isChecked(), self.acc_lower.isChecked(), self.acc_digits.isChecked())
-        pw_cs = self._build_charset(self.pw_upper.isChecked(), self.pw_lower.isChecked(), self.pw_digits.isChecked(), self.pw_symbols.isChecked())
+        acc_cs = build_charset(self.acc_upper.isChecked(), self.acc_lower.isChecked(), self.acc_digits.isChecked())
+        pw_cs = build_charset(self.pw_upper.isChecked(), self.pw_lower.isChecked(), self.pw_digits.isChecked(), self.pw_symbols.isChecked())
         count = self.gen_count.value()
-        for _ in range(count):
-            rec = {
-                'website': self.web_auto.text().strip(),
-                'account': self.random_string(self.len_user.value(), acc_cs),
-                'password': self.random_string(self.len_pwd.value(), pw_cs),
-                'phone': self.phone_auto.text().strip(),
-                'email': self.mail_auto.text().strip(),
-                'note': self.note_auto.text().strip(),
-                'created_at': int(time.time())
-            }
-            self.store.add(rec)
-        self.refresh_table()
+        len_user, len_pwd = self.len_user.value(), self.len_pwd.value()
+        corpus = self._breach_corpus()
+        # 在界面线程取快照，后台解密各页收集已有账号并生成；账号在本批内及与库中已有账号之间都不重复
+        snapshot = self.store.accounts.clone(with_ids=False)
+
+        def generate():
+            existing = {r.get('account', '') for r in snapshot}
+            return generate_credentials(count, acc_cs, len_user, pw_cs, len_pwd, existing_accounts=existing,
+                                        reject=(lambda pwds: set(corpus.check(pwds))) if corpus else None)
+
+        try:
+            creds = self._run_in_background('正在生成…', generate)
+        except ValueError as e:
+            QtWidgets.QMessageBox.warning(self, '提示', str(e))
+            return
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, '错误', str(e))
+            return
+        now = int(time.time())
+        website = self.web_auto.text().strip()
+        phone = self.phone_auto.text().strip()
+        email = self.mail_auto.text().strip()
+        note = self.note_auto.text().strip()
+        self.store.add_many({
+            'website': website,
+            'account': acc,
+            'password': pwd,
+            'phone': phone,
+            'email': email,
+            'note': note,
+            'created_at': now
+        } for acc, pwd in creds)
+        self._refresh_view()
         QtWidgets.QMessageBox.information(self, '完成', f'已生成{count}条记录')
 
     def on_save_manual(self):
@@ -254,6 +388,12 @@ class PasswordManagerApp(QtWidgets.QMainWindow):
         if not acc or not pwd:
             QtWidgets.QMessageBox.warning(self, '提示', '账号与密码为必填')
             return
+        corpus = self._breach_corpus()
+        hits = corpus.count(pwd) if corpus else 0
+        if hits:
+            ret = QtWidgets.QMessageBox.question(self, '密码已泄露', f'该密码在泄露密码库中出现过{hits}次，仍然保存吗？')
+            if ret != QtWidgets.QMessageBox.Yes:
+                return
         rec = {
             'website': self.web.text().strip(),
             'account': acc,
@@ -264,27 +404,31 @@ class PasswordManagerApp(QtWidgets.QMainWindow):
             'created_at': int(time.time())
         }
         self.store.add(rec)
-        self.refresh_table()
+        self._refresh_view()
         self.account.clear(); self.password.clear()
         QtWidgets.QMessageBox.information(self, '完成', '记录已保存')
 
+    def on_search_text_changed(self, _text: str):
+        self.search_timer.start()
+
+    @timed('ui.search')
     def on_search(self):
+        self.search_timer.stop()
         q = self.search_edit.text()
         self.refresh_table(self.store.search(q))
 
     def on_delete_selected(self):
-        rows = sorted(set([r.row() for r in self.table.selectedIndexes()]), reverse=True)
+        rows = set([r.row() for r in self.table.selectedIndexes()])
         if not rows:
             return
         if QtWidgets.QMessageBox.question(self, '确认', '删除选中记录将不可恢复，确认删除？') == QtWidgets.QMessageBox.Yes:
-            for r in rows:
-                self.store.delete_by_index(r)
-            self.refresh_table()
+            ids = {self.table_model.record_id(r) for r in rows}
+            self.table_model.remove_ids(ids, lambda: self.store.delete_many(ids))
 
-    def on_table_cell_clicked(self, row: int, col: int):
+    def on_table_cell_clicked(self, index: QtCore.QModelIndex):
         # 单击网址列直接在浏览器打开
-        if col == 0:
-            rec = self.store.accounts[row]
+        if index.column() == 0:
+            rec = self.table_model.record(index.row())
             url = (rec.get('website', '') or '').strip()
             if url:
                 if not (url.startswith('http://') or url.startswith('https://')):
@@ -293,7 +437,7 @@ class PasswordManagerApp(QtWidgets.QMainWindow):
 
     def on_table_double_click(self, index: QtCore.QModelIndex):
         row = index.row(); col = index.column()
-        rec = self.store.accounts[row]
+        rec = self.table_model.record(row)
         if col == 0:
             # 网址列：同样支持双击打开
             url = (rec.get('website', '') or '').strip()
@@ -303,16 +447,32 @@ class PasswordManagerApp(QtWidgets.QMainWindow):
                 QtGui.QDesktopServices.openUrl(QtCore.QUrl(url))
             return
         # 其他列：双击复制真实值
-        fields = ['website', 'account', 'password', 'phone', 'email', 'note', 'created_at']
-        key = fields[col]
-        val = rec.get(key, '')
-        if key == 'created_at' and isinstance(val, int):
-            val = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(val))
-        self.clipboard.setText(str(val))
+        self.clipboard.setText(format_cell(rec, COLUMNS[col][0]))
         if self.clear_clip_after > 0:
             self.clear_timer.start(self.clear_clip_after * 1000)
         QtWidgets.QToolTip.showText(QtGui.QCursor.pos(), '内容已复制到剪贴板')
 
+    def on_persist_saved(self):
+        self.statusBar().showMessage('数据已保存', 2000)
+
+    def on_vault_changed(self):
+        try:
+            changed = self.store.refresh()
+        except Exception as e:
+            self.statusBar().showMessage(f'载入其他程序的修改失败：{e}', 5000)
+            return
+        if changed:
+            self._refresh_view()
+            self.statusBar().showMessage('已载入其他程序所做的修改', 3000)
+
+    def on_persist_failed(self, msg: str):
+        QtWidgets.QMessageBox.critical(self, '保存失败', f'数据写入磁盘失败：{msg}')
+
+    def closeEvent(self, event: QtGui.QCloseEvent):
+        # 退出前等待后台写入全部完成
+        self.store.close()
+        super().closeEvent(event)
+
     def _clear_clipboard(self):
         self.clipboard.clear()
 
@@ -325,30 +485,221 @@ class PasswordManagerApp(QtWidgets.QMainWindow):
             self.clear_clip_after = 30
 
     def on_toggle_show_password(self, checked):
-        self.refresh_table()
+        self.table_model.set_show_password(checked)
 
     # Top actions
+    def _ask_archive_password(self, confirm: bool):
+        """输入加密归档密码；confirm 时需输入两次。取消返回 None。"""
+        dlg = QtWidgets.QDialog(self)
+        dlg.setWindowTitle('加密归档密码')
+        lay = QtWidgets.QVBoxLayout(dlg)
+        pwd = QtWidgets.QLineEdit(); pwd.setEchoMode(QtWidgets.QLineEdit.Password)
+        again = QtWidgets.QLineEdit(); again.setEchoMode(QtWidgets.QLineEdit.Password)
+        lay.addWidget(QtWidgets.QLabel('归档密码:'))
+        lay.addWidget(pwd)
+        if confirm:
+            lay.addWidget(QtWidgets.QLabel('确认密码:'))
+            lay.addWidget(again)
+        btns = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
+        lay.addWidget(btns)
+
+        def do_ok():
+            if not pwd.text():
+                QtWidgets.QMessageBox.warning(dlg, '提示', '请输入密码')
+                return
+            if confirm and pwd.text() != again.text():
+                QtWidgets.QMessageBox.warning(dlg, '提示', '两次输入的密码不一致')
+                return
+            dlg.accept()
+
+        btns.accepted.connect(do_ok)
+        btns.rejected.connect(dlg.reject)
+        if dlg.exec_() != QtWidgets.QDialog.Accepted:
+            return None
+        return pwd.text()
+
     def on_export(self):
-        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, '导出CSV', os.path.join(app_root(), 'export.csv'), 'CSV Files (*.csv)')
+        path, flt = QtWidgets.QFileDialog.getSaveFileName(
+            self, '导出数据', os.path.join(app_root(), 'export' + ARCHIVE_SUFFIX),
+            f'加密归档 (*{ARCHIVE_SUFFIX});;CSV Files (*.csv)')
         if not path:
             return
-        self.store.export_csv(path)
-        QtWidgets.QMessageBox.information(self, '完成', '已导出到CSV')
+        if path.lower().endswith('.csv') or flt.startswith('CSV'):
+            ret = QtWidgets.QMessageBox.question(self, '确认', 'CSV 文件以明文保存所有密码，确定导出吗？')
+            if ret != QtWidgets.QMessageBox.Yes:
+                return
+            self.store.export_csv(path)
+            QtWidgets.QMessageBox.information(self, '完成', '已导出到CSV')
+            return
+        password = self._ask_archive_password(confirm=True)
+        if password is None:
+            return
+        # 在界面线程取快照，后台线程逐页解密、分段加密写出
+        snapshot = self.store.accounts.clone(with_ids=False)
+
+        def export(report, cancel):
+            kdf = calibrate_kdf(KDF_SCRYPT, 0.5)
+            return write_archive(path, snapshot, password, kdf, count=len(snapshot), progress=report, cancel=cancel)
+
+        try:
+            cnt = self._run_in_background('正在导出加密归档…', export, cancellable=True)
+        except ExportCancelled:
+            QtWidgets.QMessageBox.information(self, '提示', '已取消导出')
+            return
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, '错误', str(e))
+            return
+        QtWidgets.QMessageBox.information(self, '完成', f'已导出{cnt}条记录到加密归档')
 
     def on_show_records(self):
         self.refresh_table()
         QtWidgets.QMessageBox.information(self, '提示', '列表已刷新到最新数据')
 
     def on_import(self):
-        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, '选择CSV导入', app_root(), 'CSV Files (*.csv)')
-        if not path:
+        paths, _ = QtWidgets.QFileDialog.getOpenFileNames(
+            self, '选择要导入的文件', app_root(),
+            f'支持的格式 (*.csv *.json *.xml *{ARCHIVE_SUFFIX});;CSV Files (*.csv);;Bitwarden JSON (*.json);;'
+            f'KeePass XML (*.xml);;加密归档 (*{ARCHIVE_SUFFIX})')
+        if not paths:
             return
+        password = None
+        if any(is_archive(p) for p in paths):
+            password = self._ask_archive_password(confirm=False)
+            if password is None:
+                return
+        # 后台线程解析与去重，每块记录回到界面线程写入同一个事务（一次保存）；取消或出错时整体回滚
+        job = ImportJob(paths, self.store.import_keys(), password=password)
+        sink = MainThreadCall(self.store.add_many, self)
         try:
-            cnt = self.store.import_csv(path)
-            self.refresh_table()
-            QtWidgets.QMessageBox.information(self, '完成', f'成功导入{cnt}条记录')
+            with self.store.transaction():
+                self._run_in_background('正在导入…', lambda progress, cancel: job.run(progress, cancel, sink),
+                                        cancellable=True)
+            cnt = job.imported
+        except ImportCancelled:
+            QtWidgets.QMessageBox.information(self, '提示', '已取消导入，未写入任何记录')
+            return
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, '错误', str(e))
+            return
+        self._refresh_view()
+        labels = '、'.join(dict.fromkeys(IMPORTERS[name].label for name in job.formats.values()))
+        msg = f'成功导入{cnt}条记录（{labels}）'
+        if job.duplicates:
+            msg += f'，跳过重复{job.duplicates}条'
+        if job.invalid:
+            msg += f'，跳过缺少账号或密码的{job.invalid}条'
+        QtWidgets.QMessageBox.information(self, '完成', msg)
+
+    def _breach_corpus(self):
+        """程序目录下的离线泄露密码库；不存在时返回 None。首次打开需建立前缀索引，放在后台进行。"""
+        if self.breach is not None:
+            return self.breach
+        path = find_corpus(app_root())
+        if path is None:
+            return None
+        try:
+            if os.path.exists(path + INDEX_SUFFIX):
+                self.breach = BreachCorpus(path)
+            else:
+                self.breach = self._run_in_background('正在为泄露密码库建立索引…', lambda: BreachCorpus(path))
+        except Exception as e:
+            QtWidgets.QMessageBox.warning(self, '提示', f'无法打开泄露密码库：{e}')
+            return None
+        return self.breach
+
+    def on_audit(self):
+        # 在界面线程取快照（未解密的页在后台按需解密；体检缓存按 id 与版本号判断是否改动），后台计算
+        snapshot = self.store.accounts.clone(with_ids=False)
+        corpus = self._breach_corpus()
+        try:
+            report = self._run_in_background(
+                '正在检查密码…',
+                lambda progress, cancel: self.auditor.audit(snapshot, progress=progress, cancel=cancel, breach=corpus),
+                cancellable=True)
+        except AuditCancelled:
+            return
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, '错误', str(e))
+            return
+        dlg = QtWidgets.QDialog(self)
+        dlg.setWindowTitle('密码体检')
+        dlg.resize(900, 600)
+        lay = QtWidgets.QVBoxLayout(dlg)
+        reused = len(report.reuse_count)
+        lay.addWidget(QtWidgets.QLabel(
+            f'共检查{report.total}条记录：{len(report.reused)}组重复使用的密码（涉及{reused}条），'
+            f'弱密码{len(report.weak)}条，超过{AGE_LIMIT_DAYS}天未更换{len(report.old)}条。'
+            + (f'\n{len(report.breached)}条密码出现在泄露密码库中。' if corpus else
+               f'\n未找到泄露密码库，可将 Pwned Passwords（SHA-1 有序）文件放到程序目录并命名为 {BREACH_FILE}。')))
+        view = QtWidgets.QTableView()
+        view.setModel(AuditTableModel(report, self.store.get, view))
+        view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        view.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        view.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        view.horizontalHeader().setStretchLastSection(True)
+        lay.addWidget(view)
+        btns = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Close)
+        btns.rejected.connect(dlg.reject)
+        lay.addWidget(btns)
+        dlg.exec_()
+
+    def on_diagnostics(self):
+        dlg = QtWidgets.QDialog(self)
+        dlg.setWindowTitle('诊断信息')
+        dlg.resize(900, 600)
+        lay = QtWidgets.QVBoxLayout(dlg)
+        cb_enable = QtWidgets.QCheckBox('记录性能数据（关闭时几乎没有开销）')
+        cb_enable.setChecked(profiling.enabled())
+        lay.addWidget(cb_enable)
+        lay.addWidget(QtWidgets.QLabel(f'启动前设置环境变量 {profiling.PROFILE_ENV}=文件路径 可从启动开始记录，并逐条写入 JSON 行日志。'))
+        span_table = QtWidgets.QTableWidget(0, 5)
+        span_table.setHorizontalHeaderLabels(['区间', '次数', '总耗时(ms)', '平均(ms)', '最大(ms)'])
+        span_table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        span_table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        lay.addWidget(span_table, 3)
+        extra = QtWidgets.QPlainTextEdit()
+        extra.setReadOnly(True)
+        lay.addWidget(extra, 2)
+
+        def fill():
+            snap = profiling.snapshot()
+            rows = sorted(snap['spans'].items(), key=lambda kv: -kv[1]['total_ms'])
+            span_table.setRowCount(len(rows))
+            for r, (name, st) in enumerate(rows):
+                for c, val in enumerate((name, st['count'], st['total_ms'], st['avg_ms'], st['max_ms'])):
+                    item = QtWidgets.QTableWidgetItem(str(val))
+                    if c:
+                        item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                    span_table.setItem(r, c, item)
+            lines = [f'{k}: {v}' for k, v in sorted(snap['counters'].items())]
+            lines.append(f'记录数: {len(self.store.accounts)}，已解密页: {self.store.accounts.loaded_pages}'
+                         f'/{self.store.accounts.page_count}，后台写入: {self.store.save_stats()}')
+            lines.append('')
+            lines.append('最近的区间:')
+            for ev in reversed(snap['recent'][-100:]):
+                parent = f' ← {ev["parent"]}' if 'parent' in ev else ''
+                lines.append(f'{time.strftime("%H:%M:%S", time.localtime(ev["ts"]))} {ev["ms"]:>10.3f} ms  '
+                             f'{ev["name"]}{parent} [{ev["thread"]}]')
+            extra.setPlainText('\n'.join(lines))
+
+        def toggle(checked):
+            if checked:
+                profiling.enable()
+            else:
+                profiling.disable()
+
+        def copy_json():
+            self.clipboard.setText(json.dumps(profiling.snapshot(), ensure_ascii=False, indent=1))
+
+        cb_enable.toggled.connect(toggle)
+        btns = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Close)
+        for title, handler in [('刷新', fill), ('清空', lambda: (profiling.reset(), fill())), ('复制 JSON', copy_json)]:
+            btn = btns.addButton(title, QtWidgets.QDialogButtonBox.ActionRole)
+            btn.clicked.connect(handler)
+        btns.rejected.connect(dlg.reject)
+        lay.addWidget(btns)
+        fill()
+        dlg.exec_()
 
     def on_set_password(self):
         dlg = QtWidgets.QDialog(self)
@@ -362,6 +713,18 @@ class PasswordManagerApp(QtWidgets.QMainWindow):
         lay.addWidget(new_pwd)
         lay.addWidget(QtWidgets.QLabel('确认密码:'))
         lay.addWidget(confirm_pwd)
+        # 密钥派生算法与目标解锁耗时：按本机速度校准代价参数
+        kdf_row = QtWidgets.QHBoxLayout()
+        kdf_algo = QtWidgets.QComboBox()
+        kdf_algo.addItem('Scrypt（抗硬件破解，推荐）', KDF_SCRYPT)
+        kdf_algo.addItem('PBKDF2-SHA256', KDF_PBKDF2)
+        unlock_secs = QtWidgets.QDoubleSpinBox(); unlock_secs.setRange(0.2, 5.0); unlock_secs.setSingleStep(0.1); unlock_secs.setValue(0.5)
+        unlock_secs.setSuffix(' 秒')
+        kdf_row.addWidget(QtWidgets.QLabel('派生算法:'))
+        kdf_row.addWidget(kdf_algo)
+        kdf_row.addWidget(QtWidgets.QLabel('解锁耗时:'))
+        kdf_row.addWidget(unlock_secs)
+        lay.addLayout(kdf_row)
         btns = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
         lay.addWidget(btns)
         btns.accepted.connect(dlg.accept)
@@ -371,7 +734,17 @@ class PasswordManagerApp(QtWidgets.QMainWindow):
             if pwd != pwd2:
                 QtWidgets.QMessageBox.warning(self, '提示', '两次输入不一致')
                 return
-            self.key_mgr.set_password(pwd if pwd else None)
+            try:
+                if pwd:
+                    algo = kdf_algo.currentData(); secs = unlock_secs.value()
+                    self._run_in_background(
+                        '正在测速并加密密钥文件...',
+                        lambda: self.key_mgr.set_password(pwd, calibrate_kdf(algo, secs)))
+                else:
+                    self.key_mgr.set_password(None)
+            except Exception as e:
+                QtWidgets.QMessageBox.critical(self, '错误', f'软件密码设置失败：{e}')
+                return
             QtWidgets.QMessageBox.information(self, '完成', '软件密码设置已更新')
 
     def on_show_usage(self):
@@ -438,4 +811,6 @@ def main():
 
 
 if __name__ == '__main__':
+    # 打包后的程序中，导入用的进程池子进程需要它才能正常启动
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,419 @@
+import secrets
+from bisect import bisect_right
+from collections.abc import MutableSequence
+from typing import List, Dict, Optional, Iterable, Tuple, Callable
+
+from encryption import encrypt_page, decrypt_page, CODEC_NONE
+
+
+PAGE_SIZE = 256  # 每页记录数
+Blob = Tuple[bytes, bytes, str]  # 加密后的页: (nonce, 密文, 压缩算法)
+
+
+def record_rev(rec: Dict) -> int:
+    """记录的修改版本号（见 SecureStorage.next_rev）；旧记录没有版本号时按创建时间推算。"""
+    rev = rec.get('rev')
+    if isinstance(rev, int):
+        return rev
+    created = rec.get('created_at')
+    return int(created * 1000) << 16 if isinstance(created, (int, float)) else 0
+
+
+class _Page:
+    __slots__ = ('pid', 'count', 'records', 'blob', 'ids', 'revs', 'version')
+
+    def __init__(self, pid: str, count: int, records: Optional[List[Dict]], blob: Optional[Blob],
+                 ids: Optional[List[str]] = None, revs: Optional[List[int]] = None):
+        self.pid = pid
+        self.count = count
+        # records 为 None 表示尚未解密；blob 为 (nonce, 密文, 压缩算法)，None 表示内容有改动，保存时需重新加密
+        self.records = records
+        self.blob = blob
+        # 未解密页的记录 id 与版本号（来自索引头），解密后以 records 为准
+        self.ids = ids
+        self.revs = revs
+        # 每次改动递增，用于判断后台加密好的页是否仍是最新内容
+        self.version = 0
+
+    def touch(self):
+        self.blob = None
+        self.version += 1
+
+
+def _new_pid() -> str:
+    return secrets.token_hex(8)
+
+
+class PagedAccounts(MutableSequence):
+    """按页延迟解密的记录列表：用法同 list，只有访问到的页才解密，保存时只重新加密改动过的页。"""
+
+    def __init__(self, key: Optional[bytes] = None, page_size: int = PAGE_SIZE):
+        self._key = key
+        self.page_size = page_size
+        self._pages: List[_Page] = []
+        self._starts: Optional[List[int]] = None  # 每页起始下标，页结构变化后重建
+        self._len = 0
+        self._id_page: Dict[str, _Page] = {}      # 记录 id -> 所在页
+
+    @classmethod
+    def from_records(cls, key: bytes, records: Iterable[Dict], page_size: int = PAGE_SIZE) -> 'PagedAccounts':
+        pa = cls(key, page_size)
+        for rec in records:
+            pa.append(rec)
+        return pa
+
+    @classmethod
+    def from_sealed(cls, key: bytes, index: List[Dict], blobs: List[Blob],
+                    page_size: int = PAGE_SIZE) -> 'PagedAccounts':
+        if len(index) != len(blobs):
+            raise ValueError('数据页数量与索引不一致')
+        pa = cls(key, page_size)
+        for meta, blob in zip(index, blobs):
+            if blob[0].hex() != meta['nonce']:
+                raise ValueError('数据页与索引不匹配')
+            page = _Page(meta['id'], meta['n'], None, blob, meta.get('ids'), meta.get('revs'))
+            pa._pages.append(page)
+            pa._len += meta['n']
+            pa._map_ids(page)
+        return pa
+
+    # 页管理
+    def _load(self, page: _Page) -> List[Dict]:
+        if page.records is None:
+            page.records = decrypt_page(self._key, page.pid, *page.blob)
+            if page.ids is None:
+                self._map_ids(page)
+            page.ids = None
+            page.revs = None
+        return page.records
+
+    def _page_ids(self, page: _Page) -> List[str]:
+        if page.records is not None:
+            return [r.get('id') for r in page.records]
+        return page.ids or []
+
+    @staticmethod
+    def _page_revs(page: _Page) -> Optional[List[int]]:
+        if page.records is not None:
+            return [record_rev(r) for r in page.records]
+        return page.revs
+
+    def _map_ids(self, page: _Page):
+        for rid in self._page_ids(page):
+            if rid is not None:
+                self._id_page[rid] = page
+
+    def _unmap(self, rec: Dict):
+        rid = rec.get('id')
+        if rid is not None:
+            self._id_page.pop(rid, None)
+
+    def _index(self) -> List[int]:
+        if self._starts is None:
+            starts, pos = [], 0
+            for page in self._pages:
+                starts.append(pos)
+                pos += page.count
+            self._starts = starts
+        return self._starts
+
+    def _locate(self, i: int) -> Tuple[int, int]:
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError('list index out of range')
+        starts = self._index()
+        p = bisect_right(starts, i) - 1
+        return p, i - starts[p]
+
+    def _resized(self, p: int, delta: int):
+        page = self._pages[p]
+        page.count += delta
+        page.touch()
+        self._len += delta
+        if page.count == 0:
+            del self._pages[p]
+        self._starts = None
+
+    @property
+    def page_count(self) -> int:
+        return len(self._pages)
+
+    @property
+    def loaded_pages(self) -> int:
+        return sum(1 for page in self._pages if page.records is not None)
+
+    @property
+    def dirty_pages(self) -> int:
+        return sum(1 for page in self._pages if page.blob is None)
+
+    @property
+    def fully_indexed(self) -> bool:
+        """是否所有记录的 id 都已知（旧数据需先补 id）。"""
+        return len(self._id_page) == self._len
+
+    # MutableSequence
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._len))]
+        p, off = self._locate(i)
+        return self._load(self._pages[p])[off]
+
+    def __setitem__(self, i: int, rec: Dict):
+        p, off = self._locate(i)
+        page = self._pages[p]
+        records = self._load(page)
+        self._unmap(records[off])
+        records[off] = rec
+        page.touch()
+        if rec.get('id') is not None:
+            self._id_page[rec['id']] = page
+
+    def __delitem__(self, i: int):
+        p, off = self._locate(i)
+        records = self._load(self._pages[p])
+        self._unmap(records.pop(off))
+        self._resized(p, -1)
+
+    def insert(self, i: int, rec: Dict):
+        if i >= self._len or not self._pages:
+            self.append(rec)
+            return
+        p, off = self._locate(max(i, -self._len))
+        page = self._pages[p]
+        self._load(page).insert(off, rec)
+        if rec.get('id') is not None:
+            self._id_page[rec['id']] = page
+        self._resized(p, 1)
+
+    def append(self, rec: Dict):
+        if not self._pages or self._pages[-1].count >= self.page_size:
+            self._pages.append(_Page(_new_pid(), 0, [], None))
+        p = len(self._pages) - 1
+        page = self._pages[p]
+        self._load(page).append(rec)
+        if rec.get('id') is not None:
+            self._id_page[rec['id']] = page
+        self._resized(p, 1)
+
+    def __iter__(self):
+        for page in self._pages:
+            yield from self._load(page)
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, PagedAccounts)):
+            return NotImplemented
+        return len(self) == len(other) and list(self) == list(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f'PagedAccounts(len={self._len}, pages={len(self._pages)}, loaded={self.loaded_pages})'
+
+    # 按 id 访问
+    def has_id(self, rid: str) -> bool:
+        return rid in self._id_page
+
+    def ids(self) -> List[str]:
+        return [rid for page in self._pages for rid in self._page_ids(page)]
+
+    def revisions(self) -> Iterable[Tuple[str, int]]:
+        """逐条给出 (id, 版本号)；索引头中有版本号的页不需要解密。"""
+        for page in self._pages:
+            if page.records is None and page.ids is not None and page.revs is not None:
+                yield from zip(page.ids, page.revs)
+            else:
+                for rec in self._load(page):
+                    yield rec.get('id'), record_rev(rec)
+
+    def iter_pages(self) -> Iterable[Tuple[Optional[bytes], Callable[[], List[Dict]]]]:
+        """逐页给出 (密文的 nonce, 读取该页记录的函数)；有改动尚未加密的页 nonce 为 None。
+
+        nonce 相同即页内容相同，调用方可据此跳过未变化的页而不必解密。
+        """
+        for page in self._pages:
+            yield (page.blob[0] if page.blob is not None else None), (lambda p=page: self._load(p))
+
+    def get(self, rid: str) -> Optional[Dict]:
+        page = self._id_page.get(rid)
+        if page is None:
+            return None
+        for rec in self._load(page):
+            if rec.get('id') == rid:
+                return rec
+        return None
+
+    def replace(self, rid: str, rec: Dict) -> Optional[Dict]:
+        """用 rec 替换 id 为 rid 的记录，返回旧记录。"""
+        page = self._id_page.get(rid)
+        if page is None:
+            return None
+        records = self._load(page)
+        for off, old in enumerate(records):
+            if old.get('id') == rid:
+                records[off] = rec
+                page.touch()
+                del self._id_page[rid]
+                if rec.get('id') is not None:
+                    self._id_page[rec['id']] = page
+                return old
+        return None
+
+    def delete_ids(self, ids: Iterable[str]) -> List[Dict]:
+        """按 id 删除，只触及目标所在的页；返回被删除的记录。"""
+        by_page: Dict[int, set] = {}
+        for rid in ids:
+            page = self._id_page.get(rid)
+            if page is not None:
+                by_page.setdefault(id(page), set()).add(rid)
+        removed = []
+        if not by_page:
+            return removed
+        for p in range(len(self._pages) - 1, -1, -1):
+            page = self._pages[p]
+            drop = by_page.get(id(page))
+            if not drop:
+                continue
+            keep = []
+            for rec in self._load(page):
+                if rec.get('id') in drop:
+                    removed.append(rec)
+                    del self._id_page[rec['id']]
+                else:
+                    keep.append(rec)
+            page.records = keep
+            self._resized(p, -(page.count - len(keep)))
+        return removed
+
+    # 批量操作
+    def delete_indices(self, idxs: Iterable[int]):
+        """一次删除多条：按页分组，每个受影响的页只重建一次。"""
+        by_page: Dict[int, set] = {}
+        starts = self._index()
+        for i in set(idxs):
+            if 0 <= i < self._len:
+                p = bisect_right(starts, i) - 1
+                by_page.setdefault(p, set()).add(i - starts[p])
+        for p in sorted(by_page, reverse=True):
+            page = self._pages[p]
+            drop = by_page[p]
+            keep = []
+            for j, rec in enumerate(self._load(page)):
+                if j in drop:
+                    self._unmap(rec)
+                else:
+                    keep.append(rec)
+            page.records = keep
+            self._resized(p, -len(drop))
+
+    def assign_missing_ids(self, new_id: Callable[[], str]) -> int:
+        """给没有 id 的旧记录补上 id（需解密所有缺 id 的页），返回补充的条数。"""
+        count = 0
+        for page in self._pages:
+            if page.records is None and page.ids is not None and None not in page.ids:
+                continue
+            for rec in self._load(page):
+                if not rec.get('id'):
+                    rec['id'] = new_id()
+                    self._id_page[rec['id']] = page
+                    page.touch()
+                    count += 1
+        return count
+
+    def clone(self, with_ids: bool = True) -> 'PagedAccounts':
+        """浅拷贝页结构（用于事务回滚与后台保存的快照），未解密的页继续共享密文。
+
+        with_ids=False 时不建立 id 映射，只用于加密写盘的快照。
+        """
+        pa = PagedAccounts(self._key, self.page_size)
+        for pg in self._pages:
+            page = _Page(pg.pid, pg.count, None if pg.records is None else list(pg.records), pg.blob, pg.ids, pg.revs)
+            page.version = pg.version
+            pa._pages.append(page)
+            if with_ids:
+                pa._map_ids(page)
+        pa._len = self._len
+        return pa
+
+    def restore(self, snapshot: 'PagedAccounts'):
+        """原地换回 clone() 得到的快照内容（事务回滚），引用本对象的界面模型等随之看到回滚后的数据。"""
+        self._pages = snapshot._pages
+        self._id_page = snapshot._id_page
+        self._len = snapshot._len
+        self._starts = None
+
+    def adopt(self, snapshot: 'PagedAccounts') -> int:
+        """接收快照中已加密好的页：快照之后未再改动的脏页直接复用其密文。"""
+        sealed = {pg.pid: pg for pg in snapshot._pages if pg.blob is not None}
+        count = 0
+        for page in self._pages:
+            src = sealed.get(page.pid)
+            if page.blob is None and src is not None and src.version == page.version:
+                page.blob = src.blob
+                count += 1
+        return count
+
+    def merge_sealed(self, index: List[Dict], blobs: List[Blob],
+                     decrypt: bool = False) -> Tuple[List[Dict], List[Dict]]:
+        """换成磁盘上新的页结构（另一进程保存了快照）：nonce 未变的页沿用内存中已解密的内容，
+        其余页换成新密文。返回 (不再使用的旧记录, 新换入的记录)；decrypt=False 时新页保持未解密，第二项为空。
+        """
+        if len(index) != len(blobs):
+            raise ValueError('数据页数量与索引不一致')
+        old = {pg.pid: pg for pg in self._pages}
+        removed: List[Dict] = []
+        added: List[Dict] = []
+        pages = []
+        for meta, blob in zip(index, blobs):
+            if blob[0].hex() != meta['nonce']:
+                raise ValueError('数据页与索引不匹配')
+            page = old.pop(meta['id'], None)
+            if page is not None and page.blob is not None and page.blob[0] == blob[0]:
+                page.blob = blob
+            else:
+                if page is not None and page.records is not None:
+                    removed.extend(page.records)
+                page = _Page(meta['id'], meta['n'], None, blob, meta.get('ids'), meta.get('revs'))
+                if decrypt:
+                    added.extend(self._load(page))
+            pages.append(page)
+        for page in old.values():
+            if page.records is not None:
+                removed.extend(page.records)
+        self._pages = pages
+        self._len = sum(page.count for page in pages)
+        self._starts = None
+        self._id_page = {}
+        for page in pages:
+            self._map_ids(page)
+        return removed, added
+
+    def reencode(self, codec: str) -> int:
+        """把压缩算法不是 codec 的页标记为需要重新加密（会先解密），返回页数。"""
+        count = 0
+        for page in self._pages:
+            if page.blob is not None and page.blob[2] != codec:
+                self._load(page)
+                page.touch()
+                count += 1
+        return count
+
+    def seal(self, key: bytes) -> Tuple[List[Dict], List[Blob]]:
+        """返回 (索引, 各页 (nonce, 密文, 压缩算法))；只有脏页会重新加密。"""
+        self._key = key
+        index, blobs = [], []
+        for page in self._pages:
+            if page.blob is None:
+                page.blob = encrypt_page(key, page.pid, page.records)
+            meta = {'id': page.pid, 'n': page.count, 'nonce': page.blob[0].hex(), 'ids': self._page_ids(page)}
+            if page.blob[2] != CODEC_NONE:
+                meta['codec'] = page.blob[2]
+            revs = self._page_revs(page)
+            if revs is not None:
+                meta['revs'] = revs
+            index.append(meta)
+            blobs.append(page.blob)
+        return index, blobs
@@ -0,0 +1,205 @@
+import os
+import time
+import threading
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+SNAPSHOT = 'snapshot'
+APPEND = 'append'
+
+
+def atomic_write(path: str, data: bytes):
+    """先写同目录下的临时文件并 fsync，再 os.replace 覆盖目标；中途崩溃不会破坏原文件。"""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if hasattr(os, 'O_DIRECTORY'):
+        # POSIX 下同步目录项，确保改名本身也已落盘
+        fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class FileLock:
+    """跨进程的建议锁（fcntl.flock / msvcrt.locking），锁的是单独的锁文件；同一线程可重入。"""
+
+    def __init__(self, path: str, timeout: float = 10.0):
+        self.path = path
+        self.timeout = timeout
+        self._mutex = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def acquire(self):
+        if not self._mutex.acquire(timeout=self.timeout):
+            raise TimeoutError('等待数据文件锁超时')
+        if self._depth == 0:
+            try:
+                self._lock_file()
+            except BaseException:
+                self._mutex.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(fd)
+        self._mutex.release()
+
+    def _lock_file(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    raise TimeoutError('数据文件正被其他程序写入，请稍后重试')
+                time.sleep(0.01)
+        self._fd = fd
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class PersistenceWorker:
+    """后台持久化线程，按顺序执行写入任务；新快照取代队列中未执行的任务，delay 秒内的多次保存合并为一次。"""
+
+    def __init__(self, on_saved: Optional[Callable[[], None]] = None,
+                 on_failed: Optional[Callable[[Exception], None]] = None,
+                 delay: float = 0.0, max_delay: Optional[float] = None):
+        self.on_saved = on_saved
+        self.on_failed = on_failed
+        self.delay = delay
+        self.max_delay = max_delay if max_delay is not None else delay * 5
+        self._cond = threading.Condition()
+        self._queue: List[Tuple[str, Callable[[], None]]] = []
+        self._busy = False
+        self._closed = False
+        self._flushing = 0
+        self._due = 0.0                      # 等待中的快照最早执行时间
+        self._first: Optional[float] = None  # 等待中的快照第一次被请求的时间
+        self.last_error: Optional[Exception] = None
+        # 统计：提交的任务数、实际执行的任务数、被合并掉的任务数
+        self.submitted = 0
+        self.written = 0
+        self.coalesced = 0
+        self._thread = threading.Thread(target=self._run, name='persistence', daemon=True)
+        self._thread.start()
+
+    def submit(self, kind: str, fn: Callable[[], None]):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('持久化线程已关闭')
+            self.submitted += 1
+            if kind == SNAPSHOT:
+                if self._queue:
+                    self.coalesced += len(self._queue)
+                    self._queue.clear()
+                now = time.monotonic()
+                if self._first is None:
+                    self._first = now
+                self._due = min(now + self.delay, self._first + self.max_delay)
+            self._queue.append((kind, fn))
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """立即执行等待中的写入并等待全部完成；超时返回 False。"""
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+            finally:
+                self._flushing -= 1
+
+    def close(self, timeout: Optional[float] = None):
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue) + (1 if self._busy else 0)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {'submitted': self.submitted, 'written': self.written,
+                    'coalesced': self.coalesced, 'pending': len(self._queue) + (1 if self._busy else 0)}
+
+    def _next_task(self) -> Optional[Tuple[str, Callable[[], None]]]:
+        # 在持有锁的情况下调用：等到队首任务可以执行为止；关闭且队列为空时返回 None
+        while True:
+            if self._queue:
+                kind = self._queue[0][0]
+                if kind != SNAPSHOT or self._flushing or self._closed:
+                    break
+                wait = self._due - time.monotonic()
+                if wait <= 0:
+                    break
+                self._cond.wait(wait)
+            elif self._closed:
+                return None
+            else:
+                self._cond.wait()
+        task = self._queue.pop(0)
+        if task[0] == SNAPSHOT:
+            self._first = None
+        return task
+
+    def _run(self):
+        while True:
+            with self._cond:
+                task = self._next_task()
+                if task is None:
+                    return
+                kind, fn = task
+                self._busy = True
+            try:
+                fn()
+            except Exception as e:
+                self.last_error = e
+                if self.on_failed:
+                    self.on_failed(e)
+            else:
+                self.written += 1
+                if self.on_saved:
+                    self.on_saved()
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
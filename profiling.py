@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional
+
+
+# 轻量性能埋点：命名的计时区间（span）与计数器。
+# 默认关闭，此时 span() 返回共享的空上下文、timed 包装只多一次标志判断，可以放在热点路径上。
+# 设置环境变量 PM_PROFILE=文件路径 启动时即开启，并把每个区间追加为一行 JSON 写入该文件；
+# 界面中按 Ctrl+Shift+D 打开隐藏的诊断窗口，可随时开关并查看统计。
+PROFILE_ENV = 'PM_PROFILE'
+RECENT_SIZE = 500   # 诊断窗口中保留的最近区间数
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+_stats: Dict[str, list] = {}       # 名称 -> [次数, 总耗时, 最大耗时]（秒）
+_counters: Dict[str, int] = {}
+_recent: deque = deque(maxlen=RECENT_SIZE)
+_log = None
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(log_path: Optional[str] = None):
+    """开启埋点；给出 log_path 时每个区间结束后追加一行 JSON 到该文件。"""
+    global _enabled, _log
+    with _lock:
+        if log_path and _log is None:
+            _log = open(log_path, 'a', encoding='utf-8', buffering=1)
+        _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _counters.clear()
+        _recent.clear()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'attrs', 'parent', 't0')
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        elapsed = time.perf_counter() - self.t0
+        _local.stack.pop()
+        event = {'ts': round(time.time(), 6), 'name': self.name, 'ms': round(elapsed * 1000, 3),
+                 'thread': threading.current_thread().name}
+        if self.parent:
+            event['parent'] = self.parent
+        if exc_type is not None:
+            event['error'] = exc_type.__name__
+        if self.attrs:
+            event.update(self.attrs)
+        with _lock:
+            st = _stats.get(self.name)
+            if st is None:
+                _stats[self.name] = [1, elapsed, elapsed]
+            else:
+                st[0] += 1
+                st[1] += elapsed
+                if elapsed > st[2]:
+                    st[2] = elapsed
+            _recent.append(event)
+            if _log is not None:
+                _log.write(json.dumps(event, ensure_ascii=False) + '\n')
+        return False
+
+
+def span(name: str, **attrs):
+    """with span('storage.load'): ... 记录一个区间；attrs 会写入日志（不要放敏感数据）。"""
+    if not _enabled:
+        return _NULL
+    return _Span(name, attrs)
+
+
+def timed(name: str) -> Callable:
+    """装饰器：把整个函数调用记为一个区间。"""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name, None):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def incr(name: str, n: int = 1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def snapshot() -> Dict:
+    """当前统计：各区间的次数/总耗时/平均/最大（毫秒）、计数器与最近的区间。"""
+    with _lock:
+        spans = {name: {'count': n, 'total_ms': round(total * 1000, 3),
+                        'avg_ms': round(total * 1000 / n, 3), 'max_ms': round(peak * 1000, 3)}
+                 for name, (n, total, peak) in _stats.items()}
+        return {'enabled': _enabled, 'spans': spans, 'counters': dict(_counters), 'recent': list(_recent)}
+
+
+def _close_log():
+    # 退出时把计数器汇总写成最后一行
+    global _log
+    with _lock:
+        if _log is None:
+            return
+        if _counters:
+            _log.write(json.dumps({'ts': round(time.time(), 6), 'counters': _counters}, ensure_ascii=False) + '\n')
+        _log.close()
+        _log = None
+
+
+atexit.register(_close_log)
+
+if os.environ.get(PROFILE_ENV):
+    try:
+        enable(os.environ[PROFILE_ENV])
+    except OSError:
+        enable()  # 日志文件无法打开时只在内存中统计
@@ -0,0 +1,152 @@
+from collections import OrderedDict
+from typing import List, Dict, Set, Iterable, Optional, Tuple
+
+
+SEARCH_FIELDS = ('website', 'account', 'email', 'phone', 'note')
+GRAM = 3
+
+
+def record_text(rec: Dict) -> str:
+    # 字段之间用 \0 分隔，避免跨字段拼出的子串被误匹配
+    return '\0'.join(str(rec.get(f, '')).lower() for f in SEARCH_FIELDS)
+
+
+def grams(text: str) -> Set[str]:
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class TrigramIndex:
+    """网站/账号/邮箱/手机/备注的三元组倒排索引。
+
+    每条记录分配递增的文档号（按记录 id 映射），结果按文档号（即插入顺序）返回。长度不足 3 的查询
+    无法用三元组过滤，直接在预先转好小写的文本上扫描。
+    """
+
+    def __init__(self, records: Iterable[Dict] = ()):
+        self._next = 0
+        self._docs: Dict[int, Dict] = {}    # 文档号 -> 记录
+        self._texts: Dict[int, str] = {}    # 文档号 -> 小写检索文本
+        self._ids: Dict[str, int] = {}      # 记录 id -> 文档号
+        self._postings: Dict[str, Set[int]] = {}
+        for rec in records:
+            self.add(rec)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _index(self, doc: int, rec: Dict):
+        text = record_text(rec)
+        self._docs[doc] = rec
+        self._texts[doc] = text
+        self._ids[rec['id']] = doc
+        for g in grams(text):
+            self._postings.setdefault(g, set()).add(doc)
+
+    def _unindex(self, doc: int):
+        rec = self._docs.pop(doc)
+        del self._ids[rec['id']]
+        for g in grams(self._texts.pop(doc)):
+            posting = self._postings.get(g)
+            if posting is not None:
+                posting.discard(doc)
+                if not posting:
+                    del self._postings[g]
+
+    def add(self, rec: Dict):
+        self._index(self._next, rec)
+        self._next += 1
+
+    def remove(self, rec: Dict):
+        doc = self._ids.get(rec.get('id'))
+        if doc is not None:
+            self._unindex(doc)
+
+    def replace(self, old: Dict, new: Dict):
+        """原位替换记录，保留其文档号以维持顺序。"""
+        doc = self._ids.pop(old.get('id'), None)
+        if doc is None:
+            self.add(new)
+            return
+        old_grams = grams(self._texts[doc])
+        text = record_text(new)
+        new_grams = grams(text)
+        for g in old_grams - new_grams:
+            posting = self._postings[g]
+            posting.discard(doc)
+            if not posting:
+                del self._postings[g]
+        for g in new_grams - old_grams:
+            self._postings.setdefault(g, set()).add(doc)
+        # 对已有键赋值不改变字典顺序，短查询扫描仍按插入顺序
+        self._docs[doc] = new
+        self._texts[doc] = text
+        self._ids[new['id']] = doc
+
+    def search_docs(self, q: str) -> List[int]:
+        q = q.lower()
+        if len(q) < GRAM:
+            return [d for d, text in self._texts.items() if q in text]
+        postings = []
+        for g in grams(q):
+            posting = self._postings.get(g)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        cand = set(postings[0])
+        for posting in postings[1:]:
+            cand &= posting
+            if not cand:
+                return []
+        # 三元组全部命中不代表子串命中，再用原文确认一次
+        texts = self._texts
+        return sorted(d for d in cand if q in texts[d])
+
+    def filter_docs(self, docs: List[int], q: str) -> List[int]:
+        """在已有结果中收窄：新查询包含旧查询时，结果必然是旧结果的子集。"""
+        q = q.lower()
+        texts = self._texts
+        return [d for d in docs if d in texts and q in texts[d]]
+
+    def records(self, docs: Iterable[int]) -> List[Dict]:
+        docs_map = self._docs
+        return [docs_map[d] for d in docs]
+
+    def search(self, q: str) -> List[Dict]:
+        return self.records(self.search_docs(q))
+
+
+class QueryCache:
+    """最近查询 -> 文档号列表 的 LRU 缓存；存储的代数变化后整体失效。"""
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.generation = -1
+        self._items: 'OrderedDict[str, List[int]]' = OrderedDict()
+        # 最近一次查询及结果，供下一次输入做增量收窄
+        self.last: Optional[Tuple[str, List[int]]] = None
+        self.hits = 0
+        self.misses = 0
+
+    def sync(self, generation: int):
+        if generation != self.generation:
+            self._items.clear()
+            self.last = None
+            self.generation = generation
+
+    def get(self, q: str) -> Optional[List[int]]:
+        docs = self._items.get(q)
+        if docs is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(q)
+        self.hits += 1
+        self.last = (q, docs)
+        return docs
+
+    def put(self, q: str, docs: List[int]):
+        self._items[q] = docs
+        self._items.move_to_end(q)
+        if len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+        self.last = (q, docs)
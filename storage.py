@@ -2,59 +2,107 @@ import os
 import json
 import time
 import csv
-from typing import List, Dict, Optional
+import secrets
+from collections import deque
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Iterable, Callable, Sequence
 
-from encryption import encrypt_payload, decrypt_payload, generate_aes_key, save_key_file, load_key_file
+from encryption import (encrypt_payload, decrypt_payload, pack_vault, unpack_vault, decode_json_vault,
+                        is_vault_container, generate_aes_key, save_key_file, load_key_file,
+                        read_key_file_info, read_vault_header, compression)
+from paging import PagedAccounts, PAGE_SIZE, record_rev
+from search_index import TrigramIndex, QueryCache
+from persistence import PersistenceWorker, FileLock, SNAPSHOT, APPEND, atomic_write
+from profiling import timed, span, incr
 
 
 APP_NAME = '账号密码管理器'
 DATA_FILE = 'saved_accounts.json'
 KEY_FILE = 'secret.key'
+JOURNAL_SUFFIX = '.journal'
+LOCK_SUFFIX = '.lock'
+DATA_DIR_ENV = 'PM_DATA_DIR'
+# 日志超过该大小（字节）时折叠回快照
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+# 删除标记（墓碑）保留的时长（秒）；超过这段时间未同步的副本可能让已删除的记录重新出现
+TOMBSTONE_TTL = 180 * 86400
 
 
 def app_root() -> str:
     # Ensure data files live beside the executable/script
     # In PyInstaller onefile mode, use the directory containing the executable
+    # 环境变量 PM_DATA_DIR 可指定其他数据目录（命令行工具的 --data-dir 也通过它生效）
     import sys
+    if os.environ.get(DATA_DIR_ENV):
+        return os.environ[DATA_DIR_ENV]
     if getattr(sys, 'frozen', False):
         return os.path.dirname(sys.executable)
     return os.path.dirname(os.path.abspath(__file__))
 
 
-def data_path() -> str:
-    return os.path.join(app_root(), DATA_FILE)
+# 以下路径函数的 root 为数据目录，None 表示 app_root()
+def data_path(root: Optional[str] = None) -> str:
+    return os.path.join(root or app_root(), DATA_FILE)
 
 
-def key_path() -> str:
-    return os.path.join(app_root(), KEY_FILE)
+def key_path(root: Optional[str] = None) -> str:
+    return os.path.join(root or app_root(), KEY_FILE)
+
+
+def journal_path(root: Optional[str] = None) -> str:
+    return data_path(root) + JOURNAL_SUFFIX
+
+
+def lock_path(root: Optional[str] = None) -> str:
+    return data_path(root) + LOCK_SUFFIX
+
+
+def new_record_id() -> str:
+    return secrets.token_hex(8)
 
 
 class KeyManager:
-    def __init__(self):
+    def __init__(self, data_dir: Optional[str] = None):
+        # 同一进程内打开其他目录的保险库（如同步）时显式传入，不修改环境变量
+        self.data_dir = data_dir
         self._key: Optional[bytes] = None
         self._encrypted: bool = False
 
     def ensure_key_exists(self):
-        kp = key_path()
+        kp = key_path(self.data_dir)
         if not os.path.exists(kp):
             key = generate_aes_key()
             save_key_file(kp, key, password=None)
 
+    def needs_password(self) -> bool:
+        self.ensure_key_exists()
+        return read_key_file_info(key_path(self.data_dir))['type'] == 'encrypted_key'
+
+    def kdf_params(self) -> Optional[Dict]:
+        """当前 secret.key 使用的密钥派生参数；未设置密码时为 None。"""
+        self.ensure_key_exists()
+        return read_key_file_info(key_path(self.data_dir)).get('kdf')
+
+    @timed('storage.unlock')
     def load(self, password: Optional[str]) -> None:
         self.ensure_key_exists()
-        key, enc_flag = load_key_file(key_path(), password)
+        key, enc_flag = load_key_file(key_path(self.data_dir), password)
         self._key = key
         self._encrypted = enc_flag
 
-    def set_password(self, new_password: Optional[str]):
+    def set_password(self, new_password: Optional[str], kdf: Optional[Dict] = None):
         # Re-write secret.key with or without password protection
         if self._key is None:
             self.ensure_key_exists()
-            key, _ = load_key_file(key_path(), None)
+            key, _ = load_key_file(key_path(self.data_dir), None)
             self._key = key
-        save_key_file(key_path(), self._key, new_password)
+        save_key_file(key_path(self.data_dir), self._key, new_password, kdf)
         self._encrypted = bool(new_password)
 
+    def clear(self):
+        """丢弃内存中的密钥（之后需重新 load）。Python 无法可靠擦除 bytes，只能去掉全部引用。"""
+        self._key = None
+
     @property
     def key(self) -> bytes:
         assert self._key is not None, 'Key not loaded'
@@ -65,50 +113,681 @@ class KeyManager:
         return self._encrypted
 
 
+class VaultConflict(Exception):
+    """写入前发现数据文件已被其他进程修改（磁盘上的版本号与本进程所基于的不同），本次写入被拒绝。"""
+
+
 class SecureStorage:
-    def __init__(self, key_mgr: KeyManager):
+    """加密存储：记录按 id 定位，分页加密、增量日志与事务写入；设计说明见 README-开发指南.txt。"""
+
+    def __init__(self, key_mgr: KeyManager, journal: bool = True,
+                 compact_threshold: int = JOURNAL_COMPACT_BYTES, page_size: int = PAGE_SIZE,
+                 data_dir: Optional[str] = None):
         self.key_mgr = key_mgr
-        self.accounts: List[Dict] = []
+        # 数据目录，默认与 key_mgr 相同
+        self.data_dir = data_dir if data_dir is not None else key_mgr.data_dir
+        self.page_size = page_size
+        self.accounts = PagedAccounts(page_size=page_size)
+        self.journal = journal
+        self.compact_threshold = compact_threshold
+        # 最后一条已写入日志的序号；快照中记录折叠到的序号，重放时跳过已包含的条目
+        self._seq = 0
+        # 进行中的事务：开始时的记录列表与缓冲的变更
+        self._txn: Optional[Dict] = None
+        # 检索用倒排索引，首次搜索时建立，之后随增删改增量维护
+        self._index: Optional[TrigramIndex] = None
+        self._query_cache = QueryCache()
+        # 每次数据变化递增，查询缓存据此失效
+        self.generation = 0
+        # 后台写入线程；为 None 时同步写盘
+        self.writer: Optional[PersistenceWorker] = None
+        self._journal_bytes = 0
+        # 后台已加密完成的快照，回到调用线程后复用其密文页
+        self._sealed: deque = deque()
+        self._write_failed = False
+        # 本进程内存内容所基于的数据文件版本号，以及当时数据文件/日志的 stat 指纹与已读到的日志偏移
+        self.disk_gen = 0
+        self._stamp = None
+        self._journal_pos = 0
+        self._file_lock = FileLock(lock_path(self.data_dir))
+        # 尚未确认写入磁盘的本地变更 (序号, 日志条目)；写入冲突后在最新数据上重放
+        self._unsynced: deque = deque()
+        self._op_no = 0
+        self._synced_no = 0
+        self._conflict = False
+        # 已删除记录的 id -> 删除时的版本号；设备号区分同一毫秒内不同进程产生的版本号
+        self.tombstones: Dict[str, int] = {}
+        self._device = secrets.randbits(16)
+        self._last_rev = 0
+
+    # Background writer
+    def start_writer(self, on_saved: Optional[Callable[[], None]] = None,
+                     on_failed: Optional[Callable[[Exception], None]] = None,
+                     save_delay: float = 0.0, on_conflict: Optional[Callable[[], None]] = None):
+        """on_conflict 在后台线程中调用，收到后应在调用线程上执行 refresh()。"""
+        def failed(e: Exception):
+            if isinstance(e, VaultConflict):
+                # 未写入的变更仍记在 _unsynced 中，由 refresh() 重放
+                self._conflict = True
+                if on_conflict:
+                    on_conflict()
+                return
+            # 写入失败后日志可能缺条目，下一次变更改为保存完整快照
+            self._write_failed = True
+            if on_failed:
+                on_failed(e)
+        self.writer = PersistenceWorker(on_saved, failed, delay=save_delay)
+
+    @property
+    def dirty(self) -> bool:
+        """是否还有尚未写入磁盘的保存请求。"""
+        return self.writer is not None and self.writer.pending > 0
+
+    def save_stats(self) -> Dict:
+        if self.writer is None:
+            return {'submitted': 0, 'written': 0, 'coalesced': 0, 'pending': 0}
+        return self.writer.stats()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        done = True
+        if self.writer is not None:
+            done = self.writer.flush(timeout)
+        self._adopt_sealed()
+        return done
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.flush()
+            if self._conflict:
+                # 有写入因冲突被拒绝：合并对方的变更后重新保存，再关闭写入线程
+                self.refresh()
+            self.writer.close()
+            self.writer = None
+        self._adopt_sealed()
+
+    def _submit(self, kind: str, fn: Callable[[], None]):
+        if self.writer is not None:
+            self.writer.submit(kind, fn)
+            return
+        try:
+            fn()
+        except VaultConflict:
+            self._conflict = True
+            self.refresh()
+
+    def _adopt_sealed(self):
+        while self._sealed:
+            self.accounts.adopt(self._sealed.popleft())
 
+    @timed('storage.load')
     def load(self):
-        p = data_path()
-        if not os.path.exists(p):
-            self.accounts = []
+        self.flush()
+        with self._file_lock:
+            legacy = self._load_locked()
+        self._unsynced.clear()
+        self._synced_no = self._op_no
+        self._conflict = False
+        # 旧数据没有记录 id，补齐后立即写回
+        if self.accounts.assign_missing_ids(new_record_id):
+            legacy = True
+        if legacy:
+            self.save()
+        self._journal_bytes = self._journal_size()
+        if self.journal and self._journal_bytes > self.compact_threshold:
+            self.compact()
+
+    def _load_locked(self) -> bool:
+        p = data_path(self.data_dir)
+        key = self.key_mgr.key
+        self.accounts = PagedAccounts(key, self.page_size)
+        self._seq = 0
+        self.disk_gen = 0
+        self._journal_pos = 0
+        self.tombstones = {}
+        self._index = None
+        self.generation += 1
+        legacy = False
+        if os.path.exists(p):
+            buf = self._read_file(p)
+            if is_vault_container(buf):
+                header, pages = unpack_vault(key, buf)
+                self.accounts = PagedAccounts.from_sealed(key, header['pages'], pages, self.page_size)
+            else:
+                legacy = True
+                blob = json.loads(buf.decode('utf-8'))
+                if 'pages' in blob:
+                    header, pages = decode_json_vault(key, blob)
+                    self.accounts = PagedAccounts.from_sealed(key, header['pages'], pages, self.page_size)
+                else:
+                    # 旧版整库加密格式
+                    header = decrypt_payload(key, blob)
+                    self.accounts = PagedAccounts.from_records(key, header.get('accounts', []), self.page_size)
+            self._seq = header.get('seq', 0)
+            self.disk_gen = header.get('gen', 0)
+            self.tombstones = dict(header.get('tombstones', {}))
+        self._replay_journal()
+        self._stamp = self._disk_stamp()
+        return legacy
+
+    # 多进程同步
+    def _disk_stamp(self):
+        """数据文件与日志的 (大小, 修改时间, inode)，用来廉价地判断是否有人写过。"""
+        stamp = []
+        for path in (data_path(self.data_dir), journal_path(self.data_dir)):
+            try:
+                st = os.stat(path)
+            except OSError:
+                stamp.append(None)
+            else:
+                stamp.append((st.st_size, st.st_mtime_ns, st.st_ino))
+        return tuple(stamp)
+
+    def _read_disk_gen(self, key: bytes) -> int:
+        gen = 0
+        if os.path.exists(data_path(self.data_dir)):
+            try:
+                gen = read_vault_header(key, data_path(self.data_dir)).get('gen', 0)
+            except ValueError:
+                return -1  # 旧格式或无法识别，按已被修改处理
+        if os.path.exists(journal_path(self.data_dir)):
+            with open(journal_path(self.data_dir), 'rb') as f:
+                for line in f:
+                    try:
+                        entry = decrypt_payload(key, json.loads(line.decode('utf-8')))
+                    except Exception:
+                        break
+                    gen = max(gen, entry.get('gen', 0))
+        return gen
+
+    def _check_base(self, key: bytes):
+        """持有文件锁时调用：磁盘内容不再是本进程所基于的版本则抛出 VaultConflict。"""
+        stamp = self._disk_stamp()
+        if stamp == self._stamp:
             return
-        with open(p, 'r', encoding='utf-8') as f:
-            blob = json.load(f)
-        payload = decrypt_payload(self.key_mgr.key, blob)
-        self.accounts = payload.get('accounts', [])
+        if self._read_disk_gen(key) != self.disk_gen:
+            raise VaultConflict('数据文件已被其他程序修改')
+        self._stamp = stamp  # 文件被触碰过但内容版本未变
+
+    def _track(self, entry: Dict) -> int:
+        while self._unsynced and self._unsynced[0][0] <= self._synced_no:
+            self._unsynced.popleft()
+        self._op_no += 1
+        self._unsynced.append((self._op_no, entry))
+        return self._op_no
+
+    @timed('storage.refresh')
+    def refresh(self) -> bool:
+        """载入其他进程写入的变更，返回内存中的数据是否因此改变。
+
+        数据文件与日志的 stat 都没变时立即返回。只有日志增长时只解密新增的条目；快照被替换时
+        nonce 未变的页沿用已解密的内容，只有变化的页需要重新解密，检索索引也只更新变化的记录。
+        本进程尚未写入的变更（包括因冲突被拒绝的写入）随后在最新数据上重放并重新保存。
+        """
+        if self._txn is not None:
+            return False
+        if not self._conflict and self._disk_stamp() == self._stamp:
+            return False
+        self.flush()
+        key = self.key_mgr.key
+        with self._file_lock:
+            stamp = self._disk_stamp()
+            if stamp == self._stamp and not self._conflict:
+                return False
+            pending = [entry for no, entry in self._unsynced if no > self._synced_no]
+            self._unsynced.clear()
+            self._synced_no = self._op_no
+            self._conflict = False
+            changed = self._load_changes(key, stamp)
+            for entry in pending:
+                self._apply(entry)
+            if changed or pending:
+                self.generation += 1
+            if pending:
+                # 持有文件锁时重新保存，同步写盘模式下不会再次冲突
+                self._persist(pending[0] if len(pending) == 1 else {'op': 'batch', 'ops': pending})
+        return changed
+
+    def _load_changes(self, key: bytes, stamp) -> bool:
+        changed = False
+        if stamp[0] != (self._stamp[0] if self._stamp else None):
+            if stamp[0] is None:
+                self._reindex(list(self.accounts), [])
+                self.accounts = PagedAccounts(key, self.page_size)
+                self._seq = self.disk_gen = self._journal_pos = 0
+                self.tombstones = {}
+                changed = True
+            else:
+                buf = self._read_file(data_path(self.data_dir))
+                if not is_vault_container(buf):
+                    self._load_locked()
+                    return True
+                header, pages = unpack_vault(key, buf)
+                self._adopt_sealed()
+                removed, added = self.accounts.merge_sealed(header['pages'], pages, decrypt=self._index is not None)
+                self._reindex(removed, added)
+                self._seq = header.get('seq', 0)
+                self.disk_gen = header.get('gen', 0)
+                self.tombstones = dict(header.get('tombstones', {}))
+                self._journal_pos = 0
+                changed = True
+        elif stamp[1] is None or stamp[1][0] < self._journal_pos:
+            self._journal_pos = 0  # 日志被截断或删除，按序号从头重放
+        applied = self._replay_journal()
+        self._stamp = self._disk_stamp()
+        self._journal_bytes = self._journal_size()
+        return changed or applied > 0
 
+    def _reindex(self, removed: List[Dict], added: List[Dict]):
+        if self._index is None:
+            return
+        old = {rec.get('id'): rec for rec in removed}
+        for rec in added:
+            prev = old.pop(rec.get('id'), None)
+            if prev is None:
+                self._index.add(rec)
+            else:
+                self._index.replace(prev, rec)
+        for rec in old.values():
+            self._index.remove(rec)
+
+    @timed('storage.save')
     def save(self):
-        payload = {'accounts': self.accounts, 'ts': int(time.time())}
-        blob = encrypt_payload(self.key_mgr.key, payload)
-        with open(data_path(), 'w', encoding='utf-8') as f:
-            json.dump(blob, f, ensure_ascii=False)
+        self._adopt_sealed()
+        key = self.key_mgr.key
+        # 只复制页结构，未改动的页共享密文；加密与写盘在 _write_snapshot 中完成
+        snapshot = self.accounts.clone(with_ids=False)
+        tombstones = self._prune_tombstones()
+        no = self._op_no
+        self._journal_bytes = 0
+        self._write_failed = False
+        self._submit(SNAPSHOT, lambda: self._write_snapshot(key, snapshot, tombstones, no))
+        if self.writer is None:
+            self._adopt_sealed()
 
-    def add(self, record: Dict):
-        self.accounts.append(record)
+    @timed('storage.write_snapshot')
+    def _write_snapshot(self, key: bytes, snapshot: PagedAccounts, tombstones: Dict[str, int], no: int):
+        index, pages = snapshot.seal(key)
+        with self._file_lock:
+            self._check_base(key)
+            gen = self.disk_gen + 1
+            header = {'pages': index, 'ts': int(time.time()), 'seq': self._seq, 'gen': gen,
+                      'tombstones': tombstones}
+            atomic_write(data_path(self.data_dir), pack_vault(key, header, pages))
+            # 快照已包含全部变更，日志可以丢弃；即使在此之前崩溃，重放时也会按序号跳过
+            jp = journal_path(self.data_dir)
+            if os.path.exists(jp):
+                os.remove(jp)
+            self.disk_gen = gen
+            self._journal_pos = 0
+            self._stamp = self._disk_stamp()
+            self._synced_no = max(self._synced_no, no)
+        self._sealed.append(snapshot)
+
+    def _prune_tombstones(self) -> Dict[str, int]:
+        """丢弃过期的删除标记，返回剩余部分的副本（写入快照）。"""
+        cutoff = int((time.time() - TOMBSTONE_TTL) * 1000) << 16
+        expired = [rid for rid, rev in self.tombstones.items() if rev < cutoff]
+        for rid in expired:
+            del self.tombstones[rid]
+        return dict(self.tombstones)
+
+    def compact(self):
+        """把日志折叠进快照。"""
         self.save()
 
+    def recompress(self) -> int:
+        """按当前的压缩设置（encryption.set_compression）重新加密旧的页并保存，返回重写的页数。
+
+        平时只有改动过的页才会重新加密，旧数据会逐渐转换；需要立即全部转换时调用。
+        """
+        self._adopt_sealed()
+        count = self.accounts.reencode(compression())
+        if count:
+            self.save()
+        return count
+
+    @staticmethod
+    @timed('storage.read_file')
+    def _read_file(path: str) -> bytearray:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            buf = bytearray(size)
+            if f.readinto(buf) != size:
+                raise ValueError('数据文件读取不完整')
+        return buf
+
+    # Journal
+    def _journal_size(self) -> int:
+        try:
+            return os.path.getsize(journal_path(self.data_dir))
+        except OSError:
+            return 0
+
+    def _append_journal(self, entry: Dict):
+        no = self._track(entry)
+        key = self.key_mgr.key
+        self._submit(APPEND, lambda: self._write_journal_entry(key, entry, no))
+        if self._journal_bytes > self.compact_threshold:
+            self.compact()
+
+    @timed('storage.append_journal')
+    def _write_journal_entry(self, key: bytes, entry: Dict, no: int):
+        # 序号与版本号在持有文件锁时分配，多个进程追加的条目不会重号
+        with self._file_lock:
+            self._check_base(key)
+            entry = dict(entry, seq=self._seq + 1, gen=self.disk_gen + 1)
+            line = (json.dumps(encrypt_payload(key, entry), ensure_ascii=False) + '\n').encode('utf-8')
+            with open(journal_path(self.data_dir), 'ab') as f:
+                f.write(line)
+                self._journal_pos = f.tell()
+            self._seq = entry['seq']
+            self.disk_gen = entry['gen']
+            self._journal_bytes += len(line)
+            self._stamp = self._disk_stamp()
+            self._synced_no = max(self._synced_no, no)
+
+    @timed('storage.replay_journal')
+    def _replay_journal(self) -> int:
+        """从 _journal_pos 起重放日志，返回应用的条目数。"""
+        jp = journal_path(self.data_dir)
+        if not os.path.exists(jp):
+            self._journal_pos = 0
+            return 0
+        good_end = self._journal_pos
+        applied = 0
+        with open(jp, 'rb') as f:
+            f.seek(good_end)
+            for line in f:
+                try:
+                    entry = decrypt_payload(self.key_mgr.key, json.loads(line.decode('utf-8')))
+                except Exception:
+                    # 末尾可能是写到一半的残缺记录，之后的内容一律不可信
+                    break
+                good_end += len(line)
+                incr('journal.replayed')
+                self.disk_gen = max(self.disk_gen, entry.get('gen', 0))
+                if entry.get('seq', 0) <= self._seq:
+                    continue
+                self._apply(entry)
+                self._seq = entry['seq']
+                applied += 1
+        if good_end < os.path.getsize(jp):
+            with open(jp, 'r+b') as f:
+                f.truncate(good_end)
+        self._journal_pos = good_end
+        return applied
+
+    def _apply(self, entry: Dict):
+        """应用一条日志；按 id 的操作可重复应用（冲突重放时依赖这一点），并同步维护检索索引。"""
+        op = entry.get('op')
+        index = self._index
+        if op == 'add':
+            rec = entry['rec']
+            self.tombstones.pop(rec.get('id'), None)
+            old = self.accounts.replace(rec['id'], rec) if rec.get('id') else None
+            if old is None:
+                self.accounts.append(rec)
+                if index is not None:
+                    index.add(rec)
+            elif index is not None:
+                index.replace(old, rec)
+        elif op == 'del_ids':
+            for rec in self.accounts.delete_ids(entry['ids']):
+                if index is not None:
+                    index.remove(rec)
+            rev = entry.get('rev')
+            if rev is not None:
+                for rid in entry['ids']:
+                    if rev > self.tombstones.get(rid, 0):
+                        self.tombstones[rid] = rev
+        elif op == 'upd' and 'id' in entry:
+            old = self.accounts.replace(entry['id'], entry['rec'])
+            if old is not None and index is not None:
+                index.replace(old, entry['rec'])
+        elif op == 'batch':
+            for sub in entry['ops']:
+                self._apply(sub)
+        else:
+            self._apply_legacy(entry)
+
+    def _apply_legacy(self, entry: Dict):
+        # 按下标记录的旧日志；下标操作无法增量维护索引
+        self._index = None
+        op = entry.get('op')
+        if op == 'del':
+            idx = entry['idx']
+            if 0 <= idx < len(self.accounts):
+                del self.accounts[idx]
+        elif op == 'del_many':
+            self._drop_indices(entry['idxs'])
+        elif op == 'upd':
+            idx = entry['idx']
+            if 0 <= idx < len(self.accounts):
+                self.accounts[idx] = entry['rec']
+
+    def _drop_indices(self, idxs: Iterable[int]):
+        self.accounts.delete_indices(idxs)
+
+    def _persist(self, entry: Dict):
+        if self._txn is not None:
+            self._txn['ops'].append(entry)
+        elif self.journal and not self._write_failed:
+            self._append_journal(entry)
+        else:
+            self._track(entry)
+            self.save()
+
+    def get(self, rid: str) -> Optional[Dict]:
+        return self.accounts.get(rid)
+
+    def next_rev(self, after: int = 0) -> int:
+        """新的版本号：高位为毫秒时间戳，低 16 位为设备号；本进程内严格递增，且大于 after。"""
+        ms = max(int(time.time() * 1000), (self._last_rev >> 16) + 1, (after >> 16) + 1)
+        self._last_rev = ms << 16 | self._device
+        return self._last_rev
+
+    def add(self, record: Dict) -> str:
+        # 从归档恢复的记录带有原 id，与现有记录冲突时换一个新 id
+        if not record.get('id') or self.accounts.has_id(record['id']):
+            record['id'] = new_record_id()
+        # 恢复一条已删除的记录也是一次新的修改，版本号要大于删除标记
+        record['rev'] = self.next_rev(self.tombstones.pop(record['id'], 0))
+        self.accounts.append(record)
+        self.generation += 1
+        if self._index is not None:
+            self._index.add(record)
+        self._persist({'op': 'add', 'rec': record})
+        return record['id']
+
+    def delete(self, rid: str) -> bool:
+        return self.delete_many([rid]) == 1
+
     def delete_by_index(self, idx: int):
         if 0 <= idx < len(self.accounts):
-            del self.accounts[idx]
+            self.delete(self.accounts[idx]['id'])
+
+    def update(self, rid: str, fields: Dict) -> bool:
+        # 单条修改只写一条日志，不必开事务（begin 会复制整个记录列表）
+        return self._update_one(rid, fields)
+
+    # Transactions
+    def begin(self):
+        if self._txn is not None:
+            raise RuntimeError('事务已在进行中')
+        self._txn = {'accounts': self.accounts.clone(), 'tombstones': dict(self.tombstones), 'ops': []}
+
+    def commit(self):
+        if self._txn is None:
+            raise RuntimeError('没有进行中的事务')
+        ops = self._txn['ops']
+        self._txn = None
+        if not ops:
+            return
+        # 大批量变更写成日志很快就会触发折叠，直接保存快照（只重新加密脏页）更省
+        batch = {'op': 'batch', 'ops': ops}
+        if self.journal and not self._write_failed and len(ops) < self.page_size:
+            self._append_journal(batch)
+        else:
+            self._track(batch)
             self.save()
 
-    def search(self, q: str) -> List[Dict]:
+    def rollback(self):
+        if self._txn is None:
+            raise RuntimeError('没有进行中的事务')
+        self.accounts.restore(self._txn['accounts'])
+        self.tombstones = self._txn['tombstones']
+        self._txn = None
+        self._index = None
+        self.generation += 1
+
+    @contextmanager
+    def transaction(self):
+        """with store.transaction(): ...  嵌套时并入外层事务。"""
+        if self._txn is not None:
+            yield self
+            return
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def add_many(self, records: Iterable[Dict]) -> int:
+        count = 0
+        with self.transaction():
+            for rec in records:
+                self.add(rec)
+                count += 1
+        return count
+
+    def delete_many(self, ids: Iterable[str]) -> int:
+        removed = self.accounts.delete_ids(set(ids))
+        if not removed:
+            return 0
+        if self._index is not None:
+            for rec in removed:
+                self._index.remove(rec)
+        rev = self.next_rev(max(record_rev(rec) for rec in removed))
+        for rec in removed:
+            self.tombstones[rec['id']] = rev
+        self.generation += 1
+        self._persist({'op': 'del_ids', 'ids': [rec['id'] for rec in removed], 'rev': rev})
+        return len(removed)
+
+    def update_many(self, changes: Dict[str, Dict]) -> int:
+        """changes: {记录 id: 需要修改的字段}。记录整体替换而非原地修改，便于回滚。"""
+        if len(changes) == 1:
+            (rid, fields), = changes.items()
+            return int(self._update_one(rid, fields))
+        count = 0
+        with self.transaction():
+            for rid, fields in changes.items():
+                count += self._update_one(rid, fields)
+        return count
+
+    def _update_one(self, rid: str, fields: Dict) -> bool:
+        old = self.accounts.get(rid)
+        if old is None:
+            return False
+        rec = dict(old)
+        rec.update(fields)
+        rec['id'] = rid
+        rec['rev'] = self.next_rev(record_rev(old))
+        self.accounts.replace(rid, rec)
+        self.generation += 1
+        if self._index is not None:
+            self._index.replace(old, rec)
+        self._persist({'op': 'upd', 'id': rid, 'rec': rec})
+        return True
+
+    def apply_sync(self, upserts: Iterable[Dict], deletes: Dict[str, int]) -> Dict[str, int]:
+        """合并另一副本传来的变更（见 sync.py），返回实际写入与删除的条数。
+
+        upserts 为带 id 与 rev 的完整记录，deletes 为 {id: 删除版本号}。记录保留原版本号，
+        只有比本地更新的一方生效（版本号相同时删除优先），重复应用同一批变更不会再改动数据。
+        """
+        cutoff = int((time.time() - TOMBSTONE_TTL) * 1000) << 16
+        written = deleted = 0
+        with self.transaction():
+            for rec in upserts:
+                rid, rev = rec['id'], record_rev(rec)
+                old = self.accounts.get(rid)
+                if (old is not None and record_rev(old) >= rev) or self.tombstones.get(rid, -1) >= rev:
+                    continue
+                rec = dict(rec)
+                self.tombstones.pop(rid, None)
+                if old is None:
+                    self.accounts.append(rec)
+                    if self._index is not None:
+                        self._index.add(rec)
+                else:
+                    self.accounts.replace(rid, rec)
+                    if self._index is not None:
+                        self._index.replace(old, rec)
+                self.generation += 1
+                self._persist({'op': 'add', 'rec': rec})
+                written += 1
+            by_rev: Dict[int, List[str]] = {}
+            for rid, rev in deletes.items():
+                old = self.accounts.get(rid)
+                if old is not None and record_rev(old) > rev:
+                    continue
+                if old is None and (rev < cutoff or self.tombstones.get(rid, -1) >= rev):
+                    continue
+                by_rev.setdefault(rev, []).append(rid)
+            for rev, ids in by_rev.items():
+                removed = self.accounts.delete_ids(set(ids))
+                if self._index is not None:
+                    for rec in removed:
+                        self._index.remove(rec)
+                for rid in ids:
+                    self.tombstones[rid] = rev
+                deleted += len(removed)
+                self.generation += 1
+                self._persist({'op': 'del_ids', 'ids': ids, 'rev': rev})
+        return {'written': written, 'deleted': deleted}
+
+    def _search_index(self) -> TrigramIndex:
+        if self._index is None:
+            with span('storage.build_index', records=len(self.accounts)):
+                self._index = TrigramIndex(self.accounts)
+        return self._index
+
+    def warm(self):
+        """解密全部页并建立检索索引，供常驻进程在解锁后预热，之后的查询不再有首次开销。"""
+        self._search_index()
+
+    def search_docs(self, q: str) -> List[int]:
+        """返回命中记录的文档号（插入顺序）。
+
+        结果按查询缓存；新查询包含上一次的查询（继续输入）时，只在上一次结果中收窄。
+        """
+        index = self._search_index()
+        q = q.lower()
+        cache = self._query_cache
+        cache.sync(self.generation)
+        docs = cache.get(q)
+        if docs is not None:
+            incr('search.cache_hits')
+            return docs
+        if cache.last is not None and cache.last[0] in q:
+            docs = index.filter_docs(cache.last[1], q)
+        else:
+            docs = index.search_docs(q)
+        cache.put(q, docs)
+        return docs
+
+    @timed('storage.search')
+    def search(self, q: str) -> Sequence[Dict]:
+        """空查询返回 self.accounts 本身（按原顺序、只读使用），不会解密尚未用到的页。"""
         q = q.strip()
         if not q:
-            return list(self.accounts)
-        key_fields = ['website', 'account', 'email', 'phone', 'note']
-        res = []
-        for r in self.accounts:
-            for f in key_fields:
-                val = str(r.get(f, ''))
-                if q.lower() in val.lower():
-                    res.append(r)
-                    break
-        return res
+            return self.accounts
+        return self._search_index().records(self.search_docs(q))
 
+    @timed('storage.export_csv')
     def export_csv(self, path: str):
         fields = ['website', 'account', 'password', 'phone', 'email', 'note', 'created_at']
         with open(path, 'w', newline='', encoding='utf-8') as f:
@@ -117,27 +796,27 @@ class SecureStorage:
             for r in self.accounts:
                 w.writerow({k: r.get(k, '') for k in fields})
 
+    def import_keys(self) -> set:
+        """已有记录的 (网站, 账号) 去重键，导入时跳过重复项。"""
+        # 导入/导出模块依赖较重（进程池、XML 解析），按需加载，缩短命令行工具的启动时间
+        from importers import dedup_keys
+        return dedup_keys(self.accounts)
+
+    @timed('storage.export_archive')
+    def export_archive(self, path: str, password: str, kdf: Optional[dict] = None) -> int:
+        """导出为加密归档（分段流式加密，见 archive.py），返回导出条数。"""
+        from archive import write_archive
+        snapshot = self.accounts.clone(with_ids=False)
+        return write_archive(path, snapshot, password, kdf, count=len(snapshot))
+
+    @timed('storage.import_files')
+    def import_files(self, paths: Iterable[str], fmt: Optional[str] = None, password: Optional[str] = None) -> int:
+        """同步导入（自动识别格式，全部文件一个事务、一次保存；记录分块写入事务，不整体留在内存）。"""
+        from importers import ImportJob
+        job = ImportJob(paths, self.import_keys(), fmt, password=password)
+        with self.transaction():
+            job.run(sink=self.add_many)
+        return job.imported
+
     def import_csv(self, path: str) -> int:
-        count = 0
-        with open(path, 'r', newline='', encoding='utf-8') as f:
-            r = csv.DictReader(f)
-            required = {'account', 'password'}
-            # 允许自定义字段名，但最少要包含账号和密码
-            headers = set([h.strip().lower() for h in r.fieldnames or []])
-            if not required.issubset(headers):
-                raise ValueError('CSV需包含“账号(account)”与“密码(password)”字段')
-            for row in r:
-                rec = {
-                    'website': row.get('website', ''),
-                    'account': row.get('account', ''),
-                    'password': row.get('password', ''),
-                    'phone': row.get('phone', ''),
-                    'email': row.get('email', ''),
-                    'note': row.get('note', ''),
-                    'created_at': int(time.time())
-                }
-                if rec['account'] and rec['password']:
-                    self.accounts.append(rec)
-                    count += 1
-        self.save()
-        return count
\ No newline at end of file
+        return self.import_files([path])
@@ -0,0 +1,356 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import secrets
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from cryptography.exceptions import InvalidTag
+
+from encryption import derive_key_from_password, encrypt_payload, decrypt_payload, encrypt_page, decrypt_page, \
+    DEFAULT_KDF, NONCE_SIZE, CODEC_NONE
+from paging import record_rev
+from persistence import FileLock, atomic_write
+from profiling import timed, span, incr
+from storage import KeyManager, SecureStorage, DATA_FILE, KEY_FILE, JOURNAL_SUFFIX, TOMBSTONE_TTL
+
+
+# 两个副本之间的增量同步：保险库与保险库，或保险库与同步目录（放在网盘/U 盘上充当“远端”）。
+# 每个 id 按哈希落入 2^BUCKET_BITS 个桶之一，即把哈希空间切成等长的区间；桶摘要为桶内全部条目
+# (id, 版本号, 是否删除) 的 64 位哈希异或与条目数。同步时先交换各桶摘要，只对摘要不同的桶
+# 交换条目的 (id, 版本号)，最后只传输、加密和写入胜出的记录与删除标记。
+# 合并规则与顺序无关：版本号大者胜出，版本号相同时删除优先；两端各自合并后摘要一致。
+BUCKET_BITS = 10
+SYNC_VERSION = 1
+MANIFEST = 'manifest.pmsync'
+BUCKET_DIR = 'buckets'
+LOCK_FILE = '.lock'
+_SALT_SIZE = 16
+
+Entry = Tuple[int, bool]      # (版本号, 是否为删除标记)
+Digest = Tuple[int, int]      # (条目哈希的异或, 条目数)
+
+
+def bucket_of(rid: str) -> int:
+    # 只用于分桶，不需要抗碰撞；比 blake2b 快，计算整库摘要时每条记录都要调用
+    return zlib.crc32(rid.encode('utf-8')) >> (32 - BUCKET_BITS)
+
+
+def entry_hash(rid: str, rev: int, deleted: bool) -> int:
+    h = hashlib.blake2b(f'{rid}\0{rev}\0{int(deleted)}'.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(h, 'big')
+
+
+def digest_entries(items: Iterable[Tuple[str, int, bool]]) -> Dict[int, Digest]:
+    out: Dict[int, Digest] = {}
+    for rid, rev, deleted in items:
+        b = bucket_of(rid)
+        x, n = out.get(b, (0, 0))
+        out[b] = (x ^ entry_hash(rid, rev, deleted), n + 1)
+    return out
+
+
+def _tombstone_cutoff() -> int:
+    return int((time.time() - TOMBSTONE_TTL) * 1000) << 16
+
+
+class Replica:
+    """同步的一端。entries/fetch 只需处理摘要不同的桶，apply 需自行按版本号合并（可重复应用）。"""
+    name = ''
+
+    def digests(self) -> Dict[int, Digest]:
+        raise NotImplementedError
+
+    def entries(self, buckets: Iterable[int]) -> Dict[str, Entry]:
+        raise NotImplementedError
+
+    def fetch(self, ids: Iterable[str]) -> List[Dict]:
+        raise NotImplementedError
+
+    def apply(self, upserts: List[Dict], deletes: Dict[str, int]) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def is_vault_dir(path: str) -> bool:
+    # 折叠前的保险库只有日志文件，没有数据文件
+    if not os.path.exists(os.path.join(path, KEY_FILE)):
+        return False
+    data = os.path.join(path, DATA_FILE)
+    return os.path.exists(data) or os.path.exists(data + JOURNAL_SUFFIX)
+
+
+class VaultReplica(Replica):
+    """一个保险库。使用同步写盘（不要对 store 调用 start_writer），store 的数据目录须为 data_dir。"""
+
+    def __init__(self, store: SecureStorage, data_dir: str):
+        self.store = store
+        self.data_dir = os.path.abspath(data_dir)
+        self.name = self.data_dir
+        self._owned = False
+
+    @staticmethod
+    def needs_password(data_dir: str) -> bool:
+        return KeyManager(os.path.abspath(data_dir)).needs_password()
+
+    @classmethod
+    def open(cls, data_dir: str, password: Optional[str] = None) -> 'VaultReplica':
+        data_dir = os.path.abspath(data_dir)
+        if not is_vault_dir(data_dir):
+            raise ValueError(f'{data_dir} 中没有保险库')
+        km = KeyManager(data_dir)
+        try:
+            km.load(password if km.needs_password() else None)
+        except Exception:
+            raise ValueError('对方保险库的启动密码错误')
+        store = SecureStorage(km)
+        store.load()
+        replica = cls(store, data_dir)
+        replica._owned = True
+        return replica
+
+    def _items(self) -> Iterator[Tuple[str, int, bool]]:
+        for rid, rev in self.store.accounts.revisions():
+            yield rid, rev, False
+        for rid, rev in self.store.tombstones.items():
+            yield rid, rev, True
+
+    def digests(self) -> Dict[int, Digest]:
+        self.store.refresh()
+        return digest_entries(self._items())
+
+    def entries(self, buckets: Iterable[int]) -> Dict[str, Entry]:
+        wanted = set(buckets)
+        return {rid: (rev, deleted) for rid, rev, deleted in self._items() if bucket_of(rid) in wanted}
+
+    def fetch(self, ids: Iterable[str]) -> List[Dict]:
+        out = []
+        for rid in ids:
+            rec = self.store.get(rid)
+            if rec is not None:
+                out.append(dict(rec))
+        return out
+
+    def apply(self, upserts: List[Dict], deletes: Dict[str, int]) -> Dict[str, int]:
+        if not upserts and not deletes:
+            return {'written': 0, 'deleted': 0}
+        return self.store.apply_sync(upserts, deletes)
+
+    def close(self):
+        if self._owned:
+            self.store.close()
+
+
+class DirReplica(Replica):
+    """同步目录，用单独的同步密码加密（两台设备的 secret.key 不同）。
+
+    manifest.pmsync 明文部分只有密钥派生参数与盐，加密部分为各桶的摘要、桶文件名与压缩算法；
+    每个非空桶一个加密文件 buckets/<桶号>-<nonce>.bin，桶号作为附加认证数据。
+    写入时只重写变化的桶：先写新的桶文件，最后替换 manifest，再删除旧文件，
+    中途中断只会留下无用的桶文件。写入在目录内 .lock 的文件锁中进行。
+    """
+
+    def __init__(self, path: str, password: str, kdf: Optional[dict] = None):
+        self.path = os.path.abspath(path)
+        self.name = self.path
+        if os.path.exists(os.path.join(self.path, KEY_FILE)):
+            raise ValueError(f'{self.path} 是保险库的数据目录，不能用作同步目录')
+        os.makedirs(os.path.join(self.path, BUCKET_DIR), exist_ok=True)
+        self._lock = FileLock(os.path.join(self.path, LOCK_FILE))
+        self._cache: Dict[str, Dict] = {}   # 桶文件名 -> 已解密的内容
+        mp = os.path.join(self.path, MANIFEST)
+        if os.path.exists(mp):
+            with open(mp, 'r', encoding='utf-8') as f:
+                info = json.load(f)
+            if info.get('version') != SYNC_VERSION:
+                raise ValueError(f'不支持的同步目录版本: {info.get("version")}')
+            self._salt = base64.b64decode(info['salt'])
+            self._kdf = info['kdf']
+            self._key = derive_key_from_password(password, self._salt, self._kdf)
+            self._state = self._read_state()
+        else:
+            self._salt = secrets.token_bytes(_SALT_SIZE)
+            self._kdf = kdf or DEFAULT_KDF
+            self._key = derive_key_from_password(password, self._salt, self._kdf)
+            self._state = {'gen': 0, 'buckets': {}}
+            with self._lock:
+                self._write_state(self._state)
+
+    def _read_state(self) -> Dict:
+        mp = os.path.join(self.path, MANIFEST)
+        if not os.path.exists(mp):
+            return {'gen': 0, 'buckets': {}}
+        with open(mp, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        try:
+            return decrypt_payload(self._key, info['state'])
+        except InvalidTag:
+            raise ValueError('同步密码错误或同步目录已损坏')
+
+    def _write_state(self, state: Dict):
+        info = {'version': SYNC_VERSION, 'salt': base64.b64encode(self._salt).decode('ascii'), 'kdf': self._kdf,
+                'state': encrypt_payload(self._key, state)}
+        atomic_write(os.path.join(self.path, MANIFEST), json.dumps(info, ensure_ascii=False).encode('utf-8'))
+
+    def _load_bucket(self, b: int, fname: str, codec: str) -> Dict:
+        content = self._cache.get(fname)
+        if content is None:
+            with open(os.path.join(self.path, BUCKET_DIR, fname), 'rb') as f:
+                data = f.read()
+            try:
+                content = decrypt_page(self._key, f'bucket:{b}', data[:NONCE_SIZE], data[NONCE_SIZE:], codec)
+            except InvalidTag:
+                raise ValueError(f'同步目录中的桶文件已损坏: {fname}')
+            incr('sync.buckets_read')
+            self._cache[fname] = content
+        return content
+
+    def _bucket(self, state: Dict, b: int) -> Dict:
+        meta = state['buckets'].get(str(b))
+        if meta is None:
+            return {'records': {}, 'tombstones': {}}
+        return self._load_bucket(b, meta[2], meta[3] if len(meta) > 3 else CODEC_NONE)
+
+    def digests(self) -> Dict[int, Digest]:
+        with self._lock:
+            self._state = self._read_state()
+        return {int(b): (meta[0], meta[1]) for b, meta in self._state['buckets'].items()}
+
+    def entries(self, buckets: Iterable[int]) -> Dict[str, Entry]:
+        out: Dict[str, Entry] = {}
+        with self._lock:
+            for b in buckets:
+                content = self._bucket(self._state, b)
+                for rid, rec in content['records'].items():
+                    out[rid] = (record_rev(rec), False)
+                for rid, rev in content['tombstones'].items():
+                    out[rid] = (rev, True)
+        return out
+
+    def fetch(self, ids: Iterable[str]) -> List[Dict]:
+        out = []
+        with self._lock:
+            for rid in ids:
+                rec = self._bucket(self._state, bucket_of(rid))['records'].get(rid)
+                if rec is not None:
+                    out.append(dict(rec))
+        return out
+
+    @timed('sync.dir_apply')
+    def apply(self, upserts: List[Dict], deletes: Dict[str, int]) -> Dict[str, int]:
+        if not upserts and not deletes:
+            return {'written': 0, 'deleted': 0}
+        written = deleted = 0
+        cutoff = _tombstone_cutoff()
+        with self._lock:
+            # 重新读取 manifest：交换摘要之后目录可能已被其他设备更新，这里按版本号再合并一次
+            state = self._read_state()
+            touched: Dict[int, Dict] = {}
+
+            def bucket(b: int) -> Dict:
+                if b not in touched:
+                    content = self._bucket(state, b)
+                    touched[b] = {'records': dict(content['records']), 'tombstones': dict(content['tombstones'])}
+                return touched[b]
+
+            changed = set()
+            for rec in upserts:
+                rid, rev = rec['id'], record_rev(rec)
+                b = bucket_of(rid)
+                content = bucket(b)
+                old = content['records'].get(rid)
+                if (old is not None and record_rev(old) >= rev) or content['tombstones'].get(rid, -1) >= rev:
+                    continue
+                content['tombstones'].pop(rid, None)
+                content['records'][rid] = rec
+                changed.add(b)
+                written += 1
+            for rid, rev in deletes.items():
+                b = bucket_of(rid)
+                content = bucket(b)
+                old = content['records'].get(rid)
+                if old is not None and record_rev(old) > rev:
+                    continue
+                if old is None and (rev < cutoff or content['tombstones'].get(rid, -1) >= rev):
+                    continue
+                if content['records'].pop(rid, None) is not None:
+                    deleted += 1
+                content['tombstones'][rid] = rev
+                changed.add(b)
+            stale = []
+            for b in changed:
+                content = touched[b]
+                tombs = content['tombstones']
+                for rid in [rid for rid, rev in tombs.items() if rev < cutoff]:
+                    del tombs[rid]
+                old = state['buckets'].pop(str(b), None)
+                if old is not None:
+                    stale.append(old[2])
+                if not content['records'] and not tombs:
+                    continue
+                nonce, ct, codec = encrypt_page(self._key, f'bucket:{b}', content)
+                fname = f'{b:03x}-{nonce.hex()[:16]}.bin'
+                atomic_write(os.path.join(self.path, BUCKET_DIR, fname), nonce + ct)
+                self._cache[fname] = content
+                x, n = next(iter(digest_entries(
+                    [(rid, record_rev(rec), False) for rid, rec in content['records'].items()] +
+                    [(rid, rev, True) for rid, rev in tombs.items()]).values()))
+                state['buckets'][str(b)] = [x, n, fname, codec]
+            state['gen'] = state.get('gen', 0) + 1
+            self._write_state(state)
+            self._state = state
+            for fname in stale:
+                self._cache.pop(fname, None)
+                try:
+                    os.remove(os.path.join(self.path, BUCKET_DIR, fname))
+                except OSError:
+                    pass
+        return {'written': written, 'deleted': deleted}
+
+
+@timed('sync.run')
+def sync(local: Replica, remote: Replica) -> Dict[str, int]:
+    """双向同步，返回各步的条数：buckets 为摘要不同的桶数，checked 为比较过的 id 数。"""
+    with span('sync.digests'):
+        dl, dr = local.digests(), remote.digests()
+    buckets = sorted(b for b in set(dl) | set(dr) if dl.get(b) != dr.get(b))
+    report = {'buckets': len(buckets), 'checked': 0, 'pulled': 0, 'pushed': 0,
+              'deleted_local': 0, 'deleted_remote': 0}
+    if not buckets:
+        return report
+    with span('sync.entries', buckets=len(buckets)):
+        el, er = local.entries(buckets), remote.entries(buckets)
+    cutoff = _tombstone_cutoff()
+    pull: List[str] = []
+    push: List[str] = []
+    pull_del: Dict[str, int] = {}
+    push_del: Dict[str, int] = {}
+    ids = set(el) | set(er)
+    report['checked'] = len(ids)
+    for rid in ids:
+        a, b = el.get(rid), er.get(rid)
+        if a == b:
+            continue
+        # (版本号, 是否删除) 按元组比较：版本号相同时删除标记胜出
+        if a is None or (b is not None and b > a):
+            if b[1]:
+                if a is not None or b[0] >= cutoff:
+                    pull_del[rid] = b[0]
+            else:
+                pull.append(rid)
+        else:
+            if a[1]:
+                if b is not None or a[0] >= cutoff:
+                    push_del[rid] = a[0]
+            else:
+                push.append(rid)
+    with span('sync.transfer', pull=len(pull) + len(pull_del), push=len(push) + len(push_del)):
+        got = local.apply(remote.fetch(pull), pull_del)
+        sent = remote.apply(local.fetch(push), push_del)
+    report.update(pulled=got['written'], deleted_local=got['deleted'],
+                  pushed=sent['written'], deleted_remote=sent['deleted'])
+    return report
@@ -0,0 +1,149 @@
+import time
+from typing import Dict, Sequence, Set, List, Tuple, Callable
+
+from PyQt5 import QtCore
+
+from audit import SCORE_LABELS
+
+
+COLUMNS = [
+    ('website', '网站'),
+    ('account', '账号'),
+    ('password', '密码'),
+    ('phone', '手机'),
+    ('email', '邮箱'),
+    ('note', '备注'),
+    ('created_at', '创建时间'),
+]
+PASSWORD_COL = 2
+
+
+def format_cell(rec: Dict, key: str) -> str:
+    val = rec.get(key, '')
+    if key == 'created_at' and isinstance(val, (int, float)):
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(val))
+    return str(val)
+
+
+def _ranges(rows: List[int]) -> List[Tuple[int, int]]:
+    """把有序行号合并为连续区间 [(start, end), ...]。"""
+    out: List[Tuple[int, int]] = []
+    for r in rows:
+        if out and out[-1][1] == r - 1:
+            out[-1] = (out[-1][0], r)
+        else:
+            out.append((r, r))
+    return out
+
+
+class AccountTableModel(QtCore.QAbstractTableModel):
+    """记录表模型。
+
+    直接引用 SecureStorage.accounts 或搜索结果，不复制数据；单元格在 data() 中按需格式化，
+    只有视图中可见的行才会被访问（分页存储下也只解密这些行所在的页）。
+    """
+
+    def __init__(self, rows: Sequence[Dict] = (), parent=None):
+        super().__init__(parent)
+        self._rows = rows
+        self._show_password = False
+
+    def set_rows(self, rows: Sequence[Dict]):
+        self.beginResetModel()
+        self._rows = rows
+        self.endResetModel()
+
+    def record(self, row: int) -> Dict:
+        return self._rows[row]
+
+    def record_id(self, row: int) -> str:
+        return self._rows[row]['id']
+
+    def remove_ids(self, ids: Set[str], apply: Callable[[], object]):
+        """调用 apply() 删除记录并通知视图。
+
+        显示搜索结果时只移除结果列表中的对应行，筛选视图保持有效；直接引用存储时
+        后续行号全部变化，重置模型（虚拟化视图只会重新取可见行）。
+        """
+        if not isinstance(self._rows, list):
+            self.beginResetModel()
+            apply()
+            self.endResetModel()
+            return
+        apply()
+        rows = [i for i, rec in enumerate(self._rows) if rec.get('id') in ids]
+        for start, end in reversed(_ranges(rows)):
+            self.beginRemoveRows(QtCore.QModelIndex(), start, end)
+            del self._rows[start:end + 1]
+            self.endRemoveRows()
+
+    def set_show_password(self, show: bool):
+        if show == self._show_password:
+            return
+        self._show_password = show
+        if self._rows:
+            top = self.index(0, PASSWORD_COL)
+            bottom = self.index(len(self._rows) - 1, PASSWORD_COL)
+            self.dataChanged.emit(top, bottom, [QtCore.Qt.DisplayRole])
+
+    # Qt model interface
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index: QtCore.QModelIndex, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole or not index.isValid():
+            return None
+        col = index.column()
+        if col == PASSWORD_COL and not self._show_password:
+            return '******'
+        return format_cell(self._rows[index.row()], COLUMNS[col][0])
+
+    def headerData(self, section: int, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return COLUMNS[section][1]
+        return str(section + 1)
+
+
+class AuditTableModel(QtCore.QAbstractTableModel):
+    """密码体检结果表：只保存有问题的记录 id，单元格按需从存储取记录并格式化。"""
+    HEADERS = ('网站', '账号', '强度', '问题')
+
+    def __init__(self, report, lookup: Callable[[str], Dict], parent=None):
+        super().__init__(parent)
+        self._report = report
+        self._lookup = lookup
+        self._ids = report.flagged()
+
+    def record_id(self, row: int) -> str:
+        return self._ids[row]
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._ids)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index: QtCore.QModelIndex, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole or not index.isValid():
+            return None
+        rid = self._ids[index.row()]
+        col = index.column()
+        if col == 2:
+            score = self._report.scores.get(rid)
+            return '' if score is None else SCORE_LABELS[score]
+        if col == 3:
+            return '；'.join(self._report.issues(rid))
+        rec = self._lookup(rid) or {}
+        return str(rec.get('website' if col == 0 else 'account', ''))
+
+    def headerData(self, section: int, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return str(section + 1)
@@ -0,0 +1,83 @@
+import io
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive import ArchiveWriter, read_segments, write_archive, read_archive, _HEADER, MAX_SEGMENT_SIZE  # noqa: E402
+
+KDF = {'name': 'pbkdf2-sha256', 'iterations': 200_000}
+
+
+def _archive(data: bytes, segment_size: int = 1024) -> bytes:
+    buf = io.BytesIO()
+    w = ArchiveWriter(buf, 'secret', KDF, segment_size)
+    w.write(data)
+    w.close()
+    return buf.getvalue()
+
+
+def _read(blob: bytes, password: str = 'secret') -> bytes:
+    return b''.join(read_segments(io.BytesIO(blob), password))
+
+
+def _header_len(blob: bytes) -> int:
+    kdf_len = _HEADER.unpack(blob[:_HEADER.size])[3]
+    return _HEADER.size + 16 + 7 + kdf_len
+
+
+@pytest.mark.parametrize('size', [0, 1, 1024, 1025, 5000])
+def test_segments_round_trip(size):
+    data = os.urandom(size)
+    assert _read(_archive(data)) == data
+
+
+def test_wrong_password():
+    with pytest.raises(ValueError):
+        _read(_archive(b'x' * 3000), 'other')
+
+
+def test_tampered_truncated_or_extended_archive():
+    blob = _archive(b'abc' * 1000)
+    start = _header_len(blob)
+    bad = bytearray(blob)
+    bad[start + 1500] ^= 1
+    with pytest.raises(ValueError):
+        _read(bytes(bad))
+    # 去掉结尾段：最后读到的整段按结尾段校验会失败
+    with pytest.raises(ValueError):
+        _read(blob[:start + 2 * (1024 + 16)])
+    with pytest.raises(ValueError):
+        _read(blob + b'\0')
+    # 头部也是每段的附加认证数据
+    bad = bytearray(blob)
+    bad[_HEADER.size] ^= 1  # 盐
+    with pytest.raises(ValueError):
+        _read(bytes(bad))
+
+
+def test_header_limits_checked_before_key_derivation():
+    blob = _archive(b'data')
+    magic, version, _seg, kdf_len = _HEADER.unpack(blob[:_HEADER.size])
+    with pytest.raises(ValueError, match='头部无效'):
+        _read(_HEADER.pack(magic, version, MAX_SEGMENT_SIZE + 1, kdf_len) + blob[_HEADER.size:])
+    with pytest.raises(ValueError, match='头部无效'):
+        _read(_HEADER.pack(magic, version, 1024, 60000) + blob[_HEADER.size:])
+    for kdf in ({'name': 'pbkdf2-sha256', 'iterations': 10 ** 10},
+                {'name': 'scrypt', 'n': 2 ** 30, 'r': 8, 'p': 1},
+                {'name': 'argon9'}):
+        kdf_json = json.dumps(kdf).encode('utf-8')
+        forged = (_HEADER.pack(magic, version, 1024, len(kdf_json)) + blob[_HEADER.size:_HEADER.size + 23]
+                  + kdf_json + blob[_header_len(blob):])
+        with pytest.raises(ValueError):
+            _read(forged)
+
+
+def test_write_and_read_records(tmp_path):
+    path = str(tmp_path / 'export.pmarc')
+    records = [{'id': str(i), 'account': f'u{i}', 'password': f'p{i}', 'note': '中文'} for i in range(500)]
+    assert write_archive(path, records, 'secret', KDF, segment_size=4096) == 500
+    assert [r['account'] for r in read_archive(path, 'secret')] == [r['account'] for r in records]
@@ -0,0 +1,41 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audit import PasswordAuditor  # noqa: E402
+from paging import PagedAccounts  # noqa: E402
+from encryption import generate_aes_key  # noqa: E402
+
+NOW = 1_700_000_000
+
+
+def _records(n):
+    return [{'id': f'r{i}', 'account': f'u{i}', 'password': 'abc123' if i % 10 == 0 else f'Xq!{i}-long#Pw{i * 7}',
+             'rev': (i + 1) << 16, 'created_at': NOW - (400 * 86400 if i % 4 == 0 else 0)} for i in range(n)]
+
+
+def test_report():
+    report = PasswordAuditor(workers=1).audit(_records(40), now=NOW)
+    assert report.total == 40
+    assert report.reused == [[f'r{i}' for i in range(0, 40, 10)]]
+    assert set(report.weak) == {f'r{i}' for i in range(0, 40, 10)}
+    assert set(report.old) == {f'r{i}' for i in range(0, 40, 4)}
+
+
+def test_cache_survives_fresh_record_objects_and_keeps_no_passwords():
+    key = generate_aes_key()
+    records = _records(300)
+    auditor = PasswordAuditor(workers=1)
+    auditor.audit(PagedAccounts.from_records(key, records, 64).clone(with_ids=False), now=NOW)
+    assert auditor.rehashed == 300
+    # 重新解密得到的是新对象；只有版本号变化的记录需要重新计算指纹
+    index, blobs = PagedAccounts.from_records(key, records, 64).seal(key)
+    reloaded = PagedAccounts.from_sealed(key, index, blobs, 64)
+    reloaded.replace('r5', dict(reloaded.get('r5'), password='new-Pass!word-5', rev=999 << 16))
+    report = auditor.audit(reloaded, now=NOW)
+    assert auditor.rehashed == 1
+    assert report.total == 300
+    cached = repr(auditor.__dict__)
+    assert 'abc123' not in cached and 'new-Pass!word-5' not in cached
@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backup import BackupRepo, CHUNK_DIR  # noqa: E402
+from storage import KeyManager, SecureStorage  # noqa: E402
+
+KDF = {'name': 'pbkdf2-sha256', 'iterations': 200_000}
+
+
+def _store(path):
+    km = KeyManager(str(path))
+    km.load(None)
+    store = SecureStorage(km, page_size=32)
+    store.load()
+    return store
+
+
+def test_incremental_snapshot_and_restore(tmp_path):
+    store = _store(tmp_path / 'vault')
+    ids = [store.add({'website': f's{i}.com', 'account': f'u{i}', 'password': f'p{i}'}) for i in range(100)]
+    store.compact()  # 未保存进快照的脏页没有 nonce，无法命中缓存
+    repo = BackupRepo(str(tmp_path / 'backups'), 'backup-pw', KDF)
+    first = repo.create(store)
+    assert first['records'] == 100
+    # 未改动的页不再写入新块
+    second = repo.create(store)
+    assert second['new_chunks'] == 0 and second['hashed_pages'] == 0
+    store.update(ids[0], {'password': 'changed'})
+    store.delete(ids[99])
+    store.compact()
+    third = repo.create(store)
+    assert third['new_chunks'] == 2 and third['hashed_pages'] == 2
+
+    store.add({'website': 'late.com', 'account': 'late', 'password': 'p'})
+    result = repo.restore(first['id'], store)
+    assert result == {'added': 1, 'updated': 1, 'removed': 1}
+    assert store.get(ids[0])['password'] == 'p0'
+    assert len(store.accounts) == 100
+    assert repo.verify()['ok']
+
+
+def test_verify_detects_corrupt_chunk(tmp_path):
+    store = _store(tmp_path / 'vault')
+    store.add_many({'website': f's{i}.com', 'account': f'u{i}', 'password': f'p{i}'} for i in range(50))
+    repo = BackupRepo(str(tmp_path / 'backups'), 'backup-pw', KDF)
+    repo.create(store)
+    chunk_root = tmp_path / 'backups' / CHUNK_DIR
+    path = next(os.path.join(d, f) for d, _, files in os.walk(chunk_root) for f in files)
+    with open(path, 'r+b') as f:
+        f.seek(20)
+        byte = f.read(1)
+        f.seek(20)
+        f.write(bytes([byte[0] ^ 1]))
+    assert not repo.verify()['ok']
+    assert repo.verify(full=False)['ok']
@@ -0,0 +1,140 @@
+import os
+import sys
+
+import pytest
+from cryptography.exceptions import InvalidTag
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encryption import generate_aes_key, pack_vault, unpack_vault, encrypt_page, decrypt_page  # noqa: E402
+from paging import PagedAccounts  # noqa: E402
+from storage import KeyManager, SecureStorage, DATA_FILE, JOURNAL_SUFFIX  # noqa: E402
+
+
+def _records(n, prefix='user'):
+    return [{'id': f'{prefix}{i:05d}', 'website': f'site{i}.com', 'account': f'{prefix}{i}',
+             'password': f'pw-{i}', 'note': '备注' * (i % 5)} for i in range(n)]
+
+
+def _open(path, **kw):
+    km = KeyManager(str(path))
+    km.load(None)
+    store = SecureStorage(km, **kw)
+    store.load()
+    return store
+
+
+def _sealed(key, records, page_size=64):
+    index, blobs = PagedAccounts.from_records(key, records, page_size).seal(key)
+    return pack_vault(key, {'pages': index, 'ts': 0}, blobs)
+
+
+def test_pack_unpack_round_trip():
+    key = generate_aes_key()
+    records = _records(300)
+    header, pages = unpack_vault(key, _sealed(key, records))
+    assert len(pages) == 5
+    loaded = PagedAccounts.from_sealed(key, header['pages'], pages, 64)
+    assert list(loaded) == records
+    assert loaded.get('user00150')['password'] == 'pw-150'
+
+
+def test_unpack_rejects_tampered_header_and_pages():
+    key = generate_aes_key()
+    buf = bytearray(_sealed(key, _records(300)))
+    with pytest.raises(InvalidTag):
+        unpack_vault(generate_aes_key(), bytes(buf))
+
+    bad = bytearray(buf)
+    bad[30] ^= 1  # 索引头密文
+    with pytest.raises(InvalidTag):
+        unpack_vault(key, bytes(bad))
+
+    bad = bytearray(buf)
+    bad[-5] ^= 1  # 最后一页密文：索引头照常解密，访问该页时校验失败
+    header, pages = unpack_vault(key, bytes(bad))
+    loaded = PagedAccounts.from_sealed(key, header['pages'], pages, 64)
+    assert loaded[0]['id'] == 'user00000'
+    with pytest.raises(InvalidTag):
+        loaded[299]
+
+    with pytest.raises(ValueError):
+        unpack_vault(key, b'XXXX' + bytes(buf[4:]))
+
+
+def test_page_moved_to_other_position_is_rejected():
+    key = generate_aes_key()
+    index, blobs = PagedAccounts.from_records(key, _records(128), 64).seal(key)
+    index[0]['nonce'], index[1]['nonce'] = index[1]['nonce'], index[0]['nonce']
+    blobs[0], blobs[1] = blobs[1], blobs[0]
+    header, pages = unpack_vault(key, pack_vault(key, {'pages': index, 'ts': 0}, blobs))
+    loaded = PagedAccounts.from_sealed(key, header['pages'], pages, 64)
+    with pytest.raises(InvalidTag):
+        loaded[0]
+
+
+def test_journal_replay_after_crash(tmp_path):
+    store = _open(tmp_path)
+    ids = [store.add(rec) for rec in _records(20)]
+    store.update(ids[3], {'password': 'changed'})
+    store.delete(ids[4])
+    # 模拟崩溃：没有 close/compact，日志末尾还有一条写到一半的记录
+    assert not os.path.exists(tmp_path / DATA_FILE)
+    journal = tmp_path / (DATA_FILE + JOURNAL_SUFFIX)
+    good_size = os.path.getsize(journal)
+    with open(journal, 'ab') as f:
+        f.write(b'{"version": 4, "nonce": "trunc')
+
+    reopened = _open(tmp_path)
+    assert len(reopened.accounts) == 19
+    assert reopened.get(ids[3])['password'] == 'changed'
+    assert reopened.get(ids[4]) is None
+    assert os.path.getsize(journal) == good_size
+    reopened.add({'website': 'after.com', 'account': 'after', 'password': 'p'})
+    reopened.close()
+    final = _open(tmp_path)
+    assert len(final.accounts) == 20 and final.accounts[-1]['account'] == 'after'
+
+
+def test_journal_replayed_on_top_of_snapshot(tmp_path):
+    store = _open(tmp_path)
+    store.add_many(_records(300))
+    store.compact()
+    rid = store.add({'website': 'late.com', 'account': 'late', 'password': 'p'})
+    assert os.path.exists(tmp_path / (DATA_FILE + JOURNAL_SUFFIX))
+    reopened = _open(tmp_path)
+    assert len(reopened.accounts) == 301
+    assert reopened.get(rid)['account'] == 'late'
+
+
+def test_rollback_restores_records_in_place(tmp_path):
+    store = _open(tmp_path, page_size=16)
+    ids = [store.add(rec) for rec in _records(40)]
+    view = store.accounts
+    tombstones = dict(store.tombstones)
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.delete_many(ids[:20])
+            store.update(ids[30], {'password': 'txn'})
+            store.add({'website': 'new.com', 'account': 'new', 'password': 'p'})
+            raise RuntimeError
+    assert store.accounts is view
+    assert [r['id'] for r in view] == ids
+    assert store.get(ids[30])['password'] == 'pw-30'
+    assert store.tombstones == tombstones
+    # 回滚后的修改作用在同一个对象上，并且能正常保存
+    store.update(ids[0], {'note': 'after'})
+    assert view[0]['note'] == 'after'
+    assert [r['account'] for r in store.search('new')] == []
+    store.close()
+    reopened = _open(tmp_path)
+    assert len(reopened.accounts) == 40
+    assert reopened.get(ids[0])['note'] == 'after'
+
+
+def test_encrypt_page_binds_page_id():
+    key = generate_aes_key()
+    nonce, ct, codec = encrypt_page(key, 'page-a', _records(10))
+    assert decrypt_page(key, 'page-a', nonce, ct, codec) == _records(10)
+    with pytest.raises(InvalidTag):
+        decrypt_page(key, 'page-b', nonce, ct, codec)
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import KeyManager, SecureStorage, DATA_FILE, JOURNAL_SUFFIX, KEY_FILE  # noqa: E402
+from sync import VaultReplica, DirReplica, MANIFEST, BUCKET_DIR, is_vault_dir, sync  # noqa: E402
+
+
+def _vault(path, records):
+    os.makedirs(path, exist_ok=True)
+    km = KeyManager(str(path))
+    km.load(None)
+    store = SecureStorage(km)
+    store.load()
+    for rec in records:
+        store.add(rec)
+    return store
+
+
+def test_sync_into_uncompacted_vault(tmp_path):
+    local_dir, remote_dir = tmp_path / 'local', tmp_path / 'remote'
+    local = _vault(local_dir, [{'website': 'a.com', 'account': 'alice', 'password': 'p1'}])
+    remote = _vault(remote_dir, [{'website': 'b.com', 'account': 'bob', 'password': 'p2'}])
+    remote.close()
+    # 对方尚未折叠过日志：只有 secret.key 与日志文件
+    assert not os.path.exists(remote_dir / DATA_FILE)
+    assert os.path.exists(remote_dir / (DATA_FILE + JOURNAL_SUFFIX))
+    assert is_vault_dir(str(remote_dir))
+
+    replica = VaultReplica.open(str(remote_dir))
+    try:
+        report = sync(VaultReplica(local, str(local_dir)), replica)
+    finally:
+        replica.close()
+    local.close()
+    assert report['pulled'] == 1 and report['pushed'] == 1
+    assert not os.path.exists(remote_dir / MANIFEST)
+    assert not os.path.exists(remote_dir / BUCKET_DIR)
+
+    km = KeyManager(str(remote_dir))
+    km.load(None)
+    check = SecureStorage(km)
+    check.load()
+    assert sorted(r['account'] for r in check.accounts) == ['alice', 'bob']
+    check.close()
+
+
+def test_dir_replica_refuses_vault_dir(tmp_path):
+    KeyManager(str(tmp_path)).ensure_key_exists()
+    assert os.path.exists(tmp_path / KEY_FILE)
+    with pytest.raises(ValueError):
+        DirReplica(str(tmp_path), 'sync-password')
+    assert not os.path.exists(tmp_path / MANIFEST)